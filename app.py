@@ -5,60 +5,95 @@ This module sets up the Flask application, defines routes, and handles
 file uploads, processing, and downloads.
 """
 
-from flask import render_template, request, redirect, url_for, session, Response, g, after_this_request
+from flask import render_template, request, redirect, url_for, session, Response, g, after_this_request, Request
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask.json import jsonify
-from csv_parser import process_file, generate_summary
+from csv_parser import process_file, lookup_cached_report, generate_summary, load_summary, summary_path
 from create_app import app
-from utils.validation import validate_csv
-from utils.logger import setup_logging, get_logger
+from utils.validation import load_csv
+from utils.upload_ingest import UploadSpool, UploadRejected
+from utils.logger import setup_logging, get_logger, REQUEST_LOGGER
+from utils.serializer import serializer
+from utils.log_store import get_log_store, parse_timestamp
+from utils.log_reader import LogCursor, iter_log_records
+from utils.log_filter import compile_log_filter
 from utils.version_info import get_version_info
-from datetime import datetime, timezone
-from collections import Counter
+from utils.ttl_cache import TTLCache
+from utils.report_cache import ReportCache, hash_file
+from utils.perf import span, get_perf_stats
+from utils.metrics_registry import registry
 from functools import wraps
-from firebase_config import initialize_firestore
+from firebase_config import initialize_firestore, firestore_call, check_firestore, get_firestore_stats
 from werkzeug.security import check_password_hash
 from models import User
-from metrics import increment_unique_users, increment_reports_generated, reset_metrics
+from jobs import JobQueue, QueueFullError
+from batch import process_batch, tenant_names
+from metrics import increment_unique_users, increment_reports_generated, reset_metrics, configure_metrics, metrics_cache
 from metrics import get_metrics as get_metrics
 from firebase_config import initialize_firestore as db
 import os
-import json
 import time
+import uuid
 from urllib.parse import urlparse, urljoin
 from werkzeug.utils import secure_filename
 
 setup_logging()
 logger = get_logger(__name__)
-unique_users = set()
-reports_generated = Counter()
+request_logger = get_logger(REQUEST_LOGGER)
+job_queue = JobQueue(app.config['JOB_WORKERS'], app.config['JOB_QUEUE_DEPTH'], app.config['JOB_TTL'])
+configure_metrics(app.config['METRICS_BACKEND'], app.config['METRICS_DB_PATH'], app.config['METRICS_BATCH_SIZE'],
+                  app.config['METRICS_FLUSH_INTERVAL'], app.config['METRICS_CACHE_TTL'])
+user_cache = TTLCache(app.config['USER_CACHE_TTL'])
+report_cache = ReportCache(app.config['REPORT_CACHE_DIR'], app.config['REPORT_CACHE_MAX_BYTES'],
+                           app.config['REPORT_CACHE_MAX_AGE']) if app.config['REPORT_CACHE_MAX_BYTES'] else None
+
+registry.configure(app.config['METRICS_REGISTRY_DIR'], app.config['METRICS_REGISTRY_SYNC_INTERVAL'])
+REQUEST_LATENCY = registry.histogram('aion_http_request_duration_seconds', 'Time taken to handle a request.',
+                                     ('route', 'method', 'status'))
+UPLOAD_SIZE = registry.histogram('aion_upload_size_bytes', 'Size of accepted uploads.',
+                                 buckets=tuple(1024 * 4 ** power for power in range(11)))
+ROWS_PROCESSED = registry.counter('aion_rows_processed', 'Rows of the uploaded exports turned into reports.')
+REPORTS_GENERATED = registry.counter('aion_reports_generated', 'Reports generated.')
+JOB_QUEUE_DEPTH = registry.gauge('aion_job_queue_depth', 'Report jobs queued or running.')
+CACHE_HITS = registry.counter('aion_cache_hits', 'Lookups answered from a cache.', ('cache',))
+CACHE_MISSES = registry.counter('aion_cache_misses', 'Lookups that missed a cache.', ('cache',))
+registry.hit_ratio('aion_cache_hit_ratio', 'Share of lookups answered from a cache.', CACHE_HITS, CACHE_MISSES)
+
+
+def collect_metrics():
+    """
+    Copy the job queue depth and the cache statistics of this worker into the metrics registry.
+    """
+    JOB_QUEUE_DEPTH.set(job_queue.depth())
+    for name, cache in (('metrics', metrics_cache), ('users', user_cache), ('reports', report_cache)):
+        if cache is not None:
+            stats = cache.stats()
+            CACHE_HITS.set_total(stats['hits'], cache=name)
+            CACHE_MISSES.set_total(stats['misses'], cache=name)
+
+
+registry.add_collector(collect_metrics)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-
 def custom_jsonify(*args, **kwargs):
+    # Datetimes are encoded as ISO 8601 strings
     return app.response_class(
-        json.dumps(dict(*args, **kwargs), cls=CustomJSONEncoder),
+        serializer.encode(dict(*args, **kwargs)),
         mimetype='application/json'
     )
 
 
-app.json_encoder = CustomJSONEncoder
-
-
 @login_manager.user_loader
 def load_user(user_id):
-    user_doc = db().collection('users').document(user_id).get()
-    if user_doc.exists:
+    def user_exists():
+        with firestore_call('load_user'):
+            return db().collection('users').document(user_id).get().exists
+
+    if user_cache.get_or_load(user_id, user_exists):
         return User(user_id)
     return None
 
@@ -76,20 +111,13 @@ def inject_version():
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    try:
-        logger.info("Initializing Firestore")
-        initialize_firestore()
-
-        logger.info("Admin user initialization completed")
-    except Exception as e:
-        logger.error(f"Error fetching admin user: {str(e)}", exc_info=True)
-
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
         user_ref = db().collection('users').document(username)
-        user_doc = user_ref.get()
+        with firestore_call('login'):
+            user_doc = user_ref.get()
         if user_doc.exists:
             user_data = user_doc.to_dict()
             if check_password_hash(user_data['password_hash'], password):
@@ -103,6 +131,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.get_id())
     logout_user()
     return redirect(url_for('index'))
 
@@ -135,12 +164,45 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+class UploadRequest(Request):
+    """
+    Request that receives allowed uploads into an UploadSpool, which checks their header, hashes
+    them and enforces MAX_UPLOAD_BYTES while the request body is parsed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._upload_spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and allowed_file(filename):
+            spool = UploadSpool(app.config['UPLOAD_FOLDER'], filename, app.config['MAX_UPLOAD_BYTES'])
+            self._upload_spools.append(spool)
+            return spool
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+    def close(self):
+        """
+        Close the files of the request, removing any upload that was received but not published.
+
+        A rejected upload stops the parse before the files are attached to the request, so the spools
+        of the files received before it are closed here rather than with request.files.
+        """
+        for spool in self._upload_spools:
+            spool.close()
+        super().close()
+
+
+app.request_class = UploadRequest
+
+
 @app.before_request
 def log_request_start():
     """
     Log the start of each request.
     """
-    logger.info(f"Start processing request: {request.method} {request.path}")
+    g.request_start = time.perf_counter()
+    request_logger.info(f"Start processing request: {request.method} {request.path}")
 
 
 @app.after_request
@@ -154,7 +216,13 @@ def log_request_end(response):
     Returns:
         response: The unmodified response object.
     """
-    logger.info(f"Finished processing request: {request.method} {request.path} with status {response.status_code}")
+    request_logger.info(f"Finished processing request: {request.method} {request.path} "
+                        f"with status {response.status_code}")
+    if 'request_start' in g:
+        # Routes rather than paths, so that unknown URLs do not create a series each
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_start, route=route, method=request.method,
+                                status=response.status_code)
     return response
 
 
@@ -195,17 +263,80 @@ def get_safe_path(base_dir, filename):
         raise ValueError("Invalid path")
 
 
+def generate_report(file_path, original_filename, cost_per_user, cost_per_exchange, ip_address, content_hash=None,
+                    rows=None):
+    """
+    Load and process an uploaded CSV file. Runs on the background job queue.
+
+    Args:
+        file_path (str): Path to the uploaded CSV file, whose header has already been checked.
+        original_filename (str): The name the file was uploaded with.
+        cost_per_user (int): Cost per user.
+        cost_per_exchange (int): Cost per exchange license.
+        ip_address (str): Address of the client that uploaded the file, for the metrics.
+        content_hash (str, optional): SHA-256 hex digest of the file, computed while it was received.
+            Defaults to None (hashed again if the report cache needs it).
+        rows (int, optional): Number of data rows in the file, for the metrics. Defaults to None.
+
+    Returns:
+        dict: The internal filename and the friendly download filename of the report.
+
+    Raises:
+        ValueError: If the file is not a valid CSV file.
+        RuntimeError: If the report could not be generated.
+    """
+    result = None
+    if report_cache is not None:
+        # An identical earlier upload is answered before the file is loaded
+        content_hash = content_hash or hash_file(file_path)
+        with span('cache lookup'):
+            result = lookup_cached_report(file_path, report_cache, cost_per_user, cost_per_exchange,
+                                          content_hash=content_hash)
+
+    if result is None:
+        if os.path.getsize(file_path) > app.config['STREAMING_THRESHOLD']:
+            # Large files are streamed through process_file in chunks instead of being loaded here
+            df, chunksize = None, app.config['CSV_CHUNK_SIZE']
+        else:
+            df, error_message = load_csv(file_path)
+            if df is None:
+                invalid_path = os.path.join(app.config['INVALID_FOLDER'], original_filename)
+                os.rename(file_path, invalid_path)
+                logger.error(f"File validation failed: {original_filename} - {error_message}")
+                raise ValueError(error_message)
+            chunksize = None
+
+        with span('report'):
+            result = process_file(file_path, cost_per_user, cost_per_exchange, df=df, chunksize=chunksize,
+                                  cache=report_cache, content_hash=content_hash, lookup=False)
+    if result is None:
+        raise RuntimeError("The report could not be generated.")
+    result_path, friendly_filename = result
+    REPORTS_GENERATED.inc()
+    if rows:
+        ROWS_PROCESSED.inc(rows)
+
+    try:
+        increment_unique_users(ip_address)
+        increment_reports_generated()
+    except Exception:
+        logger.exception("Error updating metrics")
+
+    logger.info(f"File processed successfully: {original_filename}")
+    return {'filename': os.path.basename(result_path), 'friendly_filename': friendly_filename}
+
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """
-       Handle file uploads, validate the file, and process it.
+       Handle file uploads, validate the file header, and queue the report job.
 
        Returns:
-           str: Redirects to the summary page on success, or renders an error page on failure.
+           str: Redirects to the pending summary page (or returns the job id as JSON when requested)
+           on success, or renders an error page on failure. Responds with 413 when the file is larger than
+           MAX_UPLOAD_BYTES and with 429 when the job queue is full.
        """
-    global unique_users, reports_generated
     start_time = time.time()
-    unique_users.add(request.headers.get('X-Forwarded-For', request.remote_addr))
 
     try:
         if 'file' not in request.files:
@@ -233,41 +364,37 @@ def upload_file():
                                        error_title='Invalid File Path',
                                        error_message=str(e))
 
-            file.save(file_path)
-            logger.info(f"File uploaded: {filename}")
+            # The header was checked, and the file hashed, while the request body was received
+            upload = file.stream.publish(file_path)
+            logger.info(f"File uploaded: {filename} ({upload.bytes} bytes, {upload.rows} rows)")
+            UPLOAD_SIZE.observe(upload.bytes)
 
-            is_valid, error_message = validate_csv(file_path)
-            if not is_valid:
-                invalid_path = os.path.join(app.config['INVALID_FOLDER'], file.filename)
-                os.rename(file_path, invalid_path)
-                logger.error(f"File validation failed: {file.filename} - {error_message}")
+            try:
+                job = job_queue.submit(generate_report, file_path, file.filename, int(cost_per_user),
+                                       int(cost_per_exchange),
+                                       request.headers.get('X-Forwarded-For', request.remote_addr),
+                                       content_hash=upload.content_hash, rows=upload.rows)
+            except QueueFullError as e:
+                os.remove(file_path)
+                logger.warning(f"Rejected upload {file.filename}: {e}")
                 return render_template('error.html',
-                                       error_title='Invalid CSV File',
-                                       error_message=error_message)
-
-            result_path, friendly_filename = process_file(file_path, int(cost_per_user), int(cost_per_exchange))
-
-            increment_unique_users(request.headers.get('X-Forwarded-For', request.remote_addr))
-            increment_reports_generated()
-
-            logger.info(f"File processed successfully: {file.filename}")
-            file_id = os.path.basename(result_path).split('_')[0]
-            if file_id:
-                session['pending_file_id'] = file_id
-                session['friendly_filename'] = friendly_filename
-                logger.info(f"Set pending file ID in session: {file_id}")
-            else:
-                logger.warning(f"Unable to extract file ID from filename: {os.path.basename(result_path)}")
+                                       error_title='Server Busy',
+                                       error_message="Too many reports are being generated right now. "
+                                                     "Please try again in a moment."), 429
 
+            session['pending_job_id'] = job.id
             end_time = time.time()
             processing_time = end_time - start_time
-            logger.info(f"Processing time for upload: {processing_time:.2f} seconds")
+            logger.info(f"Queued report job {job.id} for {file.filename} in {processing_time:.2f} seconds")
 
-            time.sleep(1)  # Wait for the file to be written to disk
-            return redirect(url_for('show_summary', filename=os.path.basename(result_path)))
+            if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+                return custom_jsonify({'job_id': job.id, 'status_url': url_for('job_status', job_id=job.id)}), 202
+            return redirect(url_for('show_pending_summary', job_id=job.id))
 
         logger.warning(f"File extension not allowed: {file.filename}")
         return redirect(request.url)
+    except UploadRejected as e:
+        return upload_rejected(e)
     except Exception as e:
         logger.exception("An error occurred during file upload")
         return render_template('error.html',
@@ -275,6 +402,150 @@ def upload_file():
                                error_message=str(e))
 
 
+def upload_rejected(e):
+    """
+    Render the error page of an upload rejected while it was received.
+
+    Args:
+        e (UploadRejected): The rejection.
+
+    Returns:
+        tuple or str: The error page, with the 413 status code when the file was too large.
+    """
+    if e.too_large:
+        logger.warning(f"Rejected upload {e.filename}: {e}")
+        return render_template('error.html',
+                               error_title='File Too Large',
+                               error_message=str(e)), 413
+    # Keep what was received of the invalid file for inspection
+    invalid_path = os.path.join(app.config['INVALID_FOLDER'], secure_filename(e.filename))
+    os.replace(e.partial_path, invalid_path)
+    logger.error(f"File validation failed: {e.filename} - {e}")
+    return render_template('error.html',
+                           error_title='Invalid CSV File',
+                           error_message=str(e))
+
+
+def generate_batch_report(exports, cost_per_user, cost_per_exchange, ip_address, rows=None):
+    """
+    Generate the reports of a batch upload. Runs on the background job queue.
+
+    Args:
+        exports (dict): Path to the uploaded CSV file of each tenant, keyed by tenant name. Their headers
+            have already been checked.
+        cost_per_user (int): Cost per user.
+        cost_per_exchange (int): Cost per exchange license.
+        ip_address (str): Address of the client that uploaded the files, for the metrics.
+        rows (dict, optional): Number of data rows in each tenant's file, for the metrics. Defaults to None.
+
+    Returns:
+        dict: The tenant reports, the tenants whose report failed, and the internal filename and friendly
+        download filename of the consolidated report, as returned by `batch.process_batch`.
+
+    Raises:
+        RuntimeError: If none of the reports could be generated.
+    """
+    try:
+        with span('batch report'):
+            result = process_batch(exports, cost_per_user, cost_per_exchange)
+    finally:
+        # Files that were not turned into a report are kept for inspection, like invalid uploads
+        for file_path in exports.values():
+            if os.path.exists(file_path):
+                os.replace(file_path, os.path.join(app.config['INVALID_FOLDER'], os.path.basename(file_path)))
+
+    for report in result['reports']:
+        REPORTS_GENERATED.inc()
+        if rows and rows.get(report['tenant']):
+            ROWS_PROCESSED.inc(rows[report['tenant']])
+    try:
+        increment_unique_users(ip_address)
+        for _ in result['reports']:
+            increment_reports_generated()
+    except Exception:
+        logger.exception("Error updating metrics")
+
+    logger.info(f"Batch processed: {len(result['reports'])} of {len(exports)} reports generated")
+    return result
+
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+       Handle the upload of several exports, one per tenant, and queue a batch report job.
+
+       The files are sent as 'files' and each is named after its tenant. Their headers are
+       checked while they are received, as for /upload. The job generates a report per tenant
+       and a consolidated report, whose summary the pending summary page shows.
+
+       Returns:
+           str: Redirects to the pending summary page (or returns the job id as JSON when requested)
+           on success, or renders an error page on failure. Responds with 413 when a file is larger than
+           MAX_UPLOAD_BYTES and with 429 when the job queue is full.
+       """
+    start_time = time.time()
+
+    try:
+        files = [file for file in request.files.getlist('files') if file.filename]
+        cost_per_user = request.form.get('cost_per_user', 115)
+        cost_per_exchange = request.form.get('cost_per_exchange', 20)
+
+        if not files:
+            logger.warning("No files in the batch upload")
+            return render_template('error.html',
+                                   error_title='No Files Selected',
+                                   error_message="Please choose the exports to upload.")
+        if len(files) > app.config['BATCH_MAX_FILES']:
+            logger.warning(f"Rejected batch upload of {len(files)} files")
+            return render_template('error.html',
+                                   error_title='Too Many Files',
+                                   error_message=f"Upload at most {app.config['BATCH_MAX_FILES']} exports "
+                                                 f"at a time."), 400
+        not_allowed = [file.filename for file in files if not allowed_file(file.filename)]
+        if not_allowed:
+            logger.warning(f"File extension not allowed: {', '.join(not_allowed)}")
+            return render_template('error.html',
+                                   error_title='Invalid File Type',
+                                   error_message=f"Only CSV exports can be uploaded: {', '.join(not_allowed)}")
+
+        # Uploads of the batch share a prefix, so tenants with the same file name do not overwrite each other
+        batch_id = uuid.uuid4().hex
+        exports, rows = {}, {}
+        for tenant, file in zip(tenant_names([file.filename for file in files]), files):
+            file_path = get_safe_path(app.config['UPLOAD_FOLDER'], f"{batch_id}_{len(exports)}_{file.filename}")
+            upload = file.stream.publish(file_path)
+            UPLOAD_SIZE.observe(upload.bytes)
+            exports[tenant], rows[tenant] = file_path, upload.rows
+        logger.info(f"Batch uploaded: {len(exports)} files ({sum(rows.values())} rows)")
+
+        try:
+            job = job_queue.submit(generate_batch_report, exports, int(cost_per_user), int(cost_per_exchange),
+                                   request.headers.get('X-Forwarded-For', request.remote_addr), rows=rows)
+        except QueueFullError as e:
+            for file_path in exports.values():
+                os.remove(file_path)
+            logger.warning(f"Rejected batch upload: {e}")
+            return render_template('error.html',
+                                   error_title='Server Busy',
+                                   error_message="Too many reports are being generated right now. "
+                                                 "Please try again in a moment."), 429
+
+        session['pending_job_id'] = job.id
+        logger.info(f"Queued batch report job {job.id} for {len(exports)} files in "
+                    f"{time.time() - start_time:.2f} seconds")
+
+        if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+            return custom_jsonify({'job_id': job.id, 'status_url': url_for('job_status', job_id=job.id)}), 202
+        return redirect(url_for('show_pending_summary', job_id=job.id))
+    except UploadRejected as e:
+        return upload_rejected(e)
+    except Exception as e:
+        logger.exception("An error occurred during batch upload")
+        return render_template('error.html',
+                               error_title=f"An unexpected error occurred. Please try again.",
+                               error_message=str(e))
+
+
 @app.route('/download/<filename>')
 def download_file(filename):
     """
@@ -298,12 +569,18 @@ def download_file(filename):
             return render_template('error.html',
                                    error_message=f"The requested file does not exist.")
 
-        friendly_filename = session.get('friendly_filename', filename)
+        report_names = session.get('report_names', {})
+        if filename in report_names:
+            # A tenant report of a batch upload; the consolidated report stays pending
+            friendly_filename = report_names.pop(filename)
+            session['report_names'] = report_names
+        else:
+            friendly_filename = session.get('friendly_filename', filename)
 
-        # Store necessary session data before the request context is torn down
-        session.pop('pending_file_id', None)
-        session.pop('friendly_filename', None)
-        logger.info(f"Cleared session data for: {filename}")
+            # Store necessary session data before the request context is torn down
+            session.pop('pending_file_id', None)
+            session.pop('friendly_filename', None)
+            logger.info(f"Cleared session data for: {filename}")
 
         def generate():
             with open(file_path, 'rb') as f:
@@ -313,6 +590,8 @@ def download_file(filename):
             try:
                 os.remove(file_path)
                 logger.info(f"Removed downloaded file: {filename}")
+                if os.path.exists(summary_path(file_path)):
+                    os.remove(summary_path(file_path))
             except Exception as e:
                 logger.error(f"Error in cleanup after download for {filename}: {e}")
 
@@ -327,6 +606,59 @@ def download_file(filename):
                                error_message=f"An unexpected error occurred while trying to download the file: {e}")
 
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Report the status of a report job.
+
+    When the job is done, the report is registered in the session as pending download
+    and the URL of its summary page is included.
+
+    Args:
+        job_id (str): The job identifier returned by the upload.
+
+    Returns:
+        flask.Response: The job state as JSON, or a 404 error if the job is unknown.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return custom_jsonify({'error': 'Job not found'}), 404
+
+    job_data = job.to_dict()
+    if job.status == 'done':
+        filename = job.result['filename']
+        if session.get('pending_job_id') == job_id:
+            session['pending_file_id'] = filename.split('_')[0]
+            session['friendly_filename'] = job.result['friendly_filename']
+            if 'reports' in job.result:
+                session['report_names'] = {report['filename']: report['friendly_filename']
+                                           for report in job.result['reports']}
+            session.pop('pending_job_id', None)
+            logger.info(f"Set pending file ID in session: {session['pending_file_id']}")
+        job_data['summary_url'] = url_for('show_summary', filename=filename)
+        if 'reports' in job.result:
+            job_data['result'] = dict(job.result, reports=[
+                dict(report, download_url=url_for('download_file', filename=report['filename']))
+                for report in job.result['reports']])
+    return custom_jsonify(job_data)
+
+
+@app.route('/summary/pending/<job_id>')
+def show_pending_summary(job_id):
+    """
+    Display the summary page while its report job is still running.
+
+    The page polls `/jobs/<job_id>` and loads the summary once the report is ready.
+
+    Args:
+        job_id (str): The job identifier returned by the upload.
+
+    Returns:
+        str: Rendered HTML for the pending summary page.
+    """
+    return render_template('summary.html', job_id=job_id)
+
+
 @app.route('/summary/<filename>')
 def show_summary(filename):
     """
@@ -341,7 +673,10 @@ def show_summary(filename):
 
     try:
         file_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-        summary_data = generate_summary(file_path)
+        summary_data = load_summary(file_path)
+        if summary_data is None:
+            # Reports produced before summaries were cached only have the workbook
+            summary_data = generate_summary(file_path)
         user_friendly_filename = session.get('friendly_filename', filename)
         return render_template('summary.html', summary=summary_data,
                                filename=filename,
@@ -381,6 +716,18 @@ def cleanup_undownloaded():
         logger.info("Cleared session data")
     else:
         logger.warning("No file ID found in session for cleanup")
+
+    # The tenant reports of a batch upload that were not downloaded either
+    for filename in session.pop('report_names', {}):
+        file_path = os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(filename))
+        for path in (file_path, summary_path(file_path)):
+            try:
+                os.remove(path)
+                logger.info(f"Cleaned up undownloaded file: {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error removing undownloaded file {os.path.basename(path)}: {e}")
     return '', 204
 
 
@@ -408,86 +755,68 @@ def api_login_required(f):
     return decorated_function
 
 
+def tail_logs(log_dir, filters, per_page, skip=0, cursor=None):
+    """
+    Read matching log records newest first, straight from the log files. Used when the log index is disabled.
+
+    Args:
+        log_dir (str): Directory holding app.log.
+        filters (dict): The query filters, as accepted by LogStore.query.
+        per_page (int): Number of records to return.
+        skip (int, optional): Matching records to skip first. Defaults to 0.
+        cursor (LogCursor, optional): Start after this record. Defaults to the newest record.
+
+    Returns:
+        tuple: The records (list of dict) and the cursor of the last one, or None if no records follow it.
+    """
+    logs = []
+    last_cursor = None
+    for position, log in iter_log_records(log_dir, cursor, match=compile_log_filter(filters)):
+        if skip:
+            skip -= 1
+            continue
+        if len(logs) == per_page:
+            return logs, last_cursor
+        logs.append(log)
+        last_cursor = position
+    return logs, None
+
+
 @app.route('/api/logs', methods=['GET'])
 @api_login_required
 def get_logs():
-    log_file_path = os.path.join(app.config['LOG_DIR'], 'app.log')
-    level = request.args.get('level', '').lower()
-    search = request.args.get('search', '').lower()
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    http_method = request.args.get('http_method', '').upper()
-    exclude_api = request.args.get('exclude_api', 'false').lower() == 'true'
-    ip_address = request.args.get('ip_address', '')
-    path = request.args.get('path', '')
-    user_agent = request.args.get('user_agent', '')
+    filters = {
+        'level': request.args.get('level', '').lower(),
+        'search': request.args.get('search', '').lower(),
+        'start_date': request.args.get('start_date'),
+        'end_date': request.args.get('end_date'),
+        'http_method': request.args.get('http_method', '').upper(),
+        'exclude_api': request.args.get('exclude_api', 'false').lower() == 'true',
+        'ip_address': request.args.get('ip_address', ''),
+        'path': request.args.get('path', ''),
+        'user_agent': request.args.get('user_agent', '')
+    }
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 50))
 
-    def parse_timestamp(timestamp):
-        if isinstance(timestamp, datetime):
-            return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp
-        elif isinstance(timestamp, str):
-            timestamp = timestamp.rstrip('Z')  # Remove trailing 'Z' if present
-            try:
-                return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
-            except ValueError:
-                try:
-                    return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
-                except ValueError:
-                    return datetime.min.replace(tzinfo=timezone.utc)
-        else:
-            return datetime.min.replace(tzinfo=timezone.utc)
+    cursor = request.args.get('cursor')
+    next_cursor = None
 
-    all_logs = []
-    with open(log_file_path, 'r') as log_file:
-        for line in log_file:
-            try:
-                log_entry = json.loads(line.strip())
-            except json.JSONDecodeError:
-                log_entry = {
-                    "level": "ERROR",
-                    "event": line.strip(),
-                    "timestamp": datetime.now().isoformat()
-                }
-
-            log_entry['parsed_timestamp'] = parse_timestamp(log_entry.get('timestamp', ''))
-            all_logs.append(log_entry)
-
-    # Sort all logs by timestamp in descending order
-    all_logs.sort(key=lambda x: parse_timestamp(x.get('timestamp', '')), reverse=True)
-
-    # Apply filters
-    filtered_logs = []
-    for log in all_logs:
-        if (not level or log.get('level', '').lower() == level) and \
-                (not start_date or parse_timestamp(log.get('timestamp', '')) >= parse_timestamp(start_date)) and \
-                (not end_date or parse_timestamp(log.get('timestamp', '')) <= parse_timestamp(end_date)) and \
-                (not http_method or log.get('method', '').upper() == http_method) and \
-                (not ip_address or log.get('ip', '') == ip_address) and \
-                (not path or path in log.get('path', '')) and \
-                (not user_agent or user_agent in log.get('user_agent', '')) and \
-                (not exclude_api or not log.get('path', '').startswith('/api/')):
-
-            log_copy = log.copy()
-            for key, value in log_copy.items():
-                if isinstance(value, datetime):
-                    log_copy[key] = value.isoformat()
-
-            if not search or search.lower() in json.dumps(log_copy, cls=CustomJSONEncoder).lower():
-                filtered_logs.append(log_copy)
-
-    # Calculate pagination
-    total_logs = len(filtered_logs)
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_logs = filtered_logs[start:end]
+    if app.config['LOG_INDEX']:
+        paginated_logs, total_logs = get_log_store(app.config['LOG_DIR']).query(filters, page, per_page)
+    else:
+        # Reading backwards from the end of the log only costs the records returned, so no total is counted
+        try:
+            cursor = LogCursor.parse(cursor) if cursor else None
+        except ValueError:
+            return custom_jsonify({'error': 'Invalid cursor'}), 400
+        skip = 0 if cursor else (page - 1) * per_page
+        paginated_logs, next_cursor = tail_logs(app.config['LOG_DIR'], filters, per_page, skip, cursor)
+        total_logs = None
 
     # Prepare logs for output
     for log in paginated_logs:
         log['timestamp'] = parse_timestamp(log.get('timestamp', '')).isoformat()
-        if 'parsed_timestamp' in log:
-            del log['parsed_timestamp']
         if 'event' not in log and 'message' in log:
             log['event'] = log['message']
         if 'event' not in log:
@@ -503,7 +832,8 @@ def get_logs():
         'total': total_logs,
         'page': page,
         'per_page': per_page,
-        'total_pages': (total_logs + per_page - 1) // per_page
+        'total_pages': (total_logs + per_page - 1) // per_page if total_logs is not None else None,
+        'next_cursor': str(next_cursor) if next_cursor else None
     })
 
 
@@ -529,6 +859,34 @@ def api_reset_metrics():
         return jsonify({"error": "Failed to reset metrics"}), 500
 
 
+@app.route('/api/cache_stats')
+@api_login_required
+def api_cache_stats():
+    return jsonify({
+        'pid': os.getpid(),
+        'metrics': metrics_cache.stats(),
+        'users': user_cache.stats(),
+        'reports': report_cache.stats() if report_cache else None
+    })
+
+
+@app.route('/api/perf')
+@api_login_required
+def api_perf():
+    return jsonify(get_perf_stats())
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Expose the metrics of every worker in the Prometheus text format.
+
+    Returns:
+        Response: The metrics, summed over the workers.
+    """
+    return Response(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     # Log the exception
@@ -541,6 +899,14 @@ def health_check():
     return jsonify({"status": "healthy"}), 200
 
 
+@app.route('/health/firestore')
+def firestore_health_check():
+    probe = check_firestore()
+    status = {"status": "healthy" if probe['healthy'] else "unhealthy", "probe": probe,
+              "stats": get_firestore_stats()}
+    return jsonify(status), 200 if probe['healthy'] else 503
+
+
 if __name__ == '__main__':
     try:
         logger.info("Initializing Firestore")
@@ -0,0 +1,244 @@
+"""
+Batch report module for the AION License Count application.
+
+This module turns a batch of license exports, one per tenant, into a report for each
+tenant and a consolidated report across all of them. The tenants are processed in
+parallel, each by `process_file` in a process of its own, on a pool with one process
+per available core; the largest exports are started first so the pool stays busy
+until the end. The consolidated workbook merges the License Counts of the tenant
+reports once they are done.
+
+It backs the /upload/batch route and can also be run from the command line:
+
+    python batch.py exports/*.csv [--output-dir output] [--cost-per-user 115]
+        [--cost-per-exchange 20] [--workers N]
+
+Each export is named after its tenant, e.g. 'contoso.csv'. The command line copies
+the exports before processing them, since `process_file` removes its input.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+from create_app import app
+from csv_parser import (process_file, lookup_cached_report, read_license_counts, consolidate_license_counts,
+                        save_consolidated_excel, summarize_license_counts, save_summary, summary_path)
+from utils.logger import get_logger, setup_logging, setup_worker_logging, forward_worker_logs
+from utils.report_cache import ReportCache, hash_file
+from utils.validation import load_csv
+from werkzeug.utils import secure_filename
+
+logger = get_logger(__name__)
+
+# Settings the worker processes take from the process that starts the batch
+WORKER_CONFIG = ['OUTPUT_FOLDER', 'STREAMING_THRESHOLD', 'CSV_CHUNK_SIZE', 'REPORT_CACHE_DIR',
+                 'REPORT_CACHE_MAX_BYTES', 'REPORT_CACHE_MAX_AGE']
+
+
+def available_cores():
+    """
+    Returns:
+        int: The number of cores this process may run on.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS and Windows
+        return os.cpu_count() or 1
+
+
+def tenant_names(filenames):
+    """
+    Name the tenant of each export after its file.
+
+    Args:
+        filenames (list): The file names of the exports.
+
+    Returns:
+        list: A tenant name per file, made unique by numbering repeated names.
+    """
+    names = []
+    seen = {}
+    for filename in filenames:
+        name = os.path.splitext(os.path.basename(filename))[0] or 'tenant'
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return names
+
+
+def _init_worker(config, log_queue):
+    # Workers are spawned, so they start with the defaults of create_app and no log handlers. Their records
+    # are written by the parent, as several processes rotating the same app.log would lose lines.
+    app.config.update(config)
+    setup_worker_logging(log_queue)
+
+
+def process_tenant(file_path, cost_per_user, cost_per_exchange):
+    """
+    Generate the report of one tenant's export. Runs in a worker process.
+
+    Args:
+        file_path (str): Path to the CSV export, which is removed once its report is generated.
+        cost_per_user (int): Cost per user.
+        cost_per_exchange (int): Cost per exchange license.
+
+    Returns:
+        tuple: The path of the report, and its license counts DataFrame.
+
+    Raises:
+        ValueError: If the file is not a valid CSV file.
+        RuntimeError: If the report could not be generated.
+    """
+    cache = ReportCache(app.config['REPORT_CACHE_DIR'], app.config['REPORT_CACHE_MAX_BYTES'],
+                        app.config['REPORT_CACHE_MAX_AGE']) if app.config['REPORT_CACHE_MAX_BYTES'] else None
+    result, content_hash = None, None
+    if cache is not None:
+        # A tenant whose export has not changed is answered before the file is loaded
+        content_hash = hash_file(file_path)
+        result = lookup_cached_report(file_path, cache, cost_per_user, cost_per_exchange, content_hash=content_hash)
+
+    if result is None:
+        if os.path.getsize(file_path) > app.config['STREAMING_THRESHOLD']:
+            df, chunksize = None, app.config['CSV_CHUNK_SIZE']
+        else:
+            df, error_message = load_csv(file_path)
+            if df is None:
+                raise ValueError(error_message)
+            chunksize = None
+        result = process_file(file_path, cost_per_user, cost_per_exchange, df=df, chunksize=chunksize, cache=cache,
+                              content_hash=content_hash, lookup=False)
+    if result is None:
+        raise RuntimeError("The report could not be generated.")
+    excel_path, _ = result
+    # Read back from the workbook, which also covers reports served from the cache
+    return excel_path, read_license_counts(excel_path)
+
+
+def process_batch(exports, cost_per_user=115, cost_per_exchange=20, workers=None):
+    """
+    Generate the report of each tenant in parallel, then the consolidated report.
+
+    Args:
+        exports (dict): Path to the CSV export of each tenant, keyed by tenant name. Each export is removed
+            once its report is generated.
+        cost_per_user (int, optional): Cost per user. Defaults to 115.
+        cost_per_exchange (int, optional): Cost per exchange license. Defaults to 20.
+        workers (int, optional): Processes to use. Defaults to BATCH_WORKERS, or one per available core,
+            and never more than there are exports.
+
+    Returns:
+        dict: A dict containing:
+            - 'reports': The 'tenant', 'filename' and 'friendly_filename' of each tenant report, in the
+              order of exports.
+            - 'errors': Why the report failed, for each tenant without one.
+            - 'filename', 'friendly_filename': The consolidated report.
+
+    Raises:
+        RuntimeError: If no tenant report could be generated.
+    """
+    start_time = time.time()
+    workers = max(1, min(workers or app.config['BATCH_WORKERS'] or available_cores(), len(exports)))
+    current_date = datetime.now().strftime('%Y_%m_%d')
+    logger.info(f"Processing a batch of {len(exports)} exports on {workers} processes")
+
+    results, errors = {}, {}
+    # Spawned rather than forked, as the threads of this process (logging, metrics, jobs) do not survive a fork
+    mp_context = get_context('spawn')
+    log_queue = mp_context.Queue()
+    log_listener = forward_worker_logs(log_queue)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                                 initargs=({key: app.config[key] for key in WORKER_CONFIG}, log_queue)) as executor:
+            largest_first = sorted(exports.items(), key=lambda item: os.path.getsize(item[1]), reverse=True)
+            futures = {executor.submit(process_tenant, file_path, cost_per_user, cost_per_exchange): tenant
+                       for tenant, file_path in largest_first}
+            for future in as_completed(futures):
+                tenant = futures[future]
+                try:
+                    results[tenant] = future.result()
+                    logger.info(f"Generated the report of tenant {tenant}")
+                except Exception as e:
+                    errors[tenant] = str(e)
+                    logger.error(f"Error generating the report of tenant {tenant}: {e}")
+    finally:
+        log_listener.stop()
+
+    if not results:
+        raise RuntimeError("None of the reports could be generated.")
+
+    reports = [{'tenant': tenant, 'filename': os.path.basename(results[tenant][0]),
+                'friendly_filename': f"AION_License_Report_{secure_filename(tenant) or 'tenant'}_{current_date}.xlsx"}
+               for tenant in exports if tenant in results]
+
+    offices_df, tenants_df = consolidate_license_counts(
+        {tenant: results[tenant][1] for tenant in exports if tenant in results})
+    excel_path = os.path.join(app.config['OUTPUT_FOLDER'],
+                              f"{uuid.uuid4()}_consolidated_license_counts_{current_date}.xlsx")
+    if not save_consolidated_excel(excel_path, offices_df, tenants_df):
+        raise RuntimeError("The consolidated report could not be generated.")
+
+    # Summarized like a single report, with each office named after its tenant
+    summary_df = offices_df.copy()
+    summary_df.index = [f"{tenant} / {office}" if office else tenant for tenant, office in summary_df.index]
+    save_summary(excel_path, summarize_license_counts(summary_df))
+
+    logger.info(f"Batch processing time: {time.time() - start_time:.2f} seconds for {len(exports)} exports "
+                f"on {workers} processes")
+    return {
+        'reports': reports,
+        'errors': errors,
+        'filename': os.path.basename(excel_path),
+        'friendly_filename': f"AION_License_Report_Consolidated_{current_date}.xlsx"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the license reports of a batch of tenant exports.")
+    parser.add_argument('exports', nargs='+', help="CSV exports, one per tenant, each named after its tenant")
+    parser.add_argument('--output-dir', default=app.config['OUTPUT_FOLDER'], help="Directory for the workbooks")
+    parser.add_argument('--cost-per-user', type=int, default=115, help="Cost per user (default: 115)")
+    parser.add_argument('--cost-per-exchange', type=int, default=20, help="Cost per exchange license (default: 20)")
+    parser.add_argument('--workers', type=int, help="Processes to use (default: one per available core)")
+    args = parser.parse_args()
+
+    setup_logging()
+    os.makedirs(args.output_dir, exist_ok=True)
+    app.config['OUTPUT_FOLDER'] = args.output_dir
+    start_time = time.time()
+
+    with tempfile.TemporaryDirectory(dir=args.output_dir, prefix='.batch-') as input_dir:
+        exports = {}
+        for tenant, export in zip(tenant_names(args.exports), args.exports):
+            file_path = os.path.join(input_dir, f"{len(exports)}_{secure_filename(os.path.basename(export))}")
+            try:
+                os.link(export, file_path)
+            except OSError:
+                shutil.copyfile(export, file_path)
+            exports[tenant] = file_path
+        try:
+            result = process_batch(exports, args.cost_per_user, args.cost_per_exchange, args.workers)
+        except RuntimeError as e:
+            sys.exit(str(e))
+
+    # Give the workbooks their friendly names; the cached summaries are only used by the web app
+    print(f"{'tenant':<30} workbook")
+    for report in result['reports'] + [{'tenant': 'Consolidated', **result}]:
+        excel_path = os.path.join(args.output_dir, report['filename'])
+        os.replace(excel_path, os.path.join(args.output_dir, report['friendly_filename']))
+        if os.path.exists(summary_path(excel_path)):
+            os.remove(summary_path(excel_path))
+        print(f"{report['tenant']:<30} {os.path.join(args.output_dir, report['friendly_filename'])}")
+    for tenant, error in result['errors'].items():
+        print(f"{tenant:<30} failed: {error}")
+    print(f"\n{len(result['reports'])} of {len(args.exports)} reports in {time.time() - start_time:.1f}s")
+    sys.exit(1 if result['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Benchmark for the csv_parser report pipeline.
+
+Generates license exports with `tests.test_data_generator.generate_test_csv` for each
+combination of row count and office cardinality, then runs the stages of
+`process_file` one by one and times each of them:
+
+- read: load and prepare the CSV (`read_and_prepare_data`); part of count when chunked
+- count: count licenses per office and collect the detail rows
+- cost columns: build the license counts table and add the costs
+- excel write: `save_to_excel`
+- summary: summarize the license counts and save the summary
+
+Files above the app's STREAMING_THRESHOLD are processed in chunks, as the app does.
+Every case runs in a fresh process, so the peak RSS recorded after each stage belongs
+to that case alone.
+
+Results are written as JSON. Given a baseline from an earlier run, the benchmark exits
+with status 1 when a stage got slower (or its peak RSS larger) than the threshold allows.
+
+Usage:
+    python -m benchmarks.bench_csv_parser [--sizes 10000,100000,1000000,5000000] [--offices 13,1000]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import structlog
+
+from utils.perf import peak_rss_mb
+
+DEFAULT_SIZES = [10000, 100000, 1000000, 5000000]
+# 13 is the office list of the test data generator; the others use generated office names
+DEFAULT_OFFICES = [13, 1000]
+GENERATOR_OFFICES = 13
+STAGES = ['read', 'count', 'cost columns', 'excel write', 'summary']
+
+
+def generate_input(data_dir, rows, offices):
+    """
+    Generate the export of a case, or reuse it from an earlier run.
+
+    Args:
+        data_dir (str): Directory of the generated files.
+        rows (int): Number of rows.
+        offices (int): Number of distinct offices.
+
+    Returns:
+        str: Path to the CSV file.
+    """
+    from tests.test_data_generator import generate_test_csv
+
+    case_dir = Path(data_dir) / f"{rows}_rows_{offices}_offices"
+    csv_path = case_dir / "test_data.csv"
+    if not csv_path.exists():
+        case_dir.mkdir(parents=True, exist_ok=True)
+        random.seed(rows * 100003 + offices)
+        generate_test_csv(case_dir, rows, None if offices == GENERATOR_OFFICES else offices)
+    return str(csv_path)
+
+
+def run_case(csv_path, output_dir):
+    """
+    Run the pipeline stages on one file. Meant to run in a fresh process.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        output_dir (str): Directory for the workbook.
+
+    Returns:
+        dict: The processing mode and, per stage, its wall time in seconds and the peak RSS so far.
+    """
+    import csv_parser
+    from csv_parser import (read_and_prepare_data, initialize_license_counts, count_licenses,
+                            count_licenses_in_chunks, create_license_counts_df, add_cost_columns, save_to_excel,
+                            summarize_license_counts, save_summary)
+    from create_app import app
+
+    # Keep the pipeline's progress messages out of the results table
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    costs = (115, 20, 54.80, 4)
+    classifier = csv_parser.license_classifier
+    target_licenses = classifier.target_licenses
+    chunked = os.path.getsize(csv_path) > app.config['STREAMING_THRESHOLD']
+    stages = {}
+
+    def stage(name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        stages[name] = {'seconds': round(time.perf_counter() - start, 4), 'peak_rss_mb': peak_rss_mb()}
+        return result
+
+    if chunked:
+        license_counts, *details = stage('count', count_licenses_in_chunks, csv_path, target_licenses,
+                                         app.config['CSV_CHUNK_SIZE'], classifier)
+    else:
+        df = stage('read', read_and_prepare_data, csv_path)
+        license_counts, *details = stage('count', count_licenses, df, target_licenses,
+                                         initialize_license_counts(df, target_licenses), classifier)
+        del df
+
+    def cost_columns():
+        license_counts_df = create_license_counts_df(license_counts)
+        add_cost_columns(license_counts_df, *costs)
+        return license_counts_df
+
+    license_counts_df = stage('cost columns', cost_columns)
+    unaccounted_users, aion_management, aion_partners, properties = details
+    excel_path = os.path.join(output_dir, 'report.xlsx')
+    try:
+        saved = stage('excel write', save_to_excel, excel_path, license_counts_df, aion_management, aion_partners,
+                      properties, unaccounted_users, *costs, constant_memory=chunked)
+    finally:
+        if chunked:
+            for spill in details:
+                spill.close()
+    if not saved:
+        raise RuntimeError(f"The workbook for {csv_path} was not written")
+    stage('summary', lambda: save_summary(excel_path, summarize_license_counts(license_counts_df)))
+    return {'mode': 'chunked' if chunked else 'memory', 'stages': stages}
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """
+    Find the stages that regressed against a baseline.
+
+    Args:
+        results (dict): Results of this run.
+        baseline (dict): Results of the baseline run.
+        threshold (float): Allowed relative increase, e.g. 0.2 for 20%.
+        min_seconds (float): Time differences smaller than this are treated as noise.
+
+    Returns:
+        list: A description of each regression.
+    """
+    regressions = []
+    for case, result in results['cases'].items():
+        base_case = baseline.get('cases', {}).get(case)
+        if base_case is None:
+            continue
+        for name, timing in result['stages'].items():
+            base = base_case['stages'].get(name)
+            if base is None:
+                continue
+            if timing['seconds'] - base['seconds'] > max(base['seconds'] * threshold, min_seconds):
+                regressions.append(f"{case} {name}: {base['seconds']:.3f}s -> {timing['seconds']:.3f}s")
+            if timing['peak_rss_mb'] and base['peak_rss_mb'] and \
+                    timing['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+                regressions.append(f"{case} {name}: peak RSS {base['peak_rss_mb']:.0f} MB -> "
+                                   f"{timing['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def parse_counts(value):
+    return [int(count) for count in value.split(',') if count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=parse_counts, default=DEFAULT_SIZES, help='Comma-separated row counts')
+    parser.add_argument('--offices', type=parse_counts, default=DEFAULT_OFFICES,
+                        help='Comma-separated office cardinalities')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'aion_bench_csv_parser'),
+                        help='Directory for the generated exports, which are reused between runs')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against the results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative regression per stage (default: 0.2)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Ignore time regressions smaller than this (default: 0.05)')
+    args = parser.parse_args()
+
+    results = {'python': platform.python_version(), 'platform': platform.platform(), 'cases': {}}
+    print(f"{'case':<28} {'mode':<8}" + ''.join(f" {name:>12}" for name in STAGES) + f" {'peak RSS':>10}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for rows in args.sizes:
+            for offices in args.offices:
+                case = f"{rows} rows, {offices} offices"
+                csv_path = generate_input(args.data_dir, rows, offices)
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    result = executor.submit(run_case, csv_path, output_dir).result()
+                result.update(rows=rows, offices=offices, bytes=os.path.getsize(csv_path))
+                results['cases'][case] = result
+
+                stages = result['stages']
+                timings = ''.join(f" {stages[name]['seconds']:>11.3f}s" if name in stages else f" {'-':>12}"
+                                  for name in STAGES)
+                peak = max((timing['peak_rss_mb'] or 0) for timing in stages.values())
+                print(f"{case:<28} {result['mode']:<8}{timings} {peak:>7.0f} MB", flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark for the JSON serializers of `utils.serializer`.
+
+Reads log lines, from the application's own log when one is given or else the
+synthetic log of `benchmarks.bench_log_query`, and times each installed serializer
+on the JSON work the application does with them:
+
+- decode: parse a line and the structlog event nested in its message, as
+  `utils.log_store.parse_log_line` does for /api/logs
+- encode: write the decoded records back out, as /api/logs responses do
+- log line: render a structlog event and wrap it in the file formatter's record, as
+  `utils.logger` does for every line logged
+
+Usage:
+    python -m benchmarks.bench_json [--log-file logs/app.log] [--lines 200000] [--repeat 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_log_query import write_log
+from utils.serializer import available_serializers, get_serializer
+
+OPERATIONS = ['decode', 'encode', 'log line']
+
+
+def read_lines(log_file, lines):
+    """
+    Read the JSON lines among the first lines of a log file.
+
+    Args:
+        log_file (str): Path to the log file.
+        lines (int): Number of lines to read.
+
+    Returns:
+        list: The lines (bytes), without line breaks.
+    """
+    with open(log_file, 'rb') as f:
+        return [line.rstrip(b'\n') for line, _ in zip(f, range(lines)) if line.startswith(b'{')]
+
+
+def decode(serializer, lines):
+    records = []
+    for line in lines:
+        record = serializer.loads(line)
+        message = record.get('message')
+        if isinstance(message, str) and message.startswith('{'):
+            record.update(serializer.loads(message))
+            del record['message']
+        records.append(record)
+    return records
+
+
+def encode(serializer, records):
+    return sum(len(serializer.encode(record, default=str)) for record in records)
+
+
+def log_lines(serializer, records):
+    written = 0
+    for record in records:
+        event = {key: value for key, value in record.items() if key not in ('name', 'timestamp')}
+        message = serializer.dumps(event, default=repr)
+        written += len(serializer.dumps({'timestamp': record.get('timestamp'), 'level': record.get('level'),
+                                         'name': record.get('name'), 'message': message}, default=str))
+    return written
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--log-file', help='Log to read the lines from (defaults to a synthetic log)')
+    parser.add_argument('--lines', type=int, default=200000, help='Lines to use (default: 200000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per operation; the fastest counts (default: 3)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = args.log_file
+        if not log_file:
+            log_file = os.path.join(tmp_dir, 'app.log')
+            write_log(log_file, args.lines)
+        lines = read_lines(log_file, args.lines)
+    size = sum(len(line) for line in lines)
+    print(f"{len(lines)} lines, {size / 1e6:.1f} MB from {args.log_file or 'a synthetic log'}\n")
+
+    print(f"{'serializer':<10}" + ''.join(f" {name:>22}" for name in OPERATIONS))
+    baseline = {}
+    for name in ['json'] + [name for name in available_serializers() if name != 'json']:
+        serializer = get_serializer(name)
+        records, decode_seconds = best_of(args.repeat, decode, serializer, lines)
+        _, encode_seconds = best_of(args.repeat, encode, serializer, records)
+        _, log_seconds = best_of(args.repeat, log_lines, serializer, records)
+        timings = dict(zip(OPERATIONS, (decode_seconds, encode_seconds, log_seconds)))
+        baseline = baseline or timings
+        print(f"{name:<10}" + ''.join(
+            f" {len(lines) / seconds / 1000:>8.0f}k lines/s {baseline[operation] / seconds:>4.1f}x"
+            for operation, seconds in timings.items()), flush=True)
+
+
+if __name__ == '__main__':
+    main()
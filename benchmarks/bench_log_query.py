@@ -0,0 +1,145 @@
+"""
+Benchmark for the /api/logs query paths.
+
+Writes a synthetic log in the format produced by `utils.logger` and times a set of
+typical admin center queries three ways:
+
+- full scan: parse every line, sort, then check each record against the filters (the
+  original /api/logs implementation)
+- compiled: check every line with `compile_log_filter`, without paging
+- tail page: the first page of 50 results, read backwards with the compiled filter
+
+Usage:
+    python -m benchmarks.bench_log_query [--lines 1000000] [--log-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils.log_filter import compile_log_filter
+from utils.log_reader import iter_log_records, parse_line
+from utils.log_store import parse_log_line, parse_timestamp
+
+PATHS = ['/', '/upload', '/summary', '/download/report.xlsx', '/api/logs', '/api/metrics', '/admin_center']
+METHODS = ['GET', 'GET', 'GET', 'POST']
+LEVELS = ['info'] * 90 + ['warning'] * 8 + ['error'] * 2
+EVENTS = ['Request received', 'File uploaded', 'Processing file', 'Report generated', 'Metrics fetched',
+          'Invalid CSV file', 'User logged in']
+
+QUERIES = {
+    'no filters': {},
+    'level=error': {'level': 'error'},
+    'exclude_api + GET': {'exclude_api': True, 'http_method': 'GET'},
+    'search=report': {'search': 'report'},
+    'search=invalid csv': {'search': 'invalid csv'},
+    'date range': {'start_date': '2024-01-01T06:00:00', 'end_date': '2024-01-01T07:00:00'},
+}
+
+
+def write_log(path, lines):
+    """
+    Write a synthetic JSON log.
+
+    Args:
+        path (str): File to write.
+        lines (int): Number of log lines.
+    """
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with open(path, 'w') as f:
+        for i in range(lines):
+            timestamp = start + timedelta(milliseconds=i * 50)
+            level = rng.choice(LEVELS)
+            event = {
+                'event': rng.choice(EVENTS),
+                'level': level,
+                'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                'ip': f'10.0.{rng.randint(0, 20)}.{rng.randint(1, 254)}',
+                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+                'path': rng.choice(PATHS),
+                'method': rng.choice(METHODS)
+            }
+            f.write(json.dumps({
+                'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3],
+                'level': level.upper(),
+                'name': 'app',
+                'message': json.dumps(event)
+            }) + '\n')
+
+
+def full_scan(log_path, filters):
+    # The original implementation: parse everything, sort, then filter record by record
+    all_logs = []
+    with open(log_path, 'r') as log_file:
+        for line in log_file:
+            log_entry = parse_log_line(line.strip())
+            log_entry['parsed_timestamp'] = parse_timestamp(log_entry.get('timestamp', ''))
+            all_logs.append(log_entry)
+    all_logs.sort(key=lambda x: parse_timestamp(x.get('timestamp', '')), reverse=True)
+
+    matches = 0
+    for log in all_logs:
+        if (not filters.get('level') or log.get('level', '').lower() == filters['level']) and \
+                (not filters.get('start_date') or
+                 parse_timestamp(log.get('timestamp', '')) >= parse_timestamp(filters['start_date'])) and \
+                (not filters.get('end_date') or
+                 parse_timestamp(log.get('timestamp', '')) <= parse_timestamp(filters['end_date'])) and \
+                (not filters.get('http_method') or log.get('method', '').upper() == filters['http_method']) and \
+                (not filters.get('exclude_api') or not log.get('path', '').startswith('/api/')):
+            log_copy = {key: value for key, value in log.items() if key != 'parsed_timestamp'}
+            if not filters.get('search') or filters['search'] in json.dumps(log_copy).lower():
+                matches += 1
+    return matches
+
+
+def compiled_scan(log_path, filters):
+    match = compile_log_filter(filters)
+    with open(log_path, 'rb') as log_file:
+        return sum(1 for line in log_file if match(line.rstrip(b'\n')) is not None)
+
+
+def tail_page(log_dir, filters, per_page=50):
+    records = iter_log_records(log_dir, match=compile_log_filter(filters) if filters else parse_line)
+    return sum(1 for _, _ in zip(range(per_page), records))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--lines', type=int, default=1000000, help='Number of synthetic log lines')
+    parser.add_argument('--log-dir', help='Directory for the synthetic log (defaults to a temporary directory)')
+    parser.add_argument('--skip-full-scan', action='store_true', help='Skip the slow original implementation')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_dir = args.log_dir or tmp_dir
+        log_path = os.path.join(log_dir, 'app.log')
+        _, seconds = timed(write_log, log_path, args.lines)
+        print(f"Wrote {args.lines} lines ({os.path.getsize(log_path) / 1e6:.0f} MB) in {seconds:.1f}s\n")
+
+        print(f"{'query':<20} {'matches':>9} {'full scan':>10} {'compiled':>10} {'speedup':>8} {'tail page':>10}")
+        for name, filters in QUERIES.items():
+            matches, compiled_seconds = timed(compiled_scan, log_path, filters)
+            _, tail_seconds = timed(tail_page, log_dir, filters)
+            if args.skip_full_scan:
+                full, speedup = '-', '-'
+            else:
+                full_matches, full_seconds = timed(full_scan, log_path, filters)
+                assert full_matches == matches, f"{name}: {full_matches} != {matches}"
+                full, speedup = f"{full_seconds:.2f}s", f"{full_seconds / compiled_seconds:.1f}x"
+            print(f"{name:<20} {matches:>9} {full:>10} {compiled_seconds:>9.2f}s {speedup:>8} "
+                  f"{tail_seconds * 1000:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark for the cost of logging on the request path.
+
+Sends requests to /health through the Flask test client, each of which writes a
+start and an end line to the request logger, and times them with the log handlers
+set up three ways:
+
+- direct: the file and console handlers format and write on the request thread
+  (LOG_QUEUE_SIZE = 0)
+- queued: the handlers run on the background thread of a BoundedQueueHandler
+- queued, sampled: as queued, with only a share of the INFO request lines kept
+
+The log is written to a temporary directory and the console output to /dev/null.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 20000] [--sample-rate 0.1]
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+from create_app import app
+
+MODES = ['direct', 'queued', 'queued, sampled']
+
+
+def run_mode(client, mode, requests, sample_rate):
+    """
+    Time requests with the log handlers of one mode.
+
+    Args:
+        client (FlaskClient): Test client of the app.
+        mode (str): One of MODES.
+        requests (int): Number of requests.
+        sample_rate (float): Share of INFO request lines kept when sampled.
+
+    Returns:
+        dict: Per-request latency percentiles in microseconds, the seconds the queue took to drain
+            after the last request, and the records dropped.
+    """
+    from utils import logger
+
+    app.config['LOG_QUEUE_SIZE'] = 0 if mode == 'direct' else 10000
+    app.config['LOG_REQUEST_SAMPLE_RATES'] = {'INFO': sample_rate} if mode == 'queued, sampled' else {}
+    logger.setup_logging()
+    handler = logger._installed_handlers[0]
+
+    for _ in range(min(requests // 10, 1000)):  # Warm up
+        client.get('/health')
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/health')
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if isinstance(handler, logger.BoundedQueueHandler):
+        handler.stop()
+    drain = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'mean': sum(latencies) / len(latencies) * 1e6,
+        'p50': latencies[math.ceil(len(latencies) * 50 / 100) - 1] * 1e6,
+        'p99': latencies[math.ceil(len(latencies) * 99 / 100) - 1] * 1e6,
+        'drain': drain,
+        'dropped': getattr(handler, 'dropped', 0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=20000, help='Requests per mode')
+    parser.add_argument('--sample-rate', type=float, default=0.1,
+                        help='Share of INFO request lines kept in the sampled mode (default: 0.1)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        # The log directory has to be set before utils.logger is imported, and the metrics registry before app is;
+        # the registry stays in memory so the requests timed here are not added to those of a running server
+        app.config['LOG_DIR'] = log_dir
+        app.config['METRICS_REGISTRY_DIR'] = None
+        sys.stderr = open(os.devnull, 'w')
+        from app import app as flask_app
+
+        print(f"{'mode':<16} {'mean':>9} {'p50':>9} {'p99':>9} {'drain':>8} {'dropped':>8}")
+        client = flask_app.test_client()
+        for mode in MODES:
+            result = run_mode(client, mode, args.requests, args.sample_rate)
+            print(f"{mode:<16} {result['mean']:>7.0f}us {result['p50']:>7.0f}us {result['p99']:>7.0f}us "
+                  f"{result['drain']:>7.2f}s {result['dropped']:>8}", flush=True)
+        print(f"\nLog written: {os.path.getsize(os.path.join(log_dir, 'app.log')) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ and creates necessary directories for file handling and logging.
 from flask import Flask
 import os
 import json
+import tempfile
 
 app = Flask(__name__)
 
@@ -15,6 +16,31 @@ app.config['OUTPUT_FOLDER'] = 'output'  # Directory for output files
 app.config['INVALID_FOLDER'] = 'invalid'  # Directory for invalid files
 app.config['ALLOWED_EXTENSIONS'] = {'csv'}  # Allowed file extensions
 app.config['LOG_DIR'] = 'logs'  # Directory for log files
+app.config['LOG_INDEX'] = True  # Serve /api/logs from an SQLite index of app.log kept in LOG_DIR
+app.config['LOG_QUEUE_SIZE'] = 10000  # Log records queued for the background log writer; 0 writes on the calling thread
+app.config['LOG_QUEUE_OVERFLOW'] = 'drop'  # When the log queue is full: 'drop' records below WARNING, or 'block'
+app.config['LOG_REQUEST_SAMPLE_RATES'] = {'INFO': 1.0}  # Share of request start/end log lines kept, by level
+app.config['JSON_SERIALIZER'] = os.environ.get('JSON_SERIALIZER')  # 'orjson', 'msgspec' or 'json'; unset uses the fastest installed
+app.config['MAX_UPLOAD_BYTES'] = 1024 * 1024 * 1024  # Uploads larger than this many bytes are rejected while received; 0 for no limit
+app.config['STREAMING_THRESHOLD'] = 100 * 1024 * 1024  # Uploads larger than this many bytes are processed in chunks
+app.config['CSV_CHUNK_SIZE'] = 100000  # Rows per chunk when processing in chunks
+app.config['JOB_WORKERS'] = 2  # Report jobs run concurrently in each worker process
+app.config['JOB_QUEUE_DEPTH'] = 10  # Queued and running report jobs allowed before uploads are rejected with 429
+app.config['JOB_TTL'] = 3600  # Seconds the status of a finished report job is kept
+app.config['BATCH_WORKERS'] = None  # Processes that generate the reports of a batch upload; None uses one per available core
+app.config['BATCH_MAX_FILES'] = 50  # Exports accepted in one batch upload
+app.config['METRICS_BACKEND'] = os.environ.get('METRICS_BACKEND', 'firestore')  # 'firestore', or 'sqlite' to keep metrics locally
+app.config['METRICS_DB_PATH'] = os.environ.get('METRICS_DB_PATH', 'metrics.db')  # Database file of the 'sqlite' metrics backend
+app.config['METRICS_BATCH_SIZE'] = 100  # Queued metrics events that trigger a write
+app.config['METRICS_FLUSH_INTERVAL'] = 5  # Seconds between writes of queued metrics events
+app.config['METRICS_CACHE_TTL'] = 10  # Seconds /api/metrics results are reused by a worker
+app.config['USER_CACHE_TTL'] = 60  # Seconds a logged-in user's Firestore lookup is reused by a worker
+app.config['REPORT_CACHE_DIR'] = os.path.join('cache', 'reports')  # Reports kept for identical uploads
+app.config['REPORT_CACHE_MAX_BYTES'] = 500 * 1024 * 1024  # Size the report cache is trimmed to; 0 disables it
+app.config['REPORT_CACHE_MAX_AGE'] = 7 * 24 * 3600  # Seconds a cached report is kept after its last use
+app.config['METRICS_REGISTRY_DIR'] = os.environ.get(
+    'METRICS_REGISTRY_DIR', os.path.join(tempfile.gettempdir(), 'aion_metrics'))  # Shared by the workers for /metrics
+app.config['METRICS_REGISTRY_SYNC_INTERVAL'] = 5  # Seconds between copies of each worker's cache and queue stats for /metrics
 
 # Create necessary directories
 for folder in ['UPLOAD_FOLDER', 'OUTPUT_FOLDER', 'INVALID_FOLDER', 'LOG_DIR']:
@@ -23,24 +23,38 @@ Dependencies:
 - openpyxl: for Excel file operations
 - utils.logger: for logging
 - create_app: for application configuration
+- license_classifier: for the license categories and their matching
 
 Note: This module assumes a specific structure for the input CSV file, including
 columns for 'Office', 'Licenses', 'User principal name', and 'Display name'.
 """
 
+import numpy as np
 import pandas as pd
+import heapq
+import json
 import os
 import openpyxl
+import tempfile
 import time
 import uuid
 from datetime import datetime
 from utils.logger import get_logger
 from create_app import app
+from license_classifier import LicenseClassifier, license_classifier
+from utils.validation import read_license_export, iter_license_export
+from utils.spill import SpillFile
+from utils.report_cache import hash_file, report_key
+from utils.perf import Trace
 import os.path
 from pathlib import Path
 
 logger = get_logger(__name__)
 
+# Column layouts of the per-user detail sheets
+DETAIL_COLUMNS = ['Display Name', 'License Type', 'User Principal Name']
+PROPERTY_COLUMNS = DETAIL_COLUMNS + ['Office']
+
 
 def sanitize_path(base_path, filename):
     """
@@ -64,6 +78,45 @@ def sanitize_path(base_path, filename):
         raise ValueError("Invalid path")
 
 
+def prepare_data(df):
+    """
+    Prepare an already loaded DataFrame by stripping whitespaces from the 'Office' column,
+    which is kept as a categorical.
+
+    Args:
+        df (pandas.DataFrame): DataFrame read from the uploaded CSV file.
+
+    Returns:
+        pandas.DataFrame: The prepared DataFrame.
+    """
+    df['Office'] = df['Office'].str.strip().astype('category')
+    return df
+
+
+def publish_file(temp_path, final_path):
+    """
+    Durably move a fully written file into place.
+
+    The file contents are flushed to disk before it is atomically renamed to final_path,
+    and the directory entry is flushed afterwards, so readers of final_path only ever see
+    the complete file.
+
+    Args:
+        temp_path (str): Path of the written file, on the same filesystem as final_path.
+        final_path (str): Path the file should be available at.
+    """
+    with open(temp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, final_path)
+
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(final_path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
 def read_and_prepare_data(file_path):
     """
     Read CSV file and prepare the DataFrame by stripping whitespaces from the 'Office' column.
@@ -75,8 +128,7 @@ def read_and_prepare_data(file_path):
         pandas.DataFrame or None: Prepared DataFrame if successful, None otherwise.
     """
     try:
-        df = pd.read_csv(file_path)
-        df['Office'] = df['Office'].str.strip()
+        df = prepare_data(read_license_export(file_path))
         logger.info(f"csv cleaned successfully from {file_path}")
         return df
     except FileNotFoundError:
@@ -156,6 +208,135 @@ def process_licenses(df, target_licenses, license_counts):
     return license_counts, unaccounted_users, aion_management, aion_partners, properties
 
 
+def count_licenses(df, target_licenses, license_counts, classifier=None):
+    """
+    Count licenses per office using columnar pandas operations.
+
+    This is the vectorized equivalent of `process_licenses`: the '+'-separated licenses are
+    exploded once, each distinct license string is classified a single time, and the per-office
+    counts are built with a groupby. Detail rows come out in the same order as the row-wise loop.
+
+    Args:
+        df (pandas.DataFrame): The input DataFrame.
+        target_licenses (dict): Dictionary of target license types.
+        license_counts (dict): Initialized license counts dictionary.
+        classifier (LicenseClassifier, optional): Classifier used to categorize each license string.
+            Defaults to a new classifier built from target_licenses.
+
+    Returns:
+        tuple: Updated license_counts, unaccounted_users, aion_management, aion_partners, properties,
+               with the last four as DataFrames ready to be written to Excel.
+    """
+    logger.info("Counting licenses")
+    licenses = df['Licenses']
+    if not licenses.notna().any():
+        rows = df.iloc[0:0]
+    else:
+        rows = df.loc[licenses.notna() & (licenses.astype(str).str.strip() != '')]
+
+    exploded = pd.DataFrame({
+        'Office': rows['Office'],
+        'Display Name': rows['Display name'],
+        'License Type': rows['Licenses'].astype(str).str.split('+'),
+        'User Principal Name': rows['User principal name'],
+    }).explode('License Type')
+    exploded['License Type'] = exploded['License Type'].str.strip()
+
+    if classifier is None:
+        classifier = LicenseClassifier(target_licenses)
+    lookup = {token: list(classifier.classify(token)) for token in exploded['License Type'].dropna().unique()}
+    exploded['Category'] = exploded['License Type'].map(lookup)
+    exploded = exploded.explode('Category').dropna(subset=['Category'])
+
+    office = exploded['Office']
+    blank = office.isna() | (office.astype(str).str.strip() == '')
+    count_office = pd.Series(np.where(blank, 'Unaccounted', office.astype(object)), index=exploded.index)
+
+    for (office_name, key), count in exploded.groupby([count_office, exploded['Category']], sort=False).size().items():
+        license_counts[office_name][key] += int(count)
+
+    is_management = office == 'AION Management'
+    is_partners = office == 'AION Partners'
+    aion_management = exploded.loc[is_management, DETAIL_COLUMNS].reset_index(drop=True)
+    aion_partners = exploded.loc[is_partners, DETAIL_COLUMNS].reset_index(drop=True)
+    unaccounted_users = exploded.loc[blank, DETAIL_COLUMNS].reset_index(drop=True)
+    properties = exploded.loc[~(blank | is_management | is_partners), PROPERTY_COLUMNS].reset_index(drop=True)
+
+    logger.info(f"Counted licenses (classifier cache: {classifier.stats()})")
+    return license_counts, unaccounted_users, aion_management, aion_partners, properties
+
+
+def merge_license_counts(license_counts, chunk_counts):
+    """
+    Add the license counts of one chunk to the running totals.
+
+    Offices are kept in the order they first appear in the file, with 'Unaccounted'
+    last, so the merged dictionary matches what `initialize_license_counts` builds
+    for the whole file.
+
+    Args:
+        license_counts (dict): Running license counts dictionary, updated in place.
+        chunk_counts (dict): License counts of the chunk.
+
+    Returns:
+        dict: The updated license_counts.
+    """
+    unaccounted = license_counts.pop('Unaccounted', None)
+    for office, counts in chunk_counts.items():
+        if office == 'Unaccounted':
+            continue
+        totals = license_counts.setdefault(office, dict.fromkeys(counts, 0))
+        for key, count in counts.items():
+            totals[key] += count
+
+    if unaccounted is None:
+        unaccounted = dict.fromkeys(chunk_counts['Unaccounted'], 0)
+    for key, count in chunk_counts['Unaccounted'].items():
+        unaccounted[key] += count
+    license_counts['Unaccounted'] = unaccounted
+    return license_counts
+
+
+def count_licenses_in_chunks(file_path, target_licenses, chunksize, classifier=None):
+    """
+    Count licenses by streaming the CSV file in chunks with bounded memory.
+
+    Each chunk is counted with `count_licenses` and merged into the running totals,
+    while its detail rows are spilled to temporary files instead of being kept in memory.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        target_licenses (dict): Dictionary of target license types.
+        chunksize (int): Number of CSV rows to read per chunk.
+        classifier (LicenseClassifier, optional): Classifier used to categorize each license string.
+
+    Returns:
+        tuple or None: license_counts and the unaccounted_users, aion_management, aion_partners and
+                       properties SpillFiles if successful, None otherwise. The caller must close the
+                       SpillFiles.
+    """
+    license_counts = {}
+    spills = (SpillFile(DETAIL_COLUMNS), SpillFile(DETAIL_COLUMNS), SpillFile(DETAIL_COLUMNS),
+              SpillFile(PROPERTY_COLUMNS))
+    try:
+        for chunk in iter_license_export(file_path, chunksize):
+            chunk = prepare_data(chunk)
+            chunk_counts, *details = count_licenses(chunk, target_licenses,
+                                                    initialize_license_counts(chunk, target_licenses), classifier)
+            merge_license_counts(license_counts, chunk_counts)
+            for spill, detail in zip(spills, details):
+                spill.append(detail)
+    except Exception as e:
+        logger.error(f"Error reading file {file_path} in chunks: {e}")
+        for spill in spills:
+            spill.close()
+        return None
+
+    if not license_counts:
+        license_counts['Unaccounted'] = {key: 0 for key in target_licenses.keys()}
+    return (license_counts,) + spills
+
+
 def create_license_counts_df(license_counts):
     """
     Convert the license counts dictionary to a DataFrame and calculate totals.
@@ -177,36 +358,99 @@ def create_license_counts_df(license_counts):
         return None
 
 
+def add_cost_columns(license_counts_df, cost_per_user, cost_per_exchange, cost_per_e5, cost_per_teams):
+    """
+    Add the cost of each license type and the billable total to the license counts, in place.
+
+    Args:
+        license_counts_df (pandas.DataFrame): License counts from `create_license_counts_df`.
+        cost_per_user (int): Cost per user.
+        cost_per_exchange (int): Cost per exchange license.
+        cost_per_e5 (float): Cost per E5 license.
+        cost_per_teams (float): Cost per Teams license.
+    """
+    license_counts_df['Cost of Users (${})'.format(cost_per_user)] = (
+            license_counts_df['365 Premium'] * cost_per_user)
+    license_counts_df['Cost of Exchange Licenses (${})'.format(cost_per_exchange)] = (
+            license_counts_df['Exchange'] * cost_per_exchange)
+    license_counts_df['Cost of E5 Licenses (${})'.format(cost_per_e5)] = license_counts_df['E5'] * cost_per_e5
+    license_counts_df['Cost of Teams Licenses (${})'.format(cost_per_teams)] = (
+            license_counts_df['Teams'] * cost_per_teams)
+    license_counts_df['Billable Total'] = (
+            license_counts_df['Cost of Users (${})'.format(cost_per_user)] +
+            license_counts_df['Cost of Exchange Licenses (${})'.format(cost_per_exchange)] +
+            license_counts_df['Cost of E5 Licenses (${})'.format(cost_per_e5)] +
+            license_counts_df['Cost of Teams Licenses (${})'.format(cost_per_teams)]
+    )
+
+
+def max_text_length(values):
+    """
+    Get the length of the longest value in a column as it appears in the sheet.
+
+    String and categorical columns holding only strings are measured in place rather than
+    through a string copy of the whole column; other values are measured as text. Missing
+    values are ignored.
+
+    Args:
+        values (pandas.Series): The column values.
+
+    Returns:
+        int: The longest text length, or 0 if the column has no values.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        text_values = pd.api.types.infer_dtype(values.cat.categories, skipna=True) in ('string', 'empty')
+    elif pd.api.types.is_object_dtype(values.dtype):
+        # .str.len() gives NaN for the non-strings of a mixed column, so those are converted
+        text_values = pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty')
+    else:
+        text_values = pd.api.types.is_string_dtype(values.dtype)
+    if text_values:
+        lengths = values.str.len()
+    else:
+        lengths = values.dropna().astype(str).str.len()
+    longest = lengths.max()
+    return 0 if pd.isna(longest) else int(longest)
+
+
 def save_to_excel(excel_path, license_counts_df, aion_management_df, aion_partners_df, properties_df, unaccounted_users,
-                  cost_per_user, cost_per_exchange, cost_per_e5, cost_per_teams):
+                  cost_per_user, cost_per_exchange, cost_per_e5, cost_per_teams, constant_memory=False):
     """
        Save the processed data to an Excel file with specific formatting.
 
        Args:
            excel_path (str): Path to save the Excel file.
            license_counts_df (pandas.DataFrame): DataFrame with license counts.
-           aion_management_df (pandas.DataFrame): DataFrame with AION Management data.
-           aion_partners_df (pandas.DataFrame): DataFrame with AION Partners data.
-           properties_df (pandas.DataFrame): DataFrame with Properties data.
-           unaccounted_users (pandas.DataFrame): DataFrame with unaccounted users' data.
+           aion_management_df (pandas.DataFrame or SpillFile): AION Management data.
+           aion_partners_df (pandas.DataFrame or SpillFile): AION Partners data.
+           properties_df (pandas.DataFrame or SpillFile): Properties data.
+           unaccounted_users (pandas.DataFrame or SpillFile): Unaccounted users' data.
            cost_per_user (int): Cost per user.
            cost_per_exchange (int): Cost per exchange license.
            cost_per_e5 (int): Cost per E5 license.
            cost_per_teams (int): Cost per Teams license.
+           constant_memory (bool, optional): Use xlsxwriter's constant_memory mode, which flushes each
+               row to disk as soon as the next one is started, so that large detail sheets are written
+               with bounded memory. Defaults to False.
+
+       Returns:
+           bool: True once the complete file is durably in place at excel_path, False otherwise.
+
+       The workbook is written to a temporary file next to excel_path and moved into place with
+       `publish_file`, so excel_path never holds a partially written report. Detail sheets given
+       as SpillFiles are written one chunk at a time.
        """
+    temp_path = None
     try:
         # Sanitize output path
         base_dir = os.path.dirname(os.path.abspath(excel_path))
         excel_path = sanitize_path(base_dir, os.path.basename(excel_path))
-        
-        logger.info(f"writing data to Excel file: {excel_path}")
-        with pd.ExcelWriter(excel_path, engine='xlsxwriter') as writer:
-            license_counts_df.to_excel(writer, sheet_name='License Counts')
-            aion_management_df.to_excel(writer, sheet_name='AION Management', index=False)
-            aion_partners_df.to_excel(writer, sheet_name='AION Partners', index=False)
-            properties_df.to_excel(writer, sheet_name='Properties', index=False)
-            unaccounted_users.to_excel(writer, sheet_name='Unaccounted Users', index=False)
+        fd, temp_path = tempfile.mkstemp(dir=base_dir, prefix='.', suffix='.xlsx')
+        os.close(fd)
 
+        logger.info(f"writing data to Excel file: {excel_path}")
+        options = {'constant_memory': True} if constant_memory else {}
+        with pd.ExcelWriter(temp_path, engine='xlsxwriter', engine_kwargs={'options': options}) as writer:
             workbook = writer.book
             header_format = workbook.add_format(
                 {'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1})
@@ -214,24 +458,39 @@ def save_to_excel(excel_path, license_counts_df, aion_management_df, aion_partne
                                                 'num_format': '#,##0'})
             currency_format = workbook.add_format({'num_format': '$#,##0'})
 
-            def format_sheet(worksheet, df, is_totals=False):
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num + 1 if is_totals else col_num, value, header_format)
-                if is_totals:
-                    worksheet.write(0, 0, 'Office', header_format)
+            def write_header(worksheet, labels):
+                for col_num, value in enumerate(labels):
+                    worksheet.write(0, col_num, value, header_format)
 
-                for col_num, col in enumerate(df.columns):
-                    column_len = df[col].astype(str).str.len().max()
-                    column_len = max(column_len, len(col)) + 2
+            def format_sheet(worksheet, columns, rows, column_lengths, index_length=None):
+                is_totals = index_length is not None
+                for col_num, col in enumerate(columns):
+                    column_len = max(column_lengths[col], len(col)) + 2
                     worksheet.set_column(col_num + (1 if is_totals else 0), col_num + (1 if is_totals else 0),
                                          column_len)
                 if is_totals:
-                    worksheet.set_column(0, 0, max(df.index.astype(str).str.len().max(), len('Office')) + 2)
-
-                worksheet.autofilter(0, 0, len(df), len(df.columns) + (1 if is_totals else 0) - 1)
-
-            license_counts_worksheet = writer.sheets['License Counts']
-            format_sheet(license_counts_worksheet, license_counts_df, is_totals=True)
+                    worksheet.set_column(0, 0, max(index_length, len('Office')) + 2)
+
+                worksheet.autofilter(0, 0, rows, len(columns) + (1 if is_totals else 0) - 1)
+
+            license_counts_labels = ['Office'] + list(license_counts_df.columns)
+            if constant_memory:
+                # Rows have to be written in order, so the sheet is written row by row instead of by pandas
+                license_counts_worksheet = workbook.add_worksheet('License Counts')
+                index_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+                write_header(license_counts_worksheet, license_counts_labels)
+                for row_num, values in enumerate(license_counts_df.astype(object).values.tolist(), 1):
+                    if row_num < len(license_counts_df):
+                        license_counts_worksheet.write(row_num, 0, license_counts_df.index[row_num - 1], index_format)
+                        license_counts_worksheet.write_row(row_num, 1, values)
+            else:
+                license_counts_df.to_excel(writer, sheet_name='License Counts')
+                license_counts_worksheet = writer.sheets['License Counts']
+                write_header(license_counts_worksheet, license_counts_labels)
+
+            format_sheet(license_counts_worksheet, license_counts_df.columns.values, len(license_counts_df),
+                         {col: max_text_length(license_counts_df[col]) for col in license_counts_df.columns},
+                         index_length=license_counts_df.index.astype(str).str.len().max())
 
             for col_num in range(len(license_counts_df.columns)):
                 license_counts_worksheet.write(len(license_counts_df), col_num + 1, license_counts_df.iloc[-1, col_num],
@@ -257,25 +516,113 @@ def save_to_excel(excel_path, license_counts_df, aion_management_df, aion_partne
             license_counts_worksheet.set_column(teams_cost_idx, teams_cost_idx, 15, currency_format)
             license_counts_worksheet.set_column(billable_total_idx, billable_total_idx, 15, currency_format)
 
-            aion_management_worksheet = writer.sheets['AION Management']
-            format_sheet(aion_management_worksheet, aion_management_df)
-
-            aion_partners_worksheet = writer.sheets['AION Partners']
-            format_sheet(aion_partners_worksheet, aion_partners_df)
-
-            properties_worksheet = writer.sheets['Properties']
-            format_sheet(properties_worksheet, properties_df)
-
-            unaccounted_users_worksheet = writer.sheets['Unaccounted Users']
-            format_sheet(unaccounted_users_worksheet, unaccounted_users)
+            def detail_chunks(data):
+                # A DataFrame is written as one chunk; an empty SpillFile still needs its header row
+                if isinstance(data, pd.DataFrame):
+                    return [data]
+                return iter(data) if len(data) else [data.empty_frame()]
+
+            def write_detail_sheet(sheet_name, data):
+                # Write the sheet chunk by chunk while tracking the longest value in each column
+                columns = list(data.columns)
+                column_lengths = dict.fromkeys(columns, 0)
+                rows = 0
+                if constant_memory:
+                    worksheet = workbook.add_worksheet(sheet_name)
+                    write_header(worksheet, columns)
+
+                for chunk in detail_chunks(data):
+                    if constant_memory:
+                        values = chunk.astype(object).where(chunk.notna(), None).values.tolist()
+                        for row_num, row in enumerate(values, rows + 1):
+                            worksheet.write_row(row_num, 0, row)
+                    else:
+                        chunk.to_excel(writer, sheet_name=sheet_name, index=False, header=rows == 0,
+                                       startrow=rows + 1 if rows else 0)
+                    rows += len(chunk)
+                    for col in columns:
+                        column_lengths[col] = max(column_lengths[col], max_text_length(chunk[col]))
+
+                if not constant_memory:
+                    worksheet = writer.sheets[sheet_name]
+                    write_header(worksheet, columns)
+                format_sheet(worksheet, columns, rows, column_lengths)
+
+            write_detail_sheet('AION Management', aion_management_df)
+            write_detail_sheet('AION Partners', aion_partners_df)
+            write_detail_sheet('Properties', properties_df)
+            write_detail_sheet('Unaccounted Users', unaccounted_users)
+        publish_file(temp_path, excel_path)
         logger.info(f"Data saved to Excel file: {excel_path}")
+        return True
     except PermissionError:
         logger.error(f"Permission denied when writing to {excel_path}")
     except Exception as e:
         logger.error(f"Error writing to Excel file {excel_path}: {e}")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    return False
+
+
+def remove_upload(file_path):
+    """
+    Delete an uploaded CSV file once it has been processed.
+
+    Args:
+        file_path (str): Path to the uploaded file.
+    """
+    try:
+        os.remove(file_path)
+        logger.info(f"Removed uploaded file: {file_path}")
+    except OSError as e:
+        logger.error(f"Error removing uploaded {file_path}: {e}")
 
 
-def process_file(file_path, cost_per_user=115, cost_per_exchange=20, cost_per_e5=54.80, cost_per_teams=4):
+def _new_report_paths():
+    # A unique internal path in OUTPUT_FOLDER, and the name the report is downloaded as
+    current_date = datetime.now().strftime('%Y_%m_%d')
+    excel_path = os.path.join(app.config['OUTPUT_FOLDER'], f"{uuid.uuid4()}_license_counts_{current_date}.xlsx")
+    return excel_path, f"AION_License_Report_{current_date}.xlsx"
+
+
+def lookup_cached_report(file_path, cache, cost_per_user=115, cost_per_exchange=20, cost_per_e5=54.80,
+                         cost_per_teams=4, content_hash=None):
+    """
+    Answer an upload with a copy of the report of an identical earlier upload, without reading the CSV file.
+
+    On a hit the uploaded file is removed, as `process_file` would.
+
+    Args:
+        file_path (str): Path to the uploaded CSV file.
+        cache (utils.report_cache.ReportCache): Cache of reports keyed by the file contents and costs.
+        cost_per_user (int, optional): Cost per user. Defaults to 115.
+        cost_per_exchange (int, optional): Cost per exchange license. Defaults to 20.
+        cost_per_e5 (int, optional): Cost per E5 license. Defaults to 54.80.
+        cost_per_teams (int, optional): Cost per Teams license. Defaults to 4.
+        content_hash (str, optional): SHA-256 hex digest of the file, when it is already known. Defaults to None
+            (the file is hashed).
+
+    Returns:
+        tuple or None: Path to the copied Excel file and its friendly filename on a hit, None on a miss.
+    """
+    excel_path, friendly_filename = _new_report_paths()
+    try:
+        cache_key = report_key(content_hash or hash_file(file_path), cost_per_user=cost_per_user,
+                               cost_per_exchange=cost_per_exchange, cost_per_e5=cost_per_e5,
+                               cost_per_teams=cost_per_teams)
+        if not cache.get(cache_key, excel_path, summary_path(excel_path)):
+            return None
+    except OSError as e:
+        logger.error(f"Error reading the report cache: {e}")
+        return None
+    logger.info(f"Served cached report {cache_key[:12]} as {excel_path}")
+    remove_upload(file_path)
+    return excel_path, friendly_filename
+
+
+def process_file(file_path, cost_per_user=115, cost_per_exchange=20, cost_per_e5=54.80, cost_per_teams=4,
+                 engine='vectorized', df=None, chunksize=None, cache=None, content_hash=None, lookup=True):
     """
         Main function to process the CSV file and generate the Excel report.
 
@@ -285,6 +632,22 @@ def process_file(file_path, cost_per_user=115, cost_per_exchange=20, cost_per_e5
             cost_per_exchange (int, optional): Cost per exchange license. Defaults to 20.
             cost_per_e5 (int, optional): Cost per E5 license. Defaults to 300.
             cost_per_teams (int, optional): Cost per Teams license. Defaults to 10.
+            engine (str, optional): 'vectorized' to count with `count_licenses`, or 'rows' to use the
+                row-wise `process_licenses` loop. Both produce the same workbook. Defaults to 'vectorized'.
+            df (pandas.DataFrame, optional): Data already loaded from file_path, e.g. by
+                `utils.validation.load_csv`. When given, the CSV file is not read again.
+            chunksize (int, optional): When set, stream the CSV file in chunks of this many rows, spill
+                the per-user detail rows to temporary files and write the workbook in constant memory
+                mode, so memory use does not grow with the size of the file. Streaming always uses the
+                vectorized engine. Defaults to None.
+            cache (utils.report_cache.ReportCache, optional): Cache of reports keyed by the file contents
+                and costs. An identical earlier upload is answered with a copy of its report, and new
+                reports are added to it. Defaults to None (no caching).
+            content_hash (str, optional): SHA-256 hex digest of the file, when it is already known, so the
+                cache does not read the file again to hash it. Defaults to None.
+            lookup (bool, optional): Look the report up in the cache before generating it. Callers that
+                already missed with `lookup_cached_report`, before loading df, pass False; the new report is
+                still added to the cache. Defaults to True.
 
         Returns:
             str or None: Path to the generated Excel file if successful, None otherwise.
@@ -300,67 +663,211 @@ def process_file(file_path, cost_per_user=115, cost_per_exchange=20, cost_per_e5
         logger.error(f"Invalid file path: {e}")
         return None
 
-    df = read_and_prepare_data(file_path)
-    if df is None:
+    excel_path, friendly_filename = _new_report_paths()
+
+    # Timings of each stage, logged with the processing time
+    spans = Trace()
+
+    cache_key = None
+    if cache is not None:
+        try:
+            # Hashed once, for the lookup and for storing the new report
+            content_hash = content_hash or hash_file(file_path)
+            cache_key = report_key(content_hash, cost_per_user=cost_per_user, cost_per_exchange=cost_per_exchange,
+                                   cost_per_e5=cost_per_e5, cost_per_teams=cost_per_teams)
+        except OSError as e:
+            logger.error(f"Error reading the report cache: {e}")
+        if cache_key is not None and lookup:
+            with spans.span('cache lookup'):
+                cached = lookup_cached_report(file_path, cache, cost_per_user, cost_per_exchange, cost_per_e5,
+                                              cost_per_teams, content_hash)
+            if cached:
+                logger.info(f"CSV processing time: {time.time() - start_time:.2f} seconds", spans=spans.to_list())
+                return cached
+
+    target_licenses = license_classifier.target_licenses
+
+    spills = ()
+    if chunksize:
+        # Reading and counting are interleaved chunk by chunk
+        with spans.span('read and count'):
+            result = count_licenses_in_chunks(file_path, target_licenses, chunksize, license_classifier)
+        if result is None:
+            return None
+        license_counts, unaccounted_users, aion_management_df, aion_partners_df, properties_df = result
+        spills = result[1:]
+    else:
+        with spans.span('read') as span:
+            if df is not None:
+                df = prepare_data(df)
+            else:
+                df = read_and_prepare_data(file_path)
+            span.rows = len(df) if df is not None else 0
+        if df is None:
+            return None
+
+        with spans.span('count', rows=len(df)):
+            license_counts = initialize_license_counts(df, target_licenses)
+            if engine == 'rows':
+                license_counts, unaccounted_users, aion_management, aion_partners, properties = process_licenses(
+                    df, target_licenses, license_counts)
+                aion_management_df = pd.DataFrame(aion_management, columns=DETAIL_COLUMNS)
+                aion_partners_df = pd.DataFrame(aion_partners, columns=DETAIL_COLUMNS)
+                properties_df = pd.DataFrame(properties, columns=PROPERTY_COLUMNS)
+                unaccounted_users = pd.DataFrame(unaccounted_users, columns=DETAIL_COLUMNS)
+            else:
+                license_counts, unaccounted_users, aion_management_df, aion_partners_df, properties_df = \
+                    count_licenses(df, target_licenses, license_counts, license_classifier)
+
+    try:
+        with spans.span('cost columns') as span:
+            license_counts_df = create_license_counts_df(license_counts)
+            if license_counts_df is None:
+                return None
+            add_cost_columns(license_counts_df, cost_per_user, cost_per_exchange, cost_per_e5, cost_per_teams)
+            span.rows = len(license_counts_df)
+
+        with spans.span('excel write'):
+            saved = save_to_excel(excel_path, license_counts_df, aion_management_df, aion_partners_df,
+                                  properties_df, unaccounted_users, cost_per_user, cost_per_exchange, cost_per_e5,
+                                  cost_per_teams, constant_memory=bool(chunksize))
+    finally:
+        for spill in spills:
+            spill.close()
+    if not saved:
         return None
+    logger.info(f"Processed file saved to: {excel_path}")
 
-    target_licenses = {
-        '365 Premium': ['Microsoft 365 Business Premium', 'E3'],
-        'Exchange': ['Exchange'],
-        'E5': ['E5'],
-        'Teams': ['Microsoft Teams Enterprise']
-    }
+    try:
+        with spans.span('summary'):
+            save_summary(excel_path, summarize_license_counts(license_counts_df))
+    except Exception as e:
+        logger.error(f"Error summarizing {excel_path}: {e}")
 
-    license_counts = initialize_license_counts(df, target_licenses)
-    license_counts, unaccounted_users, aion_management, aion_partners, properties = process_licenses(df,
-                                                                                                     target_licenses,
-                                                                                                     license_counts)
+    if cache_key is not None:
+        try:
+            with spans.span('cache store'):
+                cache.put(cache_key, excel_path, summary_path(excel_path))
+        except OSError as e:
+            logger.error(f"Error adding {excel_path} to the report cache: {e}")
 
-    license_counts_df = create_license_counts_df(license_counts)
-    if license_counts_df is None:
-        return None
+    remove_upload(file_path)
 
-    license_counts_df['Cost of Users (${})'.format(cost_per_user)] = license_counts_df['365 Premium'] * cost_per_user
-    license_counts_df['Cost of Exchange Licenses (${})'.format(cost_per_exchange)] = license_counts_df[
-                                                                                         'Exchange'] * cost_per_exchange
-    license_counts_df['Cost of E5 Licenses (${})'.format(cost_per_e5)] = license_counts_df['E5'] * cost_per_e5
-    license_counts_df['Cost of Teams Licenses (${})'.format(cost_per_teams)] = license_counts_df[
-                                                                                   'Teams'] * cost_per_teams
-    license_counts_df['Billable Total'] = (
-            license_counts_df['Cost of Users (${})'.format(cost_per_user)] +
-            license_counts_df['Cost of Exchange Licenses (${})'.format(cost_per_exchange)] +
-            license_counts_df['Cost of E5 Licenses (${})'.format(cost_per_e5)] +
-            license_counts_df['Cost of Teams Licenses (${})'.format(cost_per_teams)]
-    )
+    end_time = time.time()
+    processing_time = end_time - start_time
+    logger.info(f"CSV processing time: {processing_time:.2f} seconds", spans=spans.to_list())
 
-    aion_management_df = pd.DataFrame(aion_management, columns=['Display Name', 'License Type', 'User Principal Name'])
-    aion_partners_df = pd.DataFrame(aion_partners, columns=['Display Name', 'License Type', 'User Principal Name'])
-    properties_df = pd.DataFrame(properties,
-                                 columns=['Display Name', 'License Type', 'User Principal Name', 'Office'])
-    unaccounted_users = pd.DataFrame(unaccounted_users, columns=['Display Name', 'License Type', 'User Principal Name'])
+    return excel_path, friendly_filename
+
+
+def read_license_counts(excel_path):
+    """
+    Read the License Counts sheet of a report back into a DataFrame.
+
+    Args:
+        excel_path (str): Path to the Excel report.
+
+    Returns:
+        pandas.DataFrame: License counts with cost columns and a final 'Total' row, indexed by office,
+        as passed to `save_to_excel`.
+    """
+    license_counts_df = pd.read_excel(excel_path, sheet_name='License Counts', index_col=0, dtype={'Office': str})
+    license_counts_df.index.name = None
+    return license_counts_df
 
-    current_date = datetime.now().strftime('%Y_%m_%d')
-    file_id = str(uuid.uuid4())
-    internal_filename = f"{file_id}_license_counts_{current_date}.xlsx"
-    friendly_filename = f"AION_License_Report_{current_date}.xlsx"
-    excel_path = os.path.join(app.config['OUTPUT_FOLDER'], internal_filename)
-
-    save_to_excel(excel_path, license_counts_df, aion_management_df, aion_partners_df, properties_df, unaccounted_users,
-                  cost_per_user,
-                  cost_per_exchange, cost_per_e5, cost_per_teams)
-    logger.info(f"Processed file saved to: {excel_path}")
 
+def consolidate_license_counts(tenant_counts):
+    """
+    Merge the license counts of several tenants.
+
+    Args:
+        tenant_counts (dict): License counts DataFrame of each tenant, with cost columns and a final 'Total'
+            row, keyed by tenant name.
+
+    Returns:
+        tuple: A tuple containing:
+            - pandas.DataFrame: One row per tenant and office, indexed by (Tenant, Office), with a final
+              ('Total', '') row.
+            - pandas.DataFrame: The total row of each tenant, indexed by tenant, with a final 'Total' row.
+    """
+    # Tenants share their columns unless their costs differ; missing ones count as 0
+    columns = list(dict.fromkeys(col for df in tenant_counts.values() for col in df.columns))
+
+    offices_df = pd.concat({tenant: df.iloc[:-1] for tenant, df in tenant_counts.items()},
+                           names=['Tenant', 'Office']).reindex(columns=columns).fillna(0)
+    total_index = pd.MultiIndex.from_tuples([('Total', '')], names=['Tenant', 'Office'])
+    offices_df = pd.concat([offices_df, pd.DataFrame([offices_df.sum(axis=0)], index=total_index)])
+
+    tenants_df = pd.DataFrame([df.iloc[-1] for df in tenant_counts.values()],
+                              index=list(tenant_counts)).reindex(columns=columns).fillna(0)
+    tenants_df = pd.concat([tenants_df, pd.DataFrame([tenants_df.sum(axis=0)], index=['Total'])])
+    logger.info(f"Consolidated the license counts of {len(tenant_counts)} tenants")
+    return offices_df, tenants_df
+
+
+def save_consolidated_excel(excel_path, offices_df, tenants_df):
+    """
+    Save the consolidated license counts of several tenants to an Excel file.
+
+    The workbook has a 'Tenants' sheet with the totals of each tenant and a 'License Counts'
+    sheet with each tenant's offices. Like `save_to_excel`, it is written to a temporary file
+    and moved into place.
+
+    Args:
+        excel_path (str): Path to save the Excel file.
+        offices_df (pandas.DataFrame): Counts per tenant and office from `consolidate_license_counts`.
+        tenants_df (pandas.DataFrame): Counts per tenant from `consolidate_license_counts`.
+
+    Returns:
+        bool: True once the complete file is in place at excel_path, False otherwise.
+    """
+    temp_path = None
     try:
-        os.remove(file_path)
-        logger.info(f"Removed uploaded file: {file_path}")
-    except OSError as e:
-        logger.error(f"Error removing uploaded {file_path}: {e}")
+        base_dir = os.path.dirname(os.path.abspath(excel_path))
+        excel_path = sanitize_path(base_dir, os.path.basename(excel_path))
+        fd, temp_path = tempfile.mkstemp(dir=base_dir, prefix='.', suffix='.xlsx')
+        os.close(fd)
 
-    end_time = time.time()
-    processing_time = end_time - start_time
-    logger.info(f"CSV processing time: {processing_time:.2f} seconds")
+        logger.info(f"writing consolidated data to Excel file: {excel_path}")
+        with pd.ExcelWriter(temp_path, engine='xlsxwriter') as writer:
+            workbook = writer.book
+            header_format = workbook.add_format(
+                {'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1})
+            total_format = workbook.add_format({'bold': True, 'fg_color': '#FFEB9C', 'border': 1,
+                                                'num_format': '#,##0'})
+            currency_format = workbook.add_format({'num_format': '$#,##0'})
 
-    return excel_path, friendly_filename
+            for sheet_name, df in (('Tenants', tenants_df), ('License Counts', offices_df)):
+                index_labels = list(df.index.names) if df.index.nlevels > 1 else ['Tenant']
+                df.to_excel(writer, sheet_name=sheet_name, merge_cells=False)
+                worksheet = writer.sheets[sheet_name]
+                for col_num, value in enumerate(index_labels + list(df.columns)):
+                    worksheet.write(0, col_num, value, header_format)
+
+                for level, label in enumerate(index_labels):
+                    values = df.index.get_level_values(level) if df.index.nlevels > 1 else df.index
+                    worksheet.set_column(level, level, max(values.astype(str).str.len().max(), len(label)) + 2)
+                for col_num, col in enumerate(df.columns, len(index_labels)):
+                    if col.startswith('Cost of') or col == 'Billable Total':
+                        worksheet.set_column(col_num, col_num, 15, currency_format)
+                    else:
+                        worksheet.set_column(col_num, col_num, max(max_text_length(df[col]), len(col)) + 2)
+
+                worksheet.write(len(df), 0, 'Total', total_format)
+                for col_num in range(1, len(index_labels)):
+                    worksheet.write_blank(len(df), col_num, None, total_format)
+                for col_num, value in enumerate(df.iloc[-1], len(index_labels)):
+                    worksheet.write(len(df), col_num, value, total_format)
+                worksheet.autofilter(0, 0, len(df) - 1, len(index_labels) + len(df.columns) - 1)
+        publish_file(temp_path, excel_path)
+        logger.info(f"Consolidated data saved to Excel file: {excel_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error writing to Excel file {excel_path}: {e}")
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    return False
 
 
 def generate_summary(file_path):
@@ -382,48 +889,180 @@ def generate_summary(file_path):
         for i in range(2, total_row)  # Skip header row
     ]
 
+    return build_summary(data)
+
+
+def summarize_license_counts(license_counts_df):
+    """
+    Generate the summary of the license counts directly from the license counts DataFrame.
+
+    Produces the same result as `generate_summary` on the written workbook, without reading it back.
+
+    Args:
+        license_counts_df (pandas.DataFrame): License counts with cost columns and a final 'Total' row.
+
+    Returns:
+        dict: Summary statistics of the license counts.
+    """
+    data = license_counts_df.iloc[:-1].reset_index().astype(object).values.tolist()
+    return build_summary(data)
+
+
+def summary_path(excel_path):
+    """
+    Get the path of the cached summary for a report.
+
+    The cached summary shares the report's file id prefix, so it is removed along with the
+    report by `cleanup_undownloaded`.
+
+    Args:
+        excel_path (str): Path to the Excel report.
+
+    Returns:
+        str: Path to the summary JSON file.
+    """
+    return os.path.splitext(excel_path)[0] + '.summary.json'
+
+
+def save_summary(excel_path, summary):
+    """
+    Cache the summary of a report next to it.
+
+    Args:
+        excel_path (str): Path to the Excel report.
+        summary (dict): Summary statistics of the report.
+
+    Returns:
+        bool: True if the summary was cached, False otherwise.
+    """
+    cache_path = summary_path(excel_path)
+    temp_path = None
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)), prefix='.',
+                                         suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(summary, f)
+        publish_file(temp_path, cache_path)
+        logger.info(f"Summary cached at: {cache_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error caching summary {cache_path}: {e}")
+        return False
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_summary(excel_path):
+    """
+    Load the cached summary of a report.
+
+    Args:
+        excel_path (str): Path to the Excel report.
+
+    Returns:
+        dict or None: The cached summary, or None if the report has none (e.g. it was produced
+        before summaries were cached).
+    """
+    try:
+        with open(summary_path(excel_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading cached summary for {excel_path}: {e}")
+        return None
+
+
+def build_summary(data):
+    """
+    Compute the summary statistics from the office rows of the License Counts sheet.
+
+    All statistics are gathered in a single pass over the rows. Ties for the highest values go
+    to the first office, and an empty office list yields zeros instead of dividing by zero.
+
+    Args:
+        data (list): One list per office: the office name followed by the sheet's columns.
+
+    Returns:
+        dict: Summary statistics of the license counts.
+    """
+    total_365 = total_exchange = total_e5 = total_teams = total_cost = 0
+    offices_with_e5 = both_licenses = only_365 = only_exchange = only_e5 = only_teams = no_licenses = 0
+    highest_cost = highest_exchange_ratio = highest_e5_ratio = highest_teams_ratio = None
+    highest_cost_office = highest_exchange_ratio_office = highest_e5_ratio_office = highest_teams_ratio_office = None
+
+    for row in data:
+        office, premium, exchange, e5, teams, cost = row[0], row[1], row[2], row[3], row[4], row[6]
+        total_365 += premium
+        total_exchange += exchange
+        total_e5 += e5
+        total_teams += teams
+        total_cost += cost
+
+        if e5 > 0:
+            offices_with_e5 += 1
+        if premium > 0 and exchange > 0:
+            both_licenses += 1
+        licensed = (premium > 0, exchange > 0, e5 > 0, teams > 0)
+        if licensed == (True, False, False, False):
+            only_365 += 1
+        elif licensed == (False, True, False, False):
+            only_exchange += 1
+        elif licensed == (False, False, True, False):
+            only_e5 += 1
+        elif licensed == (False, False, False, True):
+            only_teams += 1
+        elif licensed == (False, False, False, False):
+            no_licenses += 1
+
+        exchange_ratio = exchange / premium if premium > 0 else 0
+        e5_ratio = e5 / (premium + exchange) if (premium + exchange) > 0 else 0
+        teams_ratio = teams / (premium + exchange + e5) if (premium + exchange + e5) > 0 else 0
+        if highest_cost is None or cost > highest_cost:
+            highest_cost, highest_cost_office = cost, office
+        if highest_exchange_ratio is None or exchange_ratio > highest_exchange_ratio:
+            highest_exchange_ratio, highest_exchange_ratio_office = exchange_ratio, office
+        if highest_e5_ratio is None or e5_ratio > highest_e5_ratio:
+            highest_e5_ratio, highest_e5_ratio_office = e5_ratio, office
+        if highest_teams_ratio is None or teams_ratio > highest_teams_ratio:
+            highest_teams_ratio, highest_teams_ratio_office = teams_ratio, office
+
+    offices = len(data)
+
+    def percent(count):
+        return count / offices * 100 if offices else 0
+
     summary = {
-        'total_365_premium': sum(row[1] for row in data),
-        'total_exchange': sum(row[2] for row in data),
-        'total_e5': sum(row[3] for row in data),
-        'total_teams': sum(row[4] for row in data),
-        'total_cost': sum(row[6] for row in data),
-        'avg_cost_per_office': sum(row[6] for row in data) / len(data),
-        'highest_cost': max(row[6] for row in data),
-        'highest_cost_office': next(row[0] for row in data if row[6] == max(r[6] for r in data)),
-        'percent_with_e5': sum(1 for row in data if row[3] > 0) / len(data) * 100,
-        'offices_with_e5': sum(1 for row in data if row[3] > 0),
-        'percent_both_licenses': sum(1 for row in data if row[1] > 0 and row[2] > 0) / len(data) * 100,
-        'percent_only_365': sum(1 for row in data if row[1] > 0 and row[2] == 0 and row[3] == 0 and row[4] == 0) / len(
-            data) * 100,
-        'percent_only_exchange': sum(
-            1 for row in data if row[1] == 0 and row[2] > 0 and row[3] == 0 and row[4] == 0) / len(data) * 100,
-        'percent_only_e5': sum(1 for row in data if row[1] == 0 and row[2] == 0 and row[3] > 0 and row[4] == 0) / len(
-            data) * 100,
-        'percent_only_teams': sum(
-            1 for row in data if row[1] == 0 and row[2] == 0 and row[3] == 0 and row[4] > 0) / len(data) * 100,
-        'highest_exchange_ratio': max((row[2] / row[1] if row[1] > 0 else 0) for row in data),
-        'highest_exchange_ratio_office': next(row[0] for row in data if (row[2] / row[1] if row[1] > 0 else 0) == max(
-            (r[2] / r[1] if r[1] > 0 else 0) for r in data)),
-        'highest_e5_ratio': max((row[3] / (row[1] + row[2]) if (row[1] + row[2]) > 0 else 0) for row in data),
-        'highest_e5_ratio_office': next(row[0] for row in data if
-                                           (row[3] / (row[1] + row[2]) if (row[1] + row[2]) > 0 else 0) == max(
-                                               (r[3] / (r[1] + r[2]) if (r[1] + r[2]) > 0 else 0) for r in data)),
-        'highest_teams_ratio': max(
-            (row[4] / (row[1] + row[2] + row[3]) if (row[1] + row[2] + row[3]) > 0 else 0) for row in data),
-        'highest_teams_ratio_office': next(row[0] for row in data if
-                                           (row[4] / (row[1] + row[2] + row[3]) if (row[1] + row[2] + row[
-                                               3]) > 0 else 0) == max(
-                                               (r[4] / (r[1] + r[2] + r[3]) if (r[1] + r[2] + r[3]) > 0 else 0) for r in
-                                               data)),
-        'offices_no_licenses': sum(1 for row in data if row[1] == 0 and row[2] == 0 and row[3] == 0 and row[4] == 0),
-        'avg_licenses_per_office': (sum(row[1] for row in data) + sum(row[2] for row in data) +
-                                    sum(row[3] for row in data) + sum(row[4] for row in data)) / len(data),
-        'top_offices_by_license': sorted(
-            [(row[0], row[1], row[2], row[3], row[4], row[1] + row[2] + row[3] + row[4]) for row in data],
-            key=lambda x: x[5],
-            reverse=True
-        )[:5],
+        'total_365_premium': total_365,
+        'total_exchange': total_exchange,
+        'total_e5': total_e5,
+        'total_teams': total_teams,
+        'total_cost': total_cost,
+        'avg_cost_per_office': total_cost / offices if offices else 0,
+        'highest_cost': highest_cost or 0,
+        'highest_cost_office': highest_cost_office,
+        'percent_with_e5': percent(offices_with_e5),
+        'offices_with_e5': offices_with_e5,
+        'percent_both_licenses': percent(both_licenses),
+        'percent_only_365': percent(only_365),
+        'percent_only_exchange': percent(only_exchange),
+        'percent_only_e5': percent(only_e5),
+        'percent_only_teams': percent(only_teams),
+        'highest_exchange_ratio': highest_exchange_ratio or 0,
+        'highest_exchange_ratio_office': highest_exchange_ratio_office,
+        'highest_e5_ratio': highest_e5_ratio or 0,
+        'highest_e5_ratio_office': highest_e5_ratio_office,
+        'highest_teams_ratio': highest_teams_ratio or 0,
+        'highest_teams_ratio_office': highest_teams_ratio_office,
+        'offices_no_licenses': no_licenses,
+        'avg_licenses_per_office': (total_365 + total_exchange + total_e5 + total_teams) / offices if offices else 0,
+        'top_offices_by_license': heapq.nlargest(
+            5,
+            ((row[0], row[1], row[2], row[3], row[4], row[1] + row[2] + row[3] + row[4]) for row in data),
+            key=lambda x: x[5]
+        ),
+        'top_offices_by_cost': heapq.nlargest(5, ((row[0], row[6]) for row in data), key=lambda x: x[1]),
     }
 
     return summary
@@ -1,24 +1,126 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
 from utils.logger import get_logger
+from utils.perf import span
+from utils.metrics_registry import registry
 
 logger = get_logger(__name__)
 
+# One client per process. gRPC channels do not survive a fork, so a gunicorn worker forked
+# from a parent that already had a client builds its own on first use.
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+_stats = {
+    'clients_created': 0,
+    'calls': 0,
+    'errors': 0,
+    'total_seconds': 0.0
+}
+_operations = {}
+
+FIRESTORE_LATENCY = registry.histogram('aion_firestore_call_duration_seconds', 'Latency of Firestore calls.',
+                                       ('operation', 'outcome'))
+
 
 def initialize_firestore():
-    logger.info("Checking Firebase initialization status")
+    """
+    Get this process's Firestore client, creating it on first use.
+
+    The client keeps its connection open, so every caller in the process shares it.
+
+    Returns:
+        google.cloud.firestore.Client: The Firestore client.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _lock:
+        if _client is None or _client_pid != pid:
+            if not firebase_admin._apps:
+                logger.info("Initializing Firebase app")
+                cred = credentials.Certificate('firebase/fb-key.json')
+                firebase_admin.initialize_app(cred)
+                logger.info('Firebase app initialized successfully')
+
+            # Built here rather than with firestore.client(), which returns the client cached on the Firebase
+            # app, so a forked worker would reuse its parent's channel
+            firebase_app = firebase_admin.get_app()
+            _client = firestore.Client(project=firebase_app.project_id,
+                                       credentials=firebase_app.credential.get_credential())
+            _client_pid = pid
+            _stats['clients_created'] += 1
+            logger.info(f'Firestore client created for process {pid}')
+    return _client
+
+
+@contextmanager
+def firestore_call(operation):
+    """
+    Count a request to Firestore and time it, also as the 'firestore <operation>' stage of utils.perf.
+
+    Args:
+        operation (str): Name of the operation, used to break the counters down.
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        with span(f'firestore {operation}'):
+            yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stats['calls'] += 1
+            _stats['total_seconds'] += elapsed
+            counts = _operations.setdefault(operation, {'calls': 0, 'errors': 0})
+            counts['calls'] += 1
+            if failed:
+                _stats['errors'] += 1
+                counts['errors'] += 1
+        FIRESTORE_LATENCY.observe(elapsed, operation=operation, outcome='error' if failed else 'ok')
+
+
+def get_firestore_stats():
+    """
+    Get this process's Firestore counters.
+
+    Returns:
+        dict: Clients created, calls, errors and their average latency, plus calls and errors per operation.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['operations'] = {operation: dict(counts) for operation, counts in _operations.items()}
+    stats['average_ms'] = round(stats.pop('total_seconds') / stats['calls'] * 1000, 2) if stats['calls'] else 0.0
+    stats['pid'] = os.getpid()
+    return stats
+
+
+def check_firestore(timeout=5):
+    """
+    Probe Firestore with a single document read.
+
+    Args:
+        timeout (float, optional): Seconds to wait for the read. Defaults to 5.
+
+    Returns:
+        dict: 'healthy' (bool), the read latency in milliseconds and, on failure, the error.
+    """
+    start = time.perf_counter()
     try:
-        firebase_admin.get_app()
-        logger.info('Firebase app is already initialized')
-    except ValueError:
-        logger.info('Firebase app has not been initialized')
-
-    if not firebase_admin._apps:
-        logger.info("Initializing Firebase app")
-        cred = credentials.Certificate('firebase/fb-key.json')
-        firebase_admin.initialize_app(cred)
-        logger.info('Firebase app initialized successfully')
-
-    fs = firestore.client()
-    logger.info('Firestore client created')
-    return fs
+        with firestore_call('health_check'):
+            initialize_firestore().collection('metrics').document('reports_generated').get(timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Firestore health check failed: {str(e)}")
+        return {'healthy': False, 'error': str(e)}
+    return {'healthy': True, 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
@@ -0,0 +1,14 @@
+"""
+Gunicorn configuration for the AION License Count application.
+"""
+
+import os
+import shutil
+import tempfile
+
+
+def on_starting(server):
+    # Counters in the metrics registry are summed over every worker that wrote to it, so each start of the
+    # server empties it. Keep the default in step with METRICS_REGISTRY_DIR in create_app.py.
+    shutil.rmtree(os.environ.get('METRICS_REGISTRY_DIR', os.path.join(tempfile.gettempdir(), 'aion_metrics')),
+                  ignore_errors=True)
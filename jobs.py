@@ -0,0 +1,162 @@
+"""
+Background job module for the AION License Count application.
+
+This module runs report generation on a local thread pool so that uploads can
+return right away. Jobs are tracked by id so their status can be polled, and the
+number of queued and running jobs is capped to apply backpressure.
+
+Job state lives in the memory of the worker process that accepted the upload.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the queue is at its depth limit.
+    """
+
+
+class Job:
+    """
+    A unit of background work and its outcome.
+
+    Args:
+        job_id (str): Unique identifier of the job.
+    """
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        """
+        Get the public state of the job.
+
+        Returns:
+            dict: The job id, status, result and error message.
+        """
+        return {
+            'id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobQueue:
+    """
+    Run jobs on a bounded thread pool and keep their status for polling.
+
+    Args:
+        max_workers (int, optional): Number of jobs run concurrently. Defaults to 2.
+        max_depth (int, optional): Maximum number of queued and running jobs. Defaults to 10.
+        ttl (int, optional): Seconds to keep finished jobs before they are forgotten. Defaults to 3600.
+    """
+
+    def __init__(self, max_workers=2, max_depth=10, ttl=3600):
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # Created on first use so that gunicorn workers forked from a preloaded app get their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='report-job')
+        return self._executor
+
+    def depth(self):
+        """
+        Get the number of jobs that are queued or running.
+
+        Returns:
+            int: The current queue depth.
+        """
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a function call to run in the background.
+
+        Args:
+            func (callable): The function to run. Its return value becomes the job result.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFullError: If max_depth jobs are already queued or running.
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+            if active >= self.max_depth:
+                raise QueueFullError(f"Job queue is full ({active} jobs)")
+            job = Job(str(uuid.uuid4()))
+            self._jobs[job.id] = job
+            self._get_executor().submit(self._run, job, func, args, kwargs)
+        logger.info(f"Queued job {job.id} ({active + 1} active)")
+        return job
+
+    def get(self, job_id):
+        """
+        Look up a job by id.
+
+        Args:
+            job_id (str): The job identifier.
+
+        Returns:
+            Job or None: The job, or None if it is unknown or has expired.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting work and optionally wait for running jobs to finish.
+
+        Args:
+            wait (bool, optional): Whether to block until queued jobs are done. Defaults to True.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _run(self, job, func, args, kwargs):
+        job.status = 'running'
+        job.started = time.time()
+        logger.info(f"Started job {job.id}")
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = 'done'
+            logger.info(f"Finished job {job.id} in {time.time() - job.started:.2f} seconds")
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            logger.exception(f"Job {job.id} failed")
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        # Forget finished jobs older than the TTL; the caller holds the lock
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,77 @@
+"""
+License classification module for the AION License Count application.
+
+This module owns the definition of the license categories that are counted in the
+report and maps raw license strings from the CSV export to those categories.
+
+Results are memoized in a bounded LRU cache so that the small vocabulary of license
+SKUs seen across uploads is only matched against the category variants once per
+worker process.
+"""
+
+from functools import lru_cache
+
+# License categories counted in the report, and the substrings that identify each one
+TARGET_LICENSES = {
+    '365 Premium': ['Microsoft 365 Business Premium', 'E3'],
+    'Exchange': ['Exchange'],
+    'E5': ['E5'],
+    'Teams': ['Microsoft Teams Enterprise']
+}
+
+
+class LicenseClassifier:
+    """
+    Map raw license strings to their report categories, caching each result.
+
+    Args:
+        target_licenses (dict, optional): Category name to list of matching substrings.
+            Defaults to TARGET_LICENSES.
+        maxsize (int, optional): Maximum number of distinct license strings to cache. Defaults to 1024.
+    """
+
+    def __init__(self, target_licenses=None, maxsize=1024):
+        self.target_licenses = dict(target_licenses if target_licenses is not None else TARGET_LICENSES)
+        self._classify = lru_cache(maxsize=maxsize)(self._match)
+
+    def _match(self, license_name):
+        license_name = license_name.strip()
+        return tuple(key for key, variants in self.target_licenses.items()
+                     if any(variant in license_name for variant in variants))
+
+    def classify(self, license_name):
+        """
+        Get the categories a license string belongs to.
+
+        Args:
+            license_name (str): A single license from the 'Licenses' column.
+
+        Returns:
+            tuple: Matching category names in TARGET_LICENSES order; empty if none match.
+        """
+        return self._classify(license_name)
+
+    def stats(self):
+        """
+        Get cache statistics for this classifier.
+
+        Returns:
+            dict: Cache hits, misses, current size and maximum size.
+        """
+        info = self._classify.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize
+        }
+
+    def clear(self):
+        """
+        Empty the cache and reset its counters.
+        """
+        self._classify.cache_clear()
+
+
+# Shared classifier for the worker process
+license_classifier = LicenseClassifier()
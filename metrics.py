@@ -1,51 +1,448 @@
+"""
+Metrics module for the AION License Count application.
+
+Usage metrics (unique users and reports generated) are recorded on an in-process
+queue and written in batches by a background thread: the report increments queued
+since the last flush become a single increment, and repeated addresses a single
+merge. A flush happens when the batch size is reached, when the flush interval has
+passed and when the worker exits.
+
+Unique users are counted with HyperLogLog sketches (see `utils.hyperloglog`), one
+for all time and one per day and per ISO week, so reading the counts costs the same
+however many users there are.
+
+Metrics are stored in Firestore, or in a local SQLite database for tests and
+deployments without access to Firestore. Reads are cached for a few seconds in each
+worker; the cache is cleared when the worker flushes or resets the metrics.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timezone
 from firebase_admin import firestore
 from firebase_config import initialize_firestore as db  # Assuming you have this import set up
+from firebase_config import firestore_call
+from utils.hyperloglog import HyperLogLog
 from utils.logger import get_logger
+from utils.ttl_cache import TTLCache
 from flask import jsonify
 
 logger = get_logger(__name__)
 
+# Firestore collection holding one unique-user sketch document per window
+SKETCH_COLLECTION = 'unique_user_sketches'
 
-def increment_unique_users(ip_address):
-    unique_users_ref = db().collection('metrics').document('unique_users')
-    unique_users_ref.set({
-        ip_address: firestore.firestore.SERVER_TIMESTAMP
-    }, merge=True)
-    logger.info(f"Added unique user with IP address {ip_address}")
 
+def sketch_windows(now=None):
+    """
+    Get the ids of the unique-user sketches that a visit counts towards.
 
-def increment_reports_generated():
-    reports_ref = db().collection('metrics').document('reports_generated')
-    reports_ref.set({
-        'count': firestore.firestore.Increment(1)
-    }, merge=True)
-    logger.info("Incremented reports_generated metric")
+    Args:
+        now (datetime, optional): Time of the visit. Defaults to the current UTC time.
 
+    Returns:
+        dict: Sketch ids keyed by window: 'all', 'today' ('day-YYYY-MM-DD') and 'this_week' ('week-YYYY-Www').
+    """
+    now = now or datetime.now(timezone.utc)
+    year, week, _ = now.isocalendar()
+    return {
+        'all': 'all',
+        'today': f"day-{now:%Y-%m-%d}",
+        'this_week': f"week-{year}-W{week:02d}"
+    }
 
-def get_metrics():
-    unique_users_doc = db().collection('metrics').document('unique_users').get()
-    unique_users_count = len(unique_users_doc.to_dict()) if unique_users_doc.exists else 0
 
-    reports_doc = db().collection('metrics').document('reports_generated').get()
-    reports_count = reports_doc.to_dict().get('count', 0) if reports_doc.exists else 0
+def merge_sketch(data, unique_users):
+    """
+    Add addresses to a stored sketch.
 
+    Args:
+        data (bytes or None): The serialized sketch, or None to start a new one.
+        unique_users (iterable): The addresses to add.
+
+    Returns:
+        HyperLogLog: The updated sketch.
+    """
+    sketch = HyperLogLog.from_bytes(data) if data else HyperLogLog()
+    sketch.update(unique_users)
+    return sketch
+
+
+def metrics_result(counts, reports_generated):
+    # Shape the counts read by a backend for /api/metrics
     return {
-        'unique_users': unique_users_count,
-        'reports_generated': reports_count
+        'unique_users': counts.get('all', 0),
+        'unique_users_today': counts.get('today', 0),
+        'unique_users_this_week': counts.get('this_week', 0),
+        'reports_generated': reports_generated
     }
 
 
-def reset_metrics():
-    db_instance = db()
+class FirestoreMetricsBackend:
+    """
+    Store metrics in Firestore: the report count in 'metrics/reports_generated' and the
+    unique-user sketches in the 'unique_user_sketches' collection.
+    """
+
+    def add(self, unique_users, reports_generated):
+        """
+        Write a batch of metrics.
+
+        Args:
+            unique_users (set): Addresses of users seen since the last write.
+            reports_generated (int): Reports generated since the last write.
+        """
+        db_instance = db()
+        reports_ref = db_instance.collection('metrics').document('reports_generated')
+        if not unique_users:
+            with firestore_call('add_metrics'):
+                reports_ref.set({'count': firestore.firestore.Increment(reports_generated)}, merge=True)
+            return
+
+        sketch_refs = [db_instance.collection(SKETCH_COLLECTION).document(sketch_id)
+                       for sketch_id in sketch_windows().values()]
+
+        @firestore.firestore.transactional
+        def update(transaction):
+            # Sketches are merged inside a transaction so that concurrent flushes from other workers are not lost
+            # Transactions must do all their reads before writing
+            stored = [snapshot.to_dict().get('sketch') if snapshot.exists else None
+                      for snapshot in (ref.get(transaction=transaction) for ref in sketch_refs)]
+            all_time_users = unique_users
+            if stored[0] is None:
+                all_time_users = unique_users | self._legacy_unique_users(db_instance, transaction)
+
+            for ref, data, users in zip(sketch_refs, stored, [all_time_users] + [unique_users] * 2):
+                sketch = merge_sketch(data, users)
+                transaction.set(ref, {'sketch': sketch.to_bytes(), 'count': sketch.count()})
+            if reports_generated:
+                transaction.set(reports_ref, {'count': firestore.firestore.Increment(reports_generated)}, merge=True)
+
+        with firestore_call('add_metrics'):
+            update(db_instance.transaction())
+
+    @staticmethod
+    def _legacy_unique_users(db_instance, transaction=None):
+        # Addresses recorded one field each in 'metrics/unique_users' before the sketches existed
+        snapshot = db_instance.collection('metrics').document('unique_users').get(transaction=transaction)
+        return set(snapshot.to_dict()) if snapshot.exists else set()
+
+    def get(self):
+        """
+        Read the metrics.
+
+        Returns:
+            dict: The 'unique_users' count for all time, 'unique_users_today', 'unique_users_this_week'
+                and 'reports_generated'.
+        """
+        db_instance = db()
+        windows = sketch_windows()
+        refs = [db_instance.collection(SKETCH_COLLECTION).document(sketch_id) for sketch_id in windows.values()]
+        refs.append(db_instance.collection('metrics').document('reports_generated'))
+
+        # Only the stored counts are fetched, not the sketches
+        with firestore_call('get_metrics'):
+            snapshots = {snapshot.reference.path: snapshot
+                         for snapshot in db_instance.get_all(refs, field_paths=['count'])}
+        counts = {}
+        for window, ref in zip(windows, refs):
+            snapshot = snapshots.get(ref.path)
+            if snapshot is not None and snapshot.exists:
+                counts[window] = snapshot.to_dict().get('count', 0)
+        if 'all' not in counts:
+            with firestore_call('get_metrics'):
+                counts['all'] = len(self._legacy_unique_users(db_instance))
+
+        reports_doc = snapshots.get(refs[-1].path)
+        reports_count = reports_doc.to_dict().get('count', 0) if reports_doc is not None and reports_doc.exists else 0
+        return metrics_result(counts, reports_count)
+
+    def reset(self):
+        """
+        Set all metrics back to zero.
+        """
+        db_instance = db()
+
+        # Reset unique users
+        batch = db_instance.batch()
+        with firestore_call('reset_metrics'):
+            for ref in db_instance.collection(SKETCH_COLLECTION).list_documents():
+                batch.delete(ref)
+        batch.delete(db_instance.collection('metrics').document('unique_users'))
+
+        # Reset reports generated
+        batch.set(db_instance.collection('metrics').document('reports_generated'), {
+            'count': 0
+        })
+        with firestore_call('reset_metrics'):
+            batch.commit()
+
+
+class SQLiteMetricsBackend:
+    """
+    Store metrics in a local SQLite database, shared by all workers on the host.
+
+    Args:
+        db_path (str): Path of the database file.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS sketches (id TEXT PRIMARY KEY, sketch BLOB NOT NULL, "
+                             "count INTEGER NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def add(self, unique_users, reports_generated):
+        """
+        Write a batch of metrics. See FirestoreMetricsBackend.add.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sketch_id in sketch_windows().values() if unique_users else []:
+                row = conn.execute("SELECT sketch FROM sketches WHERE id = ?", (sketch_id,)).fetchone()
+                sketch = merge_sketch(row[0] if row else None, unique_users)
+                conn.execute("INSERT OR REPLACE INTO sketches (id, sketch, count) VALUES (?, ?, ?)",
+                             (sketch_id, sketch.to_bytes(), sketch.count()))
+            if reports_generated:
+                conn.execute("INSERT INTO counters (name, value) VALUES ('reports_generated', ?) "
+                             "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                             (reports_generated,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self):
+        """
+        Read the metrics. See FirestoreMetricsBackend.get.
+        """
+        windows = sketch_windows()
+        conn = self._connect()
+        try:
+            counts = {window: row[0] for window, sketch_id in windows.items()
+                      for row in conn.execute("SELECT count FROM sketches WHERE id = ?", (sketch_id,))}
+            row = conn.execute("SELECT value FROM counters WHERE name = 'reports_generated'").fetchone()
+        finally:
+            conn.close()
+        return metrics_result(counts, row[0] if row else 0)
+
+    def reset(self):
+        """
+        Set all metrics back to zero.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM sketches")
+            conn.execute("DELETE FROM counters")
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
 
-    # Reset unique users
-    unique_users_ref = db_instance.collection('metrics').document('unique_users')
-    unique_users_ref.set({})
 
-    # Reset reports generated
-    reports_ref = db_instance.collection('metrics').document('reports_generated')
-    reports_ref.set({
-        'count': 0
-    })
+class MetricsPipeline:
+    """
+    Queue metrics events and write them to a backend in coalesced batches.
 
+    Args:
+        backend: Where metrics are stored, such as FirestoreMetricsBackend.
+        batch_size (int, optional): Queued events that trigger a flush. Defaults to 100.
+        flush_interval (float, optional): Seconds between flushes of a partial batch. Defaults to 5.
+    """
+
+    def __init__(self, backend, batch_size=100, flush_interval=5.0):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+    def _ensure_started(self):
+        # The flusher thread is started on first use so that each gunicorn worker runs its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid is not None and self._pid != os.getpid():
+                    # Forked from a process that had already queued events: those are the parent's to write
+                    self._queue = queue.Queue()
+                    self._wake = threading.Event()
+                self._pid = os.getpid()
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _put(self, event):
+        self._ensure_started()
+        self._queue.put(event)
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def record_unique_user(self, ip_address):
+        """
+        Queue a visit from a user.
+
+        Args:
+            ip_address (str): The user's address.
+        """
+        self._put(('unique_user', ip_address))
+
+    def record_report(self, count=1):
+        """
+        Queue generated reports.
+
+        Args:
+            count (int, optional): Number of reports. Defaults to 1.
+        """
+        self._put(('reports_generated', count))
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing metrics")
+
+    def _drain(self):
+        unique_users = set()
+        reports_generated = 0
+        events = 0
+        while True:
+            try:
+                kind, value = self._queue.get_nowait()
+            except queue.Empty:
+                return unique_users, reports_generated, events
+            events += 1
+            if kind == 'unique_user':
+                unique_users.add(value)
+            else:
+                reports_generated += value
+
+    def flush(self):
+        """
+        Write the queued events to the backend.
+
+        Returns:
+            int: The number of events written.
+
+        Raises:
+            Exception: If the backend write fails. The events are queued again for the next flush.
+        """
+        with self._flush_lock:
+            unique_users, reports_generated, events = self._drain()
+            if not events:
+                return 0
+            try:
+                self.backend.add(unique_users, reports_generated)
+            except Exception:
+                for ip_address in unique_users:
+                    self._queue.put(('unique_user', ip_address))
+                if reports_generated:
+                    self._queue.put(('reports_generated', reports_generated))
+                raise
+            metrics_cache.invalidate()
+        logger.info(f"Flushed {events} metrics events ({len(unique_users)} unique users, "
+                    f"{reports_generated} reports)")
+        return events
+
+    def reset(self):
+        """
+        Discard the queued events and reset the stored metrics.
+        """
+        with self._flush_lock:
+            self._drain()
+            self.backend.reset()
+            metrics_cache.invalidate()
+
+    def shutdown(self, timeout=10):
+        """
+        Stop the flusher thread and write whatever is still queued.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the thread to stop. Defaults to 10.
+        """
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping = True
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+            atexit.unregister(self.shutdown)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Error flushing metrics at shutdown")
+
+
+pipeline = MetricsPipeline(FirestoreMetricsBackend())
+metrics_cache = TTLCache(ttl=10)
+
+
+def configure_metrics(backend='firestore', db_path='metrics.db', batch_size=100, flush_interval=5.0, cache_ttl=10):
+    """
+    Replace the metrics pipeline, writing anything queued on the old one first.
+
+    Args:
+        backend (str, optional): 'firestore', or 'sqlite' to keep metrics in a local database. Defaults to 'firestore'.
+        db_path (str, optional): Database file of the 'sqlite' backend. Defaults to 'metrics.db'.
+        batch_size (int, optional): Queued events that trigger a flush. Defaults to 100.
+        flush_interval (float, optional): Seconds between flushes of a partial batch. Defaults to 5.
+        cache_ttl (float, optional): Seconds get_metrics results are reused. Defaults to 10.
+
+    Returns:
+        MetricsPipeline: The new pipeline.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    global pipeline
+    if backend == 'firestore':
+        store = FirestoreMetricsBackend()
+    elif backend == 'sqlite':
+        store = SQLiteMetricsBackend(db_path)
+    else:
+        raise ValueError(f"Unknown metrics backend: {backend}")
+    pipeline.shutdown()
+    pipeline = MetricsPipeline(store, batch_size, flush_interval)
+    metrics_cache.ttl = cache_ttl
+    metrics_cache.invalidate()
+    return pipeline
+
+
+def increment_unique_users(ip_address):
+    pipeline.record_unique_user(ip_address)
+    logger.debug(f"Queued unique user with IP address {ip_address}")
+
+
+def increment_reports_generated():
+    pipeline.record_report()
+    logger.debug("Queued reports_generated increment")
+
+
+def get_metrics():
+    return metrics_cache.get_or_load('metrics', pipeline.backend.get)
+
+
+def reset_metrics():
+    pipeline.reset()
     logger.info("Metrics reset successfully")
@@ -10,15 +10,19 @@ document.addEventListener('DOMContentLoaded', function () {
     const resetMetricsBtn = document.getElementById('reset-metrics-btn');
 
     let currentPage = 1;
+    let nextCursor = null;
     let isLoading = false;
     let hasMoreLogs = true;
 
     fetchMetrics();
     setInterval(fetchMetrics, 10000)
+    fetchPerf();
+    setInterval(fetchPerf, 10000);
     fetchLogs(false);
 
     applyFilters.addEventListener('click', () => {
         currentPage = 1;
+        nextCursor = null;
         hasMoreLogs = true;
         fetchLogs(false);
     });
@@ -45,6 +49,9 @@ document.addEventListener('DOMContentLoaded', function () {
             page: currentPage,
             per_page: 50
         });
+        if (append && nextCursor) {
+            params.set('cursor', nextCursor);
+        }
 
         fetch(`/api/logs?${params}`)
             .then(handleResponse)
@@ -58,7 +65,8 @@ document.addEventListener('DOMContentLoaded', function () {
                     logsOutput.appendChild(logEntry);
                 });
 
-                hasMoreLogs = currentPage < data.total_pages;
+                nextCursor = data.next_cursor;
+                hasMoreLogs = nextCursor ? true : currentPage < data.total_pages;
                 loadMoreButton.style.display = hasMoreLogs ? 'block' : 'none';
 
                 isLoading = false;
@@ -72,11 +80,50 @@ document.addEventListener('DOMContentLoaded', function () {
             .then(handleResponse)
             .then(data => {
                 document.getElementById('unique-users-count').textContent = data.unique_users;
+                document.getElementById('unique-users-today').textContent = data.unique_users_today;
+                document.getElementById('unique-users-week').textContent = data.unique_users_this_week;
                 document.getElementById('reports-generated-count').textContent = data.reports_generated;
             })
             .catch(handleError);
     }
 
+    function fetchPerf() {
+        fetch('/api/perf')
+            .then(handleResponse)
+            .then(data => {
+                document.getElementById('perf-pid').textContent = data.pid;
+                document.getElementById('perf-window').textContent = data.window;
+                document.getElementById('perf-rss').textContent = data.peak_rss_mb ?? '-';
+                renderPerfChart(data.stages);
+            })
+            .catch(handleError);
+    }
+
+    function renderPerfChart(stages) {
+        const names = Object.keys(stages);
+        if (names.length === 0) return;
+
+        // Bars share one scale, set by the slowest p99
+        const slowest = Math.max(...names.map(name => stages[name].wall_ms.p99));
+        const chart = document.getElementById('perf-chart');
+        chart.innerHTML = '';
+        names.sort((a, b) => stages[b].wall_ms.p50 - stages[a].wall_ms.p50).forEach(name => {
+            const wall = stages[name].wall_ms;
+            const row = document.createElement('div');
+            row.className = 'perf-row';
+            row.innerHTML = `
+                <span class="perf-name">${escapeHtml(name)} (${stages[name].count})</span>
+                <div class="perf-bars">
+                    ${['p99', 'p95', 'p50'].map(q =>
+                        `<div class="perf-bar ${q}" style="width: ${slowest ? wall[q] / slowest * 100 : 0}%"></div>`
+                    ).join('')}
+                </div>
+                <span class="perf-values">p50 ${wall.p50} ms &middot; p95 ${wall.p95} ms &middot; p99 ${wall.p99} ms</span>
+            `;
+            chart.appendChild(row);
+        });
+    }
+
     function resetMetrics() {
         if (confirm('Are you sure you want to reset the metrics? This action cannot be undone.')) {
             fetch('/api/reset_metrics', {
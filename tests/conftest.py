@@ -0,0 +1,22 @@
+# tests/conftest.py
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The app configures its metrics when it is imported, so these are set before any test imports it: tests keep
+# their metrics in a local database instead of Firestore, and their registry values away from the shared default
+_metrics_dir = tempfile.mkdtemp(prefix='aion-test-metrics-')
+os.environ['METRICS_BACKEND'] = 'sqlite'
+os.environ['METRICS_DB_PATH'] = os.path.join(_metrics_dir, 'metrics.db')
+os.environ['METRICS_REGISTRY_DIR'] = os.path.join(_metrics_dir, 'registry')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def metrics_pipeline():
+    yield
+    # Write what the tests queued while logging still works, rather than at interpreter exit
+    import metrics
+    metrics.pipeline.shutdown()
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
@@ -1,19 +1,31 @@
 # tests/test_app.py
+import hashlib
 import os
+import random
+import shutil
+from io import BytesIO
 
 import pytest
 import json
-from app import app
+from app import app, login_manager, job_queue, generate_report
+from models import User
+from jobs import Job, QueueFullError
 from utils.version_info import get_version_info
 from unittest.mock import patch
 from flask import session
+from utils.metrics_registry import registry
+from utils.report_cache import ReportCache
+from .test_data_generator import generate_test_csv
 
 
 @pytest.fixture
-def client():
+def client(tmp_path):
     app.config['TESTING'] = True
+    # Each test starts from an empty metrics registry of its own
+    registry.configure(str(tmp_path / 'metrics'), app.config['METRICS_REGISTRY_SYNC_INTERVAL'])
     with app.test_client() as client:
         yield client
+    registry.configure(app.config['METRICS_REGISTRY_DIR'], app.config['METRICS_REGISTRY_SYNC_INTERVAL'])
 
 
 def test_index_route(client):
@@ -81,12 +93,176 @@ def test_upload_valid_file(client, tmp_path):
         with patch('app.process_file') as mock_process:
             mock_process.return_value = ('/path/to/result.xlsx', 'friendly_name.xlsx')
             response = client.post('/upload', data=data, content_type='multipart/form-data')
+            # Let the background job finish while process_file is still patched
+            job_queue.shutdown(wait=True)
 
     assert response.status_code == 302  # Expect a redirect on successful upload
     assert response.headers['Location'].startswith('/summary/')
     os.remove(test_file)
 
 
+def test_upload_too_large(client):
+    csv_content = b"Office,Licenses,User principal name,Display name\n" + b"Office1,License1,user@example.com,User 1\n" * 100
+    data = {'file': (BytesIO(csv_content), 'large.csv'), 'cost_per_user': '115', 'cost_per_exchange': '20'}
+    with patch.dict(app.config, {'MAX_UPLOAD_BYTES': 1024}), patch('app.job_queue.submit') as mock_submit:
+        response = client.post('/upload', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 413
+    assert b"File Too Large" in response.data
+    mock_submit.assert_not_called()
+    assert not [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.endswith('.part')]
+
+
+def test_upload_passes_content_hash_to_job(client):
+    csv_content = b"Office,Licenses,User principal name,Display name\nOffice1,License1,user@example.com,User 1"
+    data = {'file': (BytesIO(csv_content), 'hashed.csv'), 'cost_per_user': '115', 'cost_per_exchange': '20'}
+    with patch('app.job_queue.submit', return_value=Job('hash_job')) as mock_submit:
+        response = client.post('/upload', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    file_path = mock_submit.call_args.args[1]
+    assert mock_submit.call_args.kwargs['content_hash'] == hashlib.sha256(csv_content).hexdigest()
+    with open(file_path, 'rb') as f:
+        assert f.read() == csv_content
+    os.remove(file_path)
+
+
+def test_upload_queue_full(client, tmp_path):
+    csv_content = b"Office,Licenses,User principal name,Display name\nOffice1,License1,user@example.com,User 1"
+    test_file = tmp_path / "test.csv"
+    test_file.write_bytes(csv_content)
+
+    with open(test_file, 'rb') as f:
+        data = {'file': (f, 'test.csv'), 'cost_per_user': '115', 'cost_per_exchange': '20'}
+        with patch('app.job_queue.submit', side_effect=QueueFullError("Job queue is full")):
+            response = client.post('/upload', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 429
+    assert b"Server Busy" in response.data
+
+
+def test_upload_batch_submits_all_exports(client):
+    csv_content = b"Office,Licenses,User principal name,Display name\nOffice1,License1,user@example.com,User 1"
+    data = {'files': [(BytesIO(csv_content), 'contoso.csv'), (BytesIO(csv_content), 'contoso.csv')],
+            'cost_per_user': '115', 'cost_per_exchange': '20'}
+    with patch('app.job_queue.submit', return_value=Job('batch_job')) as mock_submit:
+        response = client.post('/upload/batch', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/summary/pending/batch_job'
+    exports = mock_submit.call_args.args[1]
+    assert list(exports) == ['contoso', 'contoso (2)']
+    assert mock_submit.call_args.kwargs['rows'] == {'contoso': 1, 'contoso (2)': 1}
+    assert exports['contoso'] != exports['contoso (2)']
+    for file_path in exports.values():
+        with open(file_path, 'rb') as f:
+            assert f.read() == csv_content
+        os.remove(file_path)
+
+
+def test_upload_batch_rejects_too_many_files(client):
+    csv_content = b"Office,Licenses,User principal name,Display name\nOffice1,License1,user@example.com,User 1"
+    data = {'files': [(BytesIO(csv_content), f'tenant{i}.csv') for i in range(3)]}
+    with patch.dict(app.config, {'BATCH_MAX_FILES': 2}), patch('app.job_queue.submit') as mock_submit:
+        response = client.post('/upload/batch', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert b"Too Many Files" in response.data
+    mock_submit.assert_not_called()
+
+
+def test_upload_batch_with_invalid_file_removes_received_files(client, tmp_path):
+    csv_content = b"Office,Licenses,User principal name,Display name\nOffice1,License1,user@example.com,User 1"
+    data = {'files': [(BytesIO(csv_content), 'a.csv'), (BytesIO(csv_content), 'b.csv'),
+                      (BytesIO(b"Name,Email\nUser 1,user@example.com"), 'c.csv')]}
+    upload_dir, invalid_dir = tmp_path / 'uploads', tmp_path / 'invalid'
+    upload_dir.mkdir()
+    invalid_dir.mkdir()
+    with patch.dict(app.config, {'UPLOAD_FOLDER': str(upload_dir), 'INVALID_FOLDER': str(invalid_dir)}), \
+            patch('app.job_queue.submit') as mock_submit:
+        response = client.post('/upload/batch', data=data, content_type='multipart/form-data')
+
+    assert b"Invalid CSV File" in response.data
+    mock_submit.assert_not_called()
+    assert os.listdir(invalid_dir) == ['c.csv']
+    assert os.listdir(upload_dir) == []
+
+
+def test_generate_report_answers_identical_upload_before_loading_it(tmp_path):
+    random.seed(9)
+    first_csv = generate_test_csv(tmp_path, num_rows=200)
+    second_csv = str(tmp_path / "again.csv")
+    shutil.copy(first_csv, second_csv)
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(output_dir)}), \
+            patch('app.report_cache', ReportCache(str(tmp_path / "cache"))):
+        first = generate_report(first_csv, 'test_data.csv', 115, 20, '127.0.0.1')
+        with patch('app.load_csv') as mock_load_csv, patch('app.process_file') as mock_process_file:
+            second = generate_report(second_csv, 'again.csv', 115, 20, '127.0.0.1')
+
+    mock_load_csv.assert_not_called()
+    mock_process_file.assert_not_called()
+    assert second['filename'] != first['filename']
+    assert os.path.exists(output_dir / second['filename'])
+    assert not os.path.exists(second_csv)
+
+
+def test_job_status_unknown_job(client):
+    response = client.get('/jobs/unknown-job')
+    assert response.status_code == 404
+    assert json.loads(response.data)['error'] == 'Job not found'
+
+
+def test_job_status_done_sets_session(client):
+    job = Job('test_job_id')
+    job.status = 'done'
+    job.result = {'filename': 'abc_license_counts_2024_01_01.xlsx', 'friendly_filename': 'friendly.xlsx'}
+
+    with client.session_transaction() as sess:
+        sess['pending_job_id'] = 'test_job_id'
+
+    with patch('app.job_queue.get', return_value=job):
+        response = client.get('/jobs/test_job_id')
+
+    data = json.loads(response.data)
+    assert data['status'] == 'done'
+    assert data['summary_url'] == '/summary/abc_license_counts_2024_01_01.xlsx'
+    with client.session_transaction() as sess:
+        assert sess['pending_file_id'] == 'abc'
+        assert sess['friendly_filename'] == 'friendly.xlsx'
+
+
+def test_job_status_done_batch_links_tenant_reports(client):
+    job = Job('batch_job')
+    job.status = 'done'
+    job.result = {'filename': 'abc_consolidated_license_counts_2024_01_01.xlsx', 'friendly_filename': 'all.xlsx',
+                  'reports': [{'tenant': 'contoso', 'filename': 'def_license_counts_2024_01_01.xlsx',
+                               'friendly_filename': 'contoso.xlsx'}],
+                  'errors': {}}
+
+    with client.session_transaction() as sess:
+        sess['pending_job_id'] = 'batch_job'
+
+    with patch('app.job_queue.get', return_value=job):
+        response = client.get('/jobs/batch_job')
+
+    data = json.loads(response.data)
+    assert data['result']['reports'][0]['download_url'] == '/download/def_license_counts_2024_01_01.xlsx'
+    assert 'download_url' not in job.result['reports'][0]
+    with client.session_transaction() as sess:
+        assert sess['pending_file_id'] == 'abc'
+        assert sess['report_names'] == {'def_license_counts_2024_01_01.xlsx': 'contoso.xlsx'}
+
+
+def test_show_pending_summary(client):
+    response = client.get('/summary/pending/test_job_id')
+    assert response.status_code == 200
+    assert b"Generating your report" in response.data
+    assert b"/jobs/test_job_id" in response.data
+
+
 def test_download_nonexistent_file(client):
     response = client.get('/download/nonexistent.xlsx')
     assert response.status_code == 200
@@ -99,6 +275,24 @@ def test_show_summary_nonexistent_file(client):
     assert b"An error occurred while generating the summary" in response.data
 
 
+def test_show_summary_uses_cached_summary(client):
+    summary = {
+        'total_365_premium': 3, 'total_exchange': 2, 'total_e5': 1, 'total_teams': 0, 'total_cost': 40,
+        'avg_cost_per_office': 20, 'highest_cost': 40, 'highest_cost_office': 'Office1', 'percent_with_e5': 50,
+        'offices_with_e5': 1, 'percent_both_licenses': 50, 'percent_only_365': 50, 'percent_only_exchange': 0,
+        'percent_only_e5': 0, 'percent_only_teams': 0, 'highest_exchange_ratio': 1,
+        'highest_exchange_ratio_office': 'Office1', 'highest_e5_ratio': 0.5, 'highest_e5_ratio_office': 'Office1',
+        'highest_teams_ratio': 0, 'highest_teams_ratio_office': 'Office1', 'offices_no_licenses': 0,
+        'avg_licenses_per_office': 3, 'top_offices_by_license': [['Office1', 2, 2, 1, 0, 5]]
+    }
+    with patch('app.load_summary', return_value=summary), patch('app.generate_summary') as mock_generate:
+        response = client.get('/summary/report.xlsx')
+
+    assert response.status_code == 200
+    assert b"Download Full Report" in response.data
+    mock_generate.assert_not_called()
+
+
 def test_cleanup_undownloaded_no_file_id(client):
     with client.session_transaction() as sess:
         sess.clear()
@@ -132,19 +326,130 @@ def test_check_session(client):
     assert data['friendly_filename'] == 'test.xlsx'
 
 
-# Uncomment and modify this test when the get_logs route is enabled
-# def test_get_logs(client, tmp_path):
-#     log_file = tmp_path / "app.log"
-#     log_file.write_text('{"level": "info", "event": "test_event", "timestamp": "2023-01-01T00:00:00"}\n')
-#     app.config['LOG_DIR'] = str(tmp_path)
-#
-#     response = client.get('/api/logs')
-#     assert response.status_code == 200
-#     data = json.loads(response.data)
-#     assert len(data['logs']) == 1
-#     assert data['logs'][0]['event'] == 'test_event'
+@pytest.fixture
+def logged_in_client(client):
+    with patch.object(login_manager, '_user_callback', User):
+        with client.session_transaction() as sess:
+            sess['_user_id'] = 'admin'
+        yield client
+
+
+LOG_LINES = [
+    {"timestamp": "2023-01-01 00:00:01,000", "level": "INFO", "name": "app",
+     "message": json.dumps({"event": "test_event", "level": "info", "timestamp": "2023-01-01T00:00:01.000000Z",
+                            "ip": "10.0.0.1", "path": "/upload", "method": "POST"})},
+    {"timestamp": "2023-01-01 00:00:02,000", "level": "INFO", "name": "app",
+     "message": json.dumps({"event": "metrics polled", "level": "info", "timestamp": "2023-01-01T00:00:02.000000Z",
+                            "ip": "10.0.0.2", "path": "/api/metrics", "method": "GET"})},
+    {"timestamp": "2023-01-01 00:00:03,000", "level": "ERROR", "name": "app", "message": "plain failure"},
+]
+
+
+@pytest.mark.parametrize('log_index', [True, False])
+def test_get_logs(logged_in_client, tmp_path, log_index):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(''.join(json.dumps(line) + '\n' for line in LOG_LINES))
+
+    with patch.dict(app.config, {'LOG_DIR': str(tmp_path), 'LOG_INDEX': log_index}):
+        response = logged_in_client.get('/api/logs')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['total'] == (3 if log_index else None)
+        assert data['next_cursor'] is None
+        assert [log['event'] for log in data['logs']] == ['plain failure', 'metrics polled', 'test_event']
+        assert data['logs'][2]['ip'] == '10.0.0.1'
+        assert data['logs'][2]['timestamp'] == '2023-01-01T00:00:01+00:00'
+
+        data = json.loads(logged_in_client.get('/api/logs?exclude_api=true&http_method=post').data)
+        assert [log['event'] for log in data['logs']] == ['test_event']
+
+        data = json.loads(logged_in_client.get('/api/logs?level=error&search=FAIL').data)
+        assert [log['event'] for log in data['logs']] == ['plain failure']
+
+        data = json.loads(logged_in_client.get('/api/logs?start_date=2023-01-01T00:00:02&per_page=1&page=2').data)
+        assert [log['event'] for log in data['logs']] == ['metrics polled']
+        if log_index:
+            assert data['total'] == 2
+            assert data['total_pages'] == 2
+
+
+def test_get_logs_cursor(logged_in_client, tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(''.join(json.dumps(line) + '\n' for line in LOG_LINES))
+
+    with patch.dict(app.config, {'LOG_DIR': str(tmp_path), 'LOG_INDEX': False}):
+        data = json.loads(logged_in_client.get('/api/logs?per_page=2').data)
+        assert [log['event'] for log in data['logs']] == ['plain failure', 'metrics polled']
+        assert data['next_cursor']
+
+        data = json.loads(logged_in_client.get(f"/api/logs?per_page=2&cursor={data['next_cursor']}").data)
+        assert [log['event'] for log in data['logs']] == ['test_event']
+        assert data['next_cursor'] is None
+
+        response = logged_in_client.get('/api/logs?cursor=bogus')
+        assert response.status_code == 400
+
+
+def test_get_logs_requires_login(client):
+    response = client.get('/api/logs')
+    assert response.status_code == 401
+
 
 def test_page_not_found(client):
     response = client.get('/nonexistent_route')
     assert response.status_code == 404
     assert b"404 - Page Not Found" in response.data
+
+
+def test_firestore_health_check(client):
+    with patch('app.check_firestore', return_value={'healthy': False, 'error': 'unavailable'}):
+        response = client.get('/health/firestore')
+    assert response.status_code == 503
+    data = json.loads(response.data)
+    assert data['status'] == 'unhealthy'
+    assert 'calls' in data['stats']
+
+
+def test_load_user_is_cached_until_logout(client):
+    with patch('app.db') as mock_db:
+        mock_db.return_value.collection.return_value.document.return_value.get.return_value.exists = True
+        with client.session_transaction() as sess:
+            sess['_user_id'] = 'cached-admin'
+        client.get('/api/cache_stats')
+        response = client.get('/api/cache_stats')
+        assert response.status_code == 200
+        assert mock_db.call_count == 1
+        assert json.loads(response.data)['users']['hits'] >= 1
+
+        client.get('/logout')
+        with client.session_transaction() as sess:
+            sess['_user_id'] = 'cached-admin'
+        client.get('/api/cache_stats')
+        assert mock_db.call_count == 2
+
+
+def test_api_perf(logged_in_client):
+    with patch('app.get_perf_stats', return_value={'pid': 1, 'window': 1000, 'peak_rss_mb': 100.0, 'stages': {}}):
+        response = logged_in_client.get('/api/perf')
+    assert response.status_code == 200
+    assert json.loads(response.data)['window'] == 1000
+
+
+def test_api_perf_requires_login(client):
+    assert client.get('/api/perf').status_code == 401
+
+
+def test_prometheus_metrics(client):
+    client.get('/')
+    client.get('/')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    lines = response.data.decode().splitlines()
+    assert 'aion_http_request_duration_seconds_count{route="/",method="GET",status="200"} 2' in lines
+    assert 'aion_http_request_duration_seconds_bucket{route="/",method="GET",status="200",le="+Inf"} 2' in lines
+    assert '# TYPE aion_job_queue_depth gauge' in lines
+    assert 'aion_job_queue_depth 0' in lines
+    # Nothing recorded by earlier tests or runs is included
+    assert not [line for line in lines if line.startswith(('aion_reports_generated_total', 'aion_upload_size_bytes'))]
+    assert any(line.startswith('aion_cache_misses_total{cache="users"} ') for line in lines)
@@ -0,0 +1,101 @@
+# tests/test_batch.py
+import logging
+import os
+import random
+import shutil
+from unittest.mock import patch
+
+import openpyxl
+import pytest
+
+from batch import process_batch, process_tenant, tenant_names
+from create_app import app
+from csv_parser import generate_summary, load_summary
+from .test_data_generator import generate_test_csv
+
+
+def test_tenant_names_are_made_unique():
+    assert tenant_names(['exports/contoso.csv', 'fabrikam.csv', 'other/contoso.csv']) == \
+        ['contoso', 'fabrikam', 'contoso (2)']
+
+
+def make_export(tmp_path, tenant, num_rows):
+    tenant_dir = tmp_path / tenant
+    tenant_dir.mkdir()
+    return generate_test_csv(tenant_dir, num_rows=num_rows)
+
+
+def test_process_batch_generates_tenant_and_consolidated_reports(tmp_path):
+    random.seed(11)
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    broken = tmp_path / 'broken.csv'
+    broken.write_text('not,a,license,export\n1,2,3,4\n')
+    exports = {
+        'contoso': make_export(tmp_path, 'contoso', 300),
+        'broken': str(broken),
+        'fabrikam': make_export(tmp_path, 'fabrikam', 600),
+    }
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(output_dir), 'REPORT_CACHE_MAX_BYTES': 0}):
+        result = process_batch(exports, workers=2)
+
+    assert [report['tenant'] for report in result['reports']] == ['contoso', 'fabrikam']
+    assert list(result['errors']) == ['broken']
+    assert result['reports'][0]['friendly_filename'].startswith('AION_License_Report_contoso_')
+    assert not os.path.exists(exports['contoso']) and not os.path.exists(exports['fabrikam'])
+
+    tenant_totals = [generate_summary(str(output_dir / report['filename']))['total_365_premium']
+                     for report in result['reports']]
+    consolidated_path = str(output_dir / result['filename'])
+    tenants_sheet = openpyxl.load_workbook(consolidated_path)['Tenants']
+    premium = [cell.value for cell in tenants_sheet[1]].index('365 Premium')
+    assert [[cell.value for cell in row][premium] for row in tenants_sheet.iter_rows(min_row=2)] == \
+        tenant_totals + [sum(tenant_totals)]
+    assert load_summary(consolidated_path)['total_365_premium'] == sum(tenant_totals)
+
+
+def test_process_batch_fails_when_no_report_is_generated(tmp_path):
+    broken = tmp_path / 'broken.csv'
+    broken.write_text('not,a,license,export\n')
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(tmp_path), 'REPORT_CACHE_MAX_BYTES': 0}):
+        with pytest.raises(RuntimeError):
+            process_batch({'broken': str(broken)}, workers=1)
+
+
+def test_process_batch_workers_log_through_the_parent(tmp_path):
+    random.seed(17)
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    root_logger = logging.getLogger()
+    root_logger.addHandler(handler)
+
+    try:
+        with patch.dict(app.config, {'OUTPUT_FOLDER': str(output_dir), 'REPORT_CACHE_MAX_BYTES': 0}):
+            process_batch({'contoso': make_export(tmp_path, 'contoso', 100)}, workers=1)
+    finally:
+        root_logger.removeHandler(handler)
+
+    assert any(record.processName != 'MainProcess' and record.name == 'csv_parser' for record in records)
+
+
+def test_process_tenant_answers_unchanged_export_before_loading_it(tmp_path):
+    random.seed(13)
+    first_csv = generate_test_csv(tmp_path, num_rows=200)
+    second_csv = str(tmp_path / 'again.csv')
+    shutil.copy(first_csv, second_csv)
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(output_dir), 'REPORT_CACHE_DIR': str(tmp_path / 'cache')}):
+        first_path, first_counts = process_tenant(first_csv, 115, 20)
+        with patch('batch.load_csv') as mock_load_csv:
+            second_path, second_counts = process_tenant(second_csv, 115, 20)
+
+    mock_load_csv.assert_not_called()
+    assert second_path != first_path
+    assert second_counts.equals(first_counts)
@@ -2,15 +2,36 @@
 
 import pytest
 import pandas as pd
+import json
+import openpyxl
 import os
+import random
+import shutil
+import zipfile
 from csv_parser import (
     read_and_prepare_data,
     initialize_license_counts,
     process_licenses,
+    count_licenses,
+    merge_license_counts,
     create_license_counts_df,
     process_file,
-    generate_summary
+    save_to_excel,
+    max_text_length,
+    generate_summary,
+    build_summary,
+    load_summary,
+    summary_path,
+    read_license_counts,
+    consolidate_license_counts,
+    save_consolidated_excel,
+    add_cost_columns,
+    DETAIL_COLUMNS,
+    PROPERTY_COLUMNS
 )
+from create_app import app
+from utils.report_cache import ReportCache
+from utils.perf import perf_stats
 from unittest.mock import patch, MagicMock
 from .test_data_generator import generate_test_csv
 
@@ -29,7 +50,8 @@ def test_read_and_prepare_data(sample_csv):
     df = read_and_prepare_data(sample_csv)
     assert isinstance(df, pd.DataFrame)
     assert 'Office' in df.columns
-    assert df['Office'].str.strip().equals(df['Office'])
+    assert isinstance(df['Office'].dtype, pd.CategoricalDtype)
+    assert df['Office'].astype(object).str.strip().equals(df['Office'].astype(object))
     assert len(df) == 100
 
 
@@ -65,6 +87,245 @@ def test_process_licenses(sample_csv):
     assert sum(sum(office.values()) for office in result[0].values()) > 0  # Ensure some licenses were counted
 
 
+def test_count_licenses_matches_process_licenses(large_sample_csv):
+    df = read_and_prepare_data(large_sample_csv)
+    target_licenses = {
+        '365 Premium': ['Microsoft 365 Business Premium', 'E3'],
+        'Exchange': ['Exchange'],
+        'E5': ['E5'],
+        'Teams': ['Microsoft Teams Enterprise']
+    }
+    expected = process_licenses(df, target_licenses, initialize_license_counts(df, target_licenses))
+    result = count_licenses(df, target_licenses, initialize_license_counts(df, target_licenses))
+
+    assert result[0] == expected[0]
+    for rows, frame in zip(expected[1:], result[1:]):
+        assert frame.values.tolist() == rows
+
+
+def test_process_file_engines_write_identical_workbooks(tmp_path):
+    random.seed(1234)
+    rows_csv = generate_test_csv(tmp_path, num_rows=2000)
+    vectorized_csv = str(tmp_path / "vectorized.csv")
+    shutil.copy(rows_csv, vectorized_csv)
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(tmp_path)}):
+        rows_path, _ = process_file(rows_csv, engine='rows')
+        vectorized_path, _ = process_file(vectorized_csv)
+
+    with zipfile.ZipFile(rows_path) as rows_zip, zipfile.ZipFile(vectorized_path) as vectorized_zip:
+        assert rows_zip.namelist() == vectorized_zip.namelist()
+        for name in rows_zip.namelist():
+            if name == 'docProps/core.xml':  # Holds the creation timestamp
+                continue
+            assert rows_zip.read(name) == vectorized_zip.read(name), name
+
+
+def test_process_file_records_stage_timings(sample_csv, tmp_path):
+    perf_stats.reset()
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(tmp_path)}), patch('csv_parser.logger') as mock_logger:
+        assert process_file(sample_csv) is not None
+
+    stages = perf_stats.snapshot()
+    assert ['read', 'count', 'cost columns', 'excel write', 'summary'] == list(stages)
+    assert stages['read']['rows'] == 100
+    logged_spans = [call.kwargs['spans'] for call in mock_logger.info.call_args_list if 'spans' in call.kwargs]
+    assert [timing['name'] for timing in logged_spans[0]] == list(stages)
+
+
+def read_workbook(path):
+    workbook = openpyxl.load_workbook(path)
+    return {
+        sheet.title: (
+            [[cell.value for cell in row] for row in sheet.iter_rows()],
+            {key: dimension.width for key, dimension in sheet.column_dimensions.items()},
+            sheet.auto_filter.ref
+        )
+        for sheet in workbook.worksheets
+    }
+
+
+def test_process_file_streaming_writes_same_workbook(tmp_path):
+    random.seed(4321)
+    whole_csv = generate_test_csv(tmp_path, num_rows=2000)
+    streamed_csv = str(tmp_path / "streamed.csv")
+    shutil.copy(whole_csv, streamed_csv)
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(tmp_path)}):
+        whole_path, _ = process_file(whole_csv)
+        streamed_path, _ = process_file(streamed_csv, chunksize=300)
+
+    # Chunks are written row-block by row-block, so the shared string table is ordered differently;
+    # compare what the workbooks contain instead of their bytes
+    assert read_workbook(whole_path) == read_workbook(streamed_path)
+
+
+def test_merge_license_counts_keeps_unaccounted_last():
+    license_counts = {'Office1': {'E5': 1}, 'Unaccounted': {'E5': 2}}
+    merge_license_counts(license_counts, {'Office2': {'E5': 3}, 'Office1': {'E5': 1}, 'Unaccounted': {'E5': 1}})
+
+    assert list(license_counts) == ['Office1', 'Office2', 'Unaccounted']
+    assert license_counts == {'Office1': {'E5': 2}, 'Office2': {'E5': 3}, 'Unaccounted': {'E5': 3}}
+
+
+def test_process_file_leaves_only_the_finished_report(sample_csv, tmp_path):
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(output_dir)}):
+        result_path, _ = process_file(str(sample_csv))
+
+    assert sorted(os.listdir(output_dir)) == sorted([os.path.basename(result_path),
+                                                     os.path.basename(summary_path(result_path))])
+    assert zipfile.is_zipfile(result_path)
+
+
+def test_cached_summary_matches_workbook_summary(tmp_path):
+    random.seed(99)
+    csv_path = generate_test_csv(tmp_path, num_rows=1000)
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(tmp_path)}):
+        result_path, _ = process_file(csv_path, cost_per_user=110, cost_per_exchange=25)
+
+    summary = json.loads(json.dumps(generate_summary(result_path)))  # Tuples come back from JSON as lists
+    assert load_summary(result_path) == summary
+
+
+def test_read_license_counts_matches_written_counts(tmp_path):
+    random.seed(7)
+    csv_path = generate_test_csv(tmp_path, num_rows=500)
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(tmp_path)}):
+        result_path, _ = process_file(csv_path)
+
+    license_counts_df = read_license_counts(result_path)
+    assert license_counts_df.index[-1] == 'Total'
+    assert license_counts_df.iloc[:-1].sum().round(2).equals(license_counts_df.iloc[-1].round(2))
+    assert int(license_counts_df.iloc[-1]['365 Premium']) == generate_summary(result_path)['total_365_premium']
+
+
+def test_consolidate_license_counts(tmp_path):
+    first = create_license_counts_df({'Office1': {'365 Premium': 2, 'Exchange': 1}, 'Unaccounted': {'365 Premium': 1,
+                                                                                                   'Exchange': 0}})
+    second = create_license_counts_df({'Office1': {'365 Premium': 5, 'Exchange': 3}})
+
+    offices_df, tenants_df = consolidate_license_counts({'contoso': first, 'fabrikam': second})
+
+    assert list(offices_df.index) == [('contoso', 'Office1'), ('contoso', 'Unaccounted'), ('fabrikam', 'Office1'),
+                                      ('Total', '')]
+    assert offices_df.loc[('Total', ''), '365 Premium'] == 8
+    assert tenants_df.to_dict('index') == {'contoso': {'365 Premium': 3, 'Exchange': 1},
+                                           'fabrikam': {'365 Premium': 5, 'Exchange': 3},
+                                           'Total': {'365 Premium': 8, 'Exchange': 4}}
+
+    excel_path = tmp_path / 'consolidated.xlsx'
+    assert save_consolidated_excel(str(excel_path), offices_df, tenants_df)
+    workbook = openpyxl.load_workbook(excel_path)
+    assert workbook.sheetnames == ['Tenants', 'License Counts']
+    assert [cell.value for cell in workbook['License Counts'][1]] == ['Tenant', 'Office', '365 Premium', 'Exchange']
+    assert [cell.value for cell in workbook['Tenants'][4]] == ['Total', 8, 4]
+
+
+def test_process_file_serves_identical_upload_from_cache(tmp_path):
+    random.seed(5)
+    first_csv = generate_test_csv(tmp_path, num_rows=200)
+    second_csv = str(tmp_path / "again.csv")
+    shutil.copy(first_csv, second_csv)
+    third_csv = str(tmp_path / "other_costs.csv")
+    shutil.copy(first_csv, third_csv)
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    cache = ReportCache(str(tmp_path / "cache"))
+
+    with patch.dict(app.config, {'OUTPUT_FOLDER': str(output_dir)}):
+        first_path, _ = process_file(first_csv, cache=cache)
+        with patch('csv_parser.save_to_excel') as mock_save_to_excel:
+            second_path, friendly_filename = process_file(second_csv, cache=cache)
+        mock_save_to_excel.assert_not_called()
+        third_path, _ = process_file(third_csv, cost_per_user=100, cache=cache)
+
+    assert second_path != first_path
+    assert friendly_filename.startswith('AION_License_Report_')
+    assert not os.path.exists(second_csv)
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'hit_ratio': 0.3333}
+
+    assert load_summary(second_path) == load_summary(first_path)
+    assert read_workbook(second_path) == read_workbook(first_path)
+    assert read_workbook(third_path) != read_workbook(first_path)
+
+    # Downloading (and so deleting) a report leaves the cached copy for the next identical upload
+    os.remove(first_path)
+    assert zipfile.is_zipfile(second_path)
+    assert len(os.listdir(tmp_path / "cache")) == 4
+
+
+def test_build_summary():
+    # Office, 365 Premium, Exchange, E5, Teams, then the cost columns
+    data = [
+        ['Office1', 10, 5, 0, 0, 1150, 100, 0, 0, 1250],
+        ['Office2', 5, 10, 2, 0, 575, 200, 0, 0, 775],
+        ['Office3', 15, 0, 0, 0, 1725, 0, 0, 0, 1725],
+        ['Office4', 0, 0, 0, 3, 0, 0, 0, 12, 12],
+        ['Office5', 0, 0, 0, 0, 0, 200, 0, 0, 0],
+    ]
+    summary = build_summary(data)
+
+    assert summary['total_365_premium'] == 30
+    assert summary['total_exchange'] == 15
+    assert summary['total_cost'] == 500
+    assert summary['avg_cost_per_office'] == 100
+    assert summary['highest_cost'] == 200
+    assert summary['highest_cost_office'] == 'Office2'
+    assert summary['offices_with_e5'] == 1
+    assert summary['percent_both_licenses'] == 40
+    assert summary['percent_only_365'] == 20
+    assert summary['percent_only_teams'] == 20
+    assert summary['highest_exchange_ratio'] == 2
+    assert summary['highest_exchange_ratio_office'] == 'Office2'
+    assert summary['highest_teams_ratio_office'] == 'Office1'
+    assert summary['offices_no_licenses'] == 1
+    assert summary['avg_licenses_per_office'] == 10
+    assert [row[0] for row in summary['top_offices_by_license']] == ['Office2', 'Office1', 'Office3', 'Office4',
+                                                                     'Office5']
+    assert summary['top_offices_by_cost'][0] == ('Office2', 200)
+
+
+def test_build_summary_no_offices():
+    summary = build_summary([])
+
+    assert summary['total_cost'] == 0
+    assert summary['avg_cost_per_office'] == 0
+    assert summary['percent_with_e5'] == 0
+    assert summary['highest_cost_office'] is None
+    assert summary['top_offices_by_license'] == []
+
+
+def test_load_summary_without_cache(tmp_path):
+    assert load_summary(str(tmp_path / "old_report.xlsx")) is None
+
+
+def test_save_to_excel_failure_leaves_no_file(tmp_path):
+    license_counts_df = create_license_counts_df({'Office1': {'365 Premium': 2, 'Exchange': 1, 'E5': 0, 'Teams': 0}})
+    add_cost_columns(license_counts_df, 115, 20, 54.8, 4)
+    users = pd.DataFrame([['User 1', 'Microsoft 365 Business Premium', 'user1@example.com']],
+                         columns=DETAIL_COLUMNS)
+    properties = pd.DataFrame([['User 2', 'Exchange Online (Plan 1)', 'user2@example.com', 'Office1']],
+                              columns=PROPERTY_COLUMNS)
+    excel_path = tmp_path / "report.xlsx"
+    with patch('csv_parser.publish_file', side_effect=OSError("disk full")) as mock_publish_file:
+        saved = save_to_excel(str(excel_path), license_counts_df, users, users, properties, users, 115, 20, 54.8, 4)
+
+    assert not saved
+    mock_publish_file.assert_called_once()
+    assert os.listdir(tmp_path) == []
+
+
+def test_max_text_length():
+    assert max_text_length(pd.Series(['a', 'abc', None], dtype=object)) == 3
+    assert max_text_length(pd.Series(['ab', 'abcd'], dtype='category')) == 4
+    assert max_text_length(pd.Series([1, 12345])) == 5
+    assert max_text_length(pd.Series([1, 'ab', 2.5, None], dtype=object)) == 3
+    assert max_text_length(pd.Series([10, 2000], dtype='category')) == 4
+    assert max_text_length(pd.Series([], dtype=object)) == 0
+
+
 def test_create_license_counts_df():
     license_counts = {
         'Office1': {'365 Premium': 1, 'Exchange': 0},
@@ -20,28 +20,34 @@ last_names = ['Doe', 'Smith', 'Johnson', 'Williams', 'Brown', 'Miller', 'Garcia'
               'Taylor', 'Chen', 'White', 'Rodriguez', 'Martinez', 'Davis', 'Anderson', 'Thomas', 'Jackson', 'Martin']
 
 
-def generate_user():
+def office_names(num_offices):
+    # The two AION offices and blanks are kept so every sheet of the report has rows
+    return ['AION Management', 'AION Partners', '', ''] + [f"Office {i}" for i in range(num_offices)]
+
+
+def generate_user(office_choices=offices):
     first_name = random.choice(first_names)
     last_name = random.choice(last_names)
     display_name = f"{first_name} {last_name}"
     user_principal_name = f"{first_name.lower()}.{last_name.lower()}@aion.com"
-    office = random.choice(offices)
+    office = random.choice(office_choices)
     license_count = random.randint(1, 3)
     user_licenses = '+'.join(random.sample(licenses, license_count))
     return [display_name, user_principal_name, office, user_licenses]
 
 
-def generate_csv(filename, num_rows):
+def generate_csv(filename, num_rows, num_offices=None):
+    office_choices = office_names(num_offices) if num_offices else offices
     with open(filename, 'w', newline='') as csvfile:
         csvwriter = csv.writer(csvfile)
         csvwriter.writerow(['Display name', 'User principal name', 'Office', 'Licenses'])
 
         for _ in range(num_rows):
-            csvwriter.writerow(generate_user())
+            csvwriter.writerow(generate_user(office_choices))
 
     return filename
 
 
-def generate_test_csv(tmp_path, num_rows=100):
+def generate_test_csv(tmp_path, num_rows=100, num_offices=None):
     csv_file = tmp_path / "test_data.csv"
-    return generate_csv(str(csv_file), num_rows)
+    return generate_csv(str(csv_file), num_rows, num_offices)
@@ -0,0 +1,59 @@
+# tests/test_firebase_config.py
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import firebase_config
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    monkeypatch.setattr(firebase_config, '_client', None)
+    monkeypatch.setattr(firebase_config, '_client_pid', None)
+    monkeypatch.setattr(firebase_config, '_stats', dict(firebase_config._stats, clients_created=0, calls=0,
+                                                        errors=0, total_seconds=0.0))
+    monkeypatch.setattr(firebase_config, '_operations', {})
+    firebase_app = MagicMock(project_id='aion-test')
+    # Like firebase_admin, firestore.client() returns the one client cached on the app
+    with patch.object(firebase_config.firebase_admin, '_apps', {'[DEFAULT]': firebase_app}), \
+            patch.object(firebase_config.firebase_admin, 'get_app', return_value=firebase_app), \
+            patch.object(firebase_config.firestore, 'client', return_value=MagicMock()), \
+            patch.object(firebase_config.firestore, 'Client', side_effect=lambda **kwargs: MagicMock()) as client:
+        yield client
+
+
+def test_client_is_created_once_per_process(fresh_client):
+    client = firebase_config.initialize_firestore()
+    assert firebase_config.initialize_firestore() is client
+    assert fresh_client.call_count == 1
+    assert fresh_client.call_args.kwargs['project'] == 'aion-test'
+
+    # A forked worker gets a client of its own, not the one cached on the Firebase app
+    with patch.object(firebase_config.os, 'getpid', return_value=-1):
+        forked_client = firebase_config.initialize_firestore()
+    assert forked_client is not client
+    assert forked_client is not firebase_config.firestore.client()
+    assert fresh_client.call_count == 2
+    assert firebase_config.get_firestore_stats()['clients_created'] == 2
+
+
+def test_firestore_call_counts_calls_and_errors():
+    with firebase_config.firestore_call('get_metrics'):
+        pass
+    with pytest.raises(RuntimeError):
+        with firebase_config.firestore_call('get_metrics'):
+            raise RuntimeError('unavailable')
+
+    stats = firebase_config.get_firestore_stats()
+    assert stats['calls'] == 2
+    assert stats['errors'] == 1
+    assert stats['operations'] == {'get_metrics': {'calls': 2, 'errors': 1}}
+
+
+def test_check_firestore():
+    assert firebase_config.check_firestore()['healthy'] is True
+
+    firebase_config.initialize_firestore().collection.side_effect = RuntimeError('unavailable')
+    probe = firebase_config.check_firestore()
+    assert probe == {'healthy': False, 'error': 'unavailable'}
+    assert firebase_config.get_firestore_stats()['errors'] == 1
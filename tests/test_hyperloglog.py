@@ -0,0 +1,54 @@
+# tests/test_hyperloglog.py
+import pytest
+
+from utils.hyperloglog import HyperLogLog
+
+
+def test_small_sets_are_exact():
+    sketch = HyperLogLog()
+    sketch.update(['10.0.0.1', '10.0.0.2', '10.0.0.1'])
+    assert sketch.is_exact
+    assert sketch.count() == 2
+
+
+@pytest.mark.parametrize('size', [1000, 50000])
+def test_large_sets_are_estimated(size):
+    sketch = HyperLogLog()
+    sketch.update(str(i) for i in range(size))
+    assert not sketch.is_exact
+    assert sketch.count() == pytest.approx(size, rel=0.05)
+    assert len(sketch.to_bytes()) == 2 + 4096
+
+
+def test_merge():
+    first, second = HyperLogLog(), HyperLogLog()
+    first.update(str(i) for i in range(0, 3000))
+    second.update(str(i) for i in range(2000, 2100))
+    second.merge(first)
+    assert second.count() == pytest.approx(3000, rel=0.05)
+
+    exact = HyperLogLog()
+    exact.update(['a', 'b'])
+    other = HyperLogLog()
+    other.update(['b', 'c'])
+    exact.merge(other)
+    assert exact.count() == 3
+
+    with pytest.raises(ValueError):
+        exact.merge(HyperLogLog(precision=10))
+
+
+@pytest.mark.parametrize('size', [0, 10, 5000])
+def test_round_trip(size):
+    sketch = HyperLogLog()
+    sketch.update(str(i) for i in range(size))
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.count() == sketch.count()
+    assert restored.is_exact == sketch.is_exact
+
+
+def test_invalid_data():
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(b'\x01')
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(b'\x01\x0c' + b'\x00' * 10)
@@ -0,0 +1,63 @@
+# tests/test_jobs.py
+
+import threading
+import time
+
+import pytest
+from jobs import JobQueue, QueueFullError
+
+
+def wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.status in ('queued', 'running') and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_job_runs_and_stores_result():
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(lambda a, b: a + b, 1, b=2)
+    wait_for(job)
+
+    assert job.status == 'done'
+    assert job.result == 3
+    assert queue.get(job.id) is job
+    assert queue.depth() == 0
+    queue.shutdown()
+
+
+def test_failed_job_keeps_error():
+    def fail():
+        raise ValueError("Missing columns: Office")
+
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(fail)
+    wait_for(job)
+
+    assert job.status == 'failed'
+    assert job.to_dict()['error'] == "Missing columns: Office"
+    queue.shutdown()
+
+
+def test_submit_rejects_when_queue_is_full():
+    release = threading.Event()
+    queue = JobQueue(max_workers=1, max_depth=2)
+    queue.submit(release.wait)
+    queue.submit(release.wait)
+
+    with pytest.raises(QueueFullError):
+        queue.submit(release.wait)
+
+    release.set()
+    queue.shutdown()
+    assert queue.depth() == 0
+
+
+def test_finished_jobs_expire():
+    queue = JobQueue(max_workers=1, ttl=0)
+    job = queue.submit(lambda: None)
+    wait_for(job)
+    time.sleep(0.01)
+    queue.submit(lambda: None)
+
+    assert queue.get(job.id) is None
+    queue.shutdown()
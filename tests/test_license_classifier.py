@@ -0,0 +1,41 @@
+# tests/test_license_classifier.py
+
+from license_classifier import LicenseClassifier, TARGET_LICENSES
+
+
+def test_classify_matches_categories():
+    classifier = LicenseClassifier()
+    assert classifier.classify('Microsoft 365 E3') == ('365 Premium',)
+    assert classifier.classify('Exchange Online (Plan 1)') == ('Exchange',)
+    assert classifier.classify('Microsoft 365 E5') == ('E5',)
+    assert classifier.classify(' Microsoft Teams Enterprise ') == ('Teams',)
+    assert classifier.classify('Power BI Pro') == ()
+
+
+def test_classify_caches_results():
+    classifier = LicenseClassifier()
+    for _ in range(3):
+        classifier.classify('Microsoft 365 E3')
+    classifier.classify('Power BI Pro')
+
+    stats = classifier.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+
+    classifier.clear()
+    assert classifier.stats()['size'] == 0
+
+
+def test_cache_is_bounded():
+    classifier = LicenseClassifier(maxsize=2)
+    for license_name in ['A', 'B', 'C', 'D']:
+        classifier.classify(license_name)
+    assert classifier.stats()['size'] == 2
+
+
+def test_custom_target_licenses():
+    classifier = LicenseClassifier({'Exchange': ['Exchange']})
+    assert classifier.target_licenses == {'Exchange': ['Exchange']}
+    assert classifier.classify('Microsoft 365 E3') == ()
+    assert LicenseClassifier().target_licenses == TARGET_LICENSES
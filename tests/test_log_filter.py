@@ -0,0 +1,86 @@
+# tests/test_log_filter.py
+import json
+
+import pytest
+
+from utils.log_filter import compile_log_filter
+from utils.log_store import parse_log_line, parse_timestamp
+
+
+def log_line(event, second, level='info', **fields):
+    message = dict(event=event, level=level, timestamp=f'2023-01-01T00:00:{second:02d}.000000Z', **fields)
+    return json.dumps({"timestamp": f"2023-01-01 00:00:{second:02d},000", "level": level.upper(),
+                       "name": "app", "message": json.dumps(message)}).encode()
+
+
+LINES = [
+    log_line('upload started', 1, ip='10.0.0.1', path='/upload', method='POST', user_agent='Mozilla/5.0'),
+    log_line('metrics polled', 2, ip='10.0.0.2', path='/api/metrics', method='GET', user_agent='curl/8.0'),
+    log_line('Report "Q3" saved', 3, ip='10.0.0.1', path='/download/abc', method='GET'),
+    log_line('Café closed', 4, level='error'),
+    log_line('no fields', 5, level='warning'),
+    b'plain failure text',
+]
+
+
+def reference_match(log, filters):
+    # The per-record filter /api/logs used before it was compiled
+    timestamp = parse_timestamp(log.get('timestamp', ''))
+    return (not filters.get('level') or log.get('level', '').lower() == filters['level']) and \
+        (not filters.get('start_date') or timestamp >= parse_timestamp(filters['start_date'])) and \
+        (not filters.get('end_date') or timestamp <= parse_timestamp(filters['end_date'])) and \
+        (not filters.get('http_method') or log.get('method', '').upper() == filters['http_method']) and \
+        (not filters.get('ip_address') or log.get('ip', '') == filters['ip_address']) and \
+        (not filters.get('path') or filters['path'] in log.get('path', '')) and \
+        (not filters.get('user_agent') or filters['user_agent'] in log.get('user_agent', '')) and \
+        (not filters.get('exclude_api') or not log.get('path', '').startswith('/api/')) and \
+        (not filters.get('search') or filters['search'] in json.dumps(log).lower())
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'level': 'error'},
+    {'http_method': 'GET'},
+    {'ip_address': '10.0.0.1'},
+    {'path': '/up'},
+    {'user_agent': 'curl'},
+    {'exclude_api': True},
+    {'start_date': '2023-01-01T00:00:02', 'end_date': '2023-01-01T00:00:04Z'},
+    {'search': 'polled'},
+    {'search': '"q3"'},
+    {'search': 'café'},
+    {'search': 'failure'},
+    {'search': 'message'},
+    {'level': 'info', 'http_method': 'GET', 'search': 'report', 'ip_address': '10.0.0.1'},
+])
+def test_compiled_filter_matches_reference(filters):
+    match = compile_log_filter(filters)
+    expected = [parse_log_line(line.decode()) for line in LINES[:-1]
+                if reference_match(parse_log_line(line.decode()), filters)]
+    actual = [log for log in map(match, LINES[:-1]) if log is not None]
+    assert actual == expected
+
+
+@pytest.mark.parametrize('search', [': 200', ' 200', 'finished", "status": 200', 'status'])
+def test_compiled_filter_searches_compact_lines_like_the_record_text(search):
+    # Log lines are written without spaces after the separators, unlike the record text that is searched
+    message = json.dumps({'event': 'request finished', 'status': 200, 'timestamp': '2023-01-01T00:00:06.000000Z'},
+                         separators=(',', ':'))
+    line = json.dumps({'timestamp': '2023-01-01 00:00:06,000', 'level': 'INFO', 'name': 'app', 'message': message},
+                      separators=(',', ':')).encode()
+    assert reference_match(parse_log_line(line.decode()), {'search': search})
+    assert compile_log_filter({'search': search})(line)['status'] == 200
+
+
+def test_compiled_filter_reports_invalid_lines():
+    assert compile_log_filter({'search': 'plain'})(LINES[-1])['level'] == 'ERROR'
+    assert compile_log_filter({'level': 'error'})(LINES[-1])['event'] == 'plain failure text'
+    assert compile_log_filter({'level': 'info'})(LINES[-1]) is None
+
+
+def test_compiled_filter_skips_lines_before_decoding(monkeypatch):
+    parsed = []
+    monkeypatch.setattr('utils.log_filter.parse_log_line', lambda line: parsed.append(line) or json.loads(line))
+    match = compile_log_filter({'search': 'polled'})
+    assert [log for log in map(match, LINES[:3]) if log is not None][0]['name'] == 'app'
+    assert len(parsed) == 1
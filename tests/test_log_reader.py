@@ -0,0 +1,62 @@
+# tests/test_log_reader.py
+import io
+import json
+import os
+
+import pytest
+
+from utils.log_reader import LogCursor, iter_log_records, reverse_lines
+
+
+def log_line(event, second):
+    message = {"event": event, "level": "info", "timestamp": f"2023-01-01T00:00:{second:02d}.000000Z"}
+    return json.dumps({"timestamp": f"2023-01-01 00:00:{second:02d},000", "level": "INFO",
+                       "message": json.dumps(message)}) + '\n'
+
+
+@pytest.mark.parametrize('block_size', [1, 3, 7, 64, 4096])
+def test_reverse_lines(block_size):
+    data = b'first\n\nsecond line\nthird\npartial'
+    lines = list(reverse_lines(io.BytesIO(data), len(data), block_size))
+    assert lines == [(19, b'third'), (7, b'second line'), (0, b'first')]
+
+    # Reading from a line start resumes just before that line
+    assert list(reverse_lines(io.BytesIO(data), 7, block_size)) == [(0, b'first')]
+
+
+def test_iter_log_records_across_rotated_files(tmp_path):
+    (tmp_path / 'app.log.2').write_text(log_line('oldest', 1))
+    (tmp_path / 'app.log.1').write_text(log_line('older', 2) + log_line('old', 3))
+    (tmp_path / 'app.log').write_text(log_line('new', 4) + log_line('newest', 5))
+
+    events = [record['event'] for _, record in iter_log_records(str(tmp_path), block_size=16)]
+    assert events == ['newest', 'new', 'old', 'older', 'oldest']
+
+
+def test_iter_log_records_resumes_from_cursor(tmp_path):
+    (tmp_path / 'app.log.1').write_text(log_line('older', 1))
+    (tmp_path / 'app.log').write_text(log_line('new', 2) + log_line('newest', 3))
+
+    records = iter_log_records(str(tmp_path))
+    next(records)
+    cursor, record = next(records)
+    assert record['event'] == 'new'
+    assert cursor.offset == 0
+    assert cursor.timestamp == '2023-01-01T00:00:02.000000+00:00'
+
+    cursor = LogCursor.parse(str(cursor))
+    assert [record['event'] for _, record in iter_log_records(str(tmp_path), cursor)] == ['older']
+
+
+def test_iter_log_records_cursor_after_rotation(tmp_path):
+    (tmp_path / 'app.log').write_text(log_line('old', 1) + log_line('new', 2))
+    cursor = next(iter_log_records(str(tmp_path)))[0]
+
+    # Rotation moves the cursor's file to app.log.1, which is still found by inode
+    os.rename(tmp_path / 'app.log', tmp_path / 'app.log.1')
+    (tmp_path / 'app.log').write_text(log_line('newer', 3))
+    assert [record['event'] for _, record in iter_log_records(str(tmp_path), cursor)] == ['old']
+
+    # Once the file is gone, records older than the cursor's timestamp are returned
+    cursor = LogCursor(0, 0, cursor.timestamp)
+    assert [record['event'] for _, record in iter_log_records(str(tmp_path), cursor)] == ['old']
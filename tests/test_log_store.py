@@ -0,0 +1,142 @@
+# tests/test_log_store.py
+import json
+import os
+
+from utils.log_store import LogStore, parse_log_line, parse_timestamp
+
+
+def log_line(event, second, **fields):
+    message = dict(event=event, level='info', timestamp=f'2023-01-01T00:00:{second:02d}.000000Z', **fields)
+    return json.dumps({"timestamp": f"2023-01-01 00:00:{second:02d},000", "level": "INFO", "name": "app",
+                       "message": json.dumps(message)}) + '\n'
+
+
+def test_parse_log_line_merges_event_fields():
+    record = parse_log_line(log_line('hello', 5, ip='10.0.0.1', path='/upload'))
+    assert record['event'] == 'hello'
+    assert record['ip'] == '10.0.0.1'
+    assert record['path'] == '/upload'
+    assert record['name'] == 'app'
+    assert 'message' not in record
+
+
+def test_parse_log_line_invalid_json():
+    record = parse_log_line('not json')
+    assert record['level'] == 'ERROR'
+    assert record['event'] == 'not json'
+
+
+def test_parse_timestamp_formats():
+    assert parse_timestamp('2023-01-01T00:00:05.000000Z') == parse_timestamp('2023-01-01 00:00:05,000')
+    assert parse_timestamp('2023-01-01T02:00:05.000000+02:00') == parse_timestamp('2023-01-01T00:00:05')
+    assert parse_timestamp('garbage').year == 1
+
+
+def test_ingest_is_incremental(tmp_path):
+    log_file = tmp_path / 'app.log'
+    log_file.write_text(log_line('first', 1) + log_line('second', 2))
+    store = LogStore(str(tmp_path))
+
+    assert store.ingest() == 2
+    assert store.ingest() == 0
+
+    with open(log_file, 'a') as f:
+        f.write(log_line('third', 3))
+        f.write(log_line('partial', 4)[:20])
+    assert store.ingest() == 1
+
+    logs, total = store.query({})
+    assert total == 3
+    assert [log['event'] for log in logs] == ['third', 'second', 'first']
+
+
+def test_ingest_follows_rotation(tmp_path):
+    log_file = tmp_path / 'app.log'
+    log_file.write_text(log_line('first', 1))
+    store = LogStore(str(tmp_path))
+    store.ingest()
+
+    # Lines written just before the handler rotated are still picked up from app.log.1
+    with open(log_file, 'a') as f:
+        f.write(log_line('second', 2))
+    os.rename(log_file, tmp_path / 'app.log.1')
+    log_file.write_text(log_line('third', 3))
+
+    assert store.ingest() == 2
+    logs, total = store.query({})
+    assert [log['event'] for log in logs] == ['third', 'second', 'first']
+
+
+def rotate(tmp_path, first_line):
+    # As the RotatingFileHandler does with backupCount=2
+    if (tmp_path / 'app.log.1').exists():
+        os.replace(tmp_path / 'app.log.1', tmp_path / 'app.log.2')
+    os.rename(tmp_path / 'app.log', tmp_path / 'app.log.1')
+    (tmp_path / 'app.log').write_text(first_line)
+
+
+def test_ingest_follows_two_rotations_between_calls(tmp_path):
+    log_file = tmp_path / 'app.log'
+    log_file.write_text(log_line('first', 1))
+    store = LogStore(str(tmp_path))
+    store.ingest()
+
+    with open(log_file, 'a') as f:
+        f.write(log_line('second', 2))
+    rotate(tmp_path, log_line('third', 3))
+    rotate(tmp_path, log_line('fourth', 4))
+
+    # The previous file is now app.log.2, and app.log.1 has not been read at all
+    assert store.ingest() == 3
+    logs, total = store.query({})
+    assert [log['event'] for log in logs] == ['fourth', 'third', 'second', 'first']
+
+
+def test_ingest_prunes_records_of_rotated_out_files(tmp_path):
+    (tmp_path / 'app.log').write_text(log_line('first', 1) + log_line('second', 2))
+    store = LogStore(str(tmp_path))
+    store.ingest()
+    rotate(tmp_path, log_line('third', 3))
+    rotate(tmp_path, log_line('fourth', 4))
+    store.ingest()
+    assert store.query({})[1] == 4
+
+    # The next rotation drops the file holding 'first' and 'second', and the index drops their records
+    rotate(tmp_path, log_line('fifth', 5))
+    store.ingest()
+
+    logs, total = store.query({})
+    assert [log['event'] for log in logs] == ['fifth', 'fourth', 'third']
+    assert store.query({'search': 'second'})[1] == 0
+
+
+def test_first_ingest_backfills_rotated_files(tmp_path):
+    (tmp_path / 'app.log.2').write_text(log_line('oldest', 1))
+    (tmp_path / 'app.log.1').write_text(log_line('older', 2))
+    (tmp_path / 'app.log').write_text(log_line('newest', 3))
+
+    logs, total = LogStore(str(tmp_path)).query({})
+    assert [log['event'] for log in logs] == ['newest', 'older', 'oldest']
+
+
+def test_query_filters(tmp_path):
+    (tmp_path / 'app.log').write_text(
+        log_line('upload started', 1, ip='10.0.0.1', path='/upload', method='POST') +
+        log_line('metrics polled', 2, ip='10.0.0.2', path='/api/metrics', method='GET') +
+        log_line('report downloaded', 3, ip='10.0.0.1', path='/download/abc', method='GET'))
+    store = LogStore(str(tmp_path))
+
+    def events(**filters):
+        return [log['event'] for log in store.query(filters)[0]]
+
+    assert events(ip_address='10.0.0.1') == ['report downloaded', 'upload started']
+    assert events(http_method='get') == ['report downloaded', 'metrics polled']
+    assert events(exclude_api=True) == ['report downloaded', 'upload started']
+    assert events(path='/download') == ['report downloaded']
+    assert events(search='METRICS') == ['metrics polled']
+    assert events(search='up') == ['upload started']
+    assert events(start_date='2023-01-01T00:00:02', end_date='2023-01-01T00:00:02') == ['metrics polled']
+
+    logs, total = store.query({'level': 'info'}, page=2, per_page=2)
+    assert total == 3
+    assert [log['event'] for log in logs] == ['upload started']
@@ -0,0 +1,82 @@
+# tests/test_logger.py
+import logging
+import threading
+
+import pytest
+
+from create_app import app
+from utils.logger import BoundedQueueHandler, RequestSamplingFilter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def emit(self, record):
+        self.gate.wait()
+        self.records.append(record)
+
+
+def make_record(message, level=logging.INFO, args=None):
+    return logging.LogRecord('test', level, __file__, 0, message, args, None)
+
+
+def test_queue_handler_writes_records_on_listener_thread():
+    target = ListHandler()
+    handler = BoundedQueueHandler([target], maxsize=10)
+    handler.handle(make_record('Processed %s rows', args=(5,)))
+    handler.stop()
+
+    assert [record.msg for record in target.records] == ['Processed 5 rows']
+
+    # After stopping, records are written right away
+    handler.handle(make_record('shutting down'))
+    assert target.records[-1].msg == 'shutting down'
+
+
+def test_queue_handler_drops_info_records_when_full_and_reports_it():
+    target = ListHandler()
+    target.gate.clear()
+    handler = BoundedQueueHandler([target], maxsize=2)
+    try:
+        handler.handle(make_record('first'))
+        while handler.queue.qsize():  # Wait for the listener to hold the first record
+            pass
+        for i in range(5):
+            handler.handle(make_record(f'record {i}'))
+        assert handler.dropped == 3
+
+        # Records of WARNING and above wait for space instead
+        writer = threading.Thread(target=handler.handle, args=(make_record('disk low', logging.WARNING),))
+        writer.start()
+        target.gate.set()
+        writer.join(timeout=5)
+    finally:
+        target.gate.set()
+        handler.stop()
+
+    messages = [record.msg for record in target.records]
+    assert messages[:3] == ['first', 'record 0', 'record 1']
+    assert 'disk low' in messages
+    assert 'Dropped 3 log records because the log queue was full' in messages
+
+
+def test_queue_handler_rejects_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        BoundedQueueHandler([], overflow='grow')
+
+
+def test_sampling_filter_keeps_both_lines_of_a_request_or_neither():
+    sampling = RequestSamplingFilter({'INFO': 0.5})
+    kept = []
+    for _ in range(200):
+        with app.test_request_context('/health'):
+            kept.append((sampling.filter(make_record('start')), sampling.filter(make_record('end'))))
+
+    assert all(start == end for start, end in kept)
+    assert 0 < sum(start for start, _ in kept) < 200
+    # Levels without a rate are always kept
+    assert sampling.filter(make_record('failed', logging.ERROR))
@@ -0,0 +1,132 @@
+# tests/test_metrics.py
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+import metrics
+from metrics import MetricsPipeline, SQLiteMetricsBackend, sketch_windows
+
+
+class RecordingBackend:
+    def __init__(self, fail=False):
+        self.writes = []
+        self.fail = fail
+
+    def add(self, unique_users, reports_generated):
+        if self.fail:
+            raise RuntimeError('unavailable')
+        self.writes.append((unique_users, reports_generated))
+
+
+def test_flush_coalesces_events():
+    backend = RecordingBackend()
+    pipeline = MetricsPipeline(backend, flush_interval=60)
+    for ip_address in ['10.0.0.1', '10.0.0.2', '10.0.0.1']:
+        pipeline.record_unique_user(ip_address)
+        pipeline.record_report()
+
+    assert pipeline.flush() == 6
+    assert backend.writes == [({'10.0.0.1', '10.0.0.2'}, 3)]
+    assert pipeline.flush() == 0
+    pipeline.shutdown()
+
+
+def test_flush_on_batch_size():
+    backend = RecordingBackend()
+    pipeline = MetricsPipeline(backend, batch_size=3, flush_interval=60)
+    for _ in range(3):
+        pipeline.record_report()
+    pipeline._thread.join(0.5)  # The flusher wakes up as soon as the batch is full
+    assert backend.writes == [(set(), 3)]
+    pipeline.shutdown()
+
+
+def test_failed_flush_keeps_events():
+    backend = RecordingBackend(fail=True)
+    pipeline = MetricsPipeline(backend, flush_interval=60)
+    pipeline.record_unique_user('10.0.0.1')
+    pipeline.record_report()
+    with pytest.raises(RuntimeError):
+        pipeline.flush()
+
+    backend.fail = False
+    pipeline.shutdown()
+    assert backend.writes == [({'10.0.0.1'}, 1)]
+
+
+def test_sqlite_backend(tmp_path):
+    pipeline = MetricsPipeline(SQLiteMetricsBackend(str(tmp_path / 'metrics.db')), flush_interval=60)
+    pipeline.record_unique_user('10.0.0.1')
+    pipeline.record_report()
+    pipeline.flush()
+    pipeline.record_unique_user('10.0.0.1')
+    pipeline.record_unique_user('10.0.0.2')
+    pipeline.record_report()
+    pipeline.shutdown()
+    assert pipeline.backend.get() == {'unique_users': 2, 'unique_users_today': 2, 'unique_users_this_week': 2,
+                                      'reports_generated': 2}
+
+    pipeline.record_report()
+    pipeline.reset()
+    assert pipeline.backend.get() == {'unique_users': 0, 'unique_users_today': 0, 'unique_users_this_week': 0,
+                                      'reports_generated': 0}
+    pipeline.shutdown()
+
+
+def test_configure_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'pipeline', MetricsPipeline(RecordingBackend()))
+    pipeline = metrics.configure_metrics('sqlite', str(tmp_path / 'metrics.db'), flush_interval=60)
+    metrics.increment_unique_users('10.0.0.1')
+    metrics.increment_reports_generated()
+    pipeline.flush()
+    assert metrics.get_metrics()['unique_users'] == 1
+    assert metrics.get_metrics()['reports_generated'] == 1
+    pipeline.shutdown()
+
+    with pytest.raises(ValueError):
+        metrics.configure_metrics('redis')
+
+
+def test_sketch_windows():
+    assert sketch_windows(datetime(2024, 12, 30, tzinfo=timezone.utc)) == {
+        'all': 'all', 'today': 'day-2024-12-30', 'this_week': 'week-2025-W01'}
+
+
+def test_sqlite_backend_windows(tmp_path):
+    backend = SQLiteMetricsBackend(str(tmp_path / 'metrics.db'))
+    monday = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    tuesday = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    with patch('metrics.sketch_windows', return_value=sketch_windows(monday)):
+        backend.add({'10.0.0.1', '10.0.0.2'}, 0)
+    with patch('metrics.sketch_windows', return_value=sketch_windows(tuesday)):
+        backend.add({'10.0.0.2', '10.0.0.3'}, 0)
+        assert backend.get() == {'unique_users': 3, 'unique_users_today': 2, 'unique_users_this_week': 3,
+                                 'reports_generated': 0}
+
+
+def test_sqlite_backend_stays_small(tmp_path):
+    backend = SQLiteMetricsBackend(str(tmp_path / 'metrics.db'))
+    for start in range(0, 20000, 5000):
+        backend.add({f'10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(start, start + 5000)}, 0)
+
+    assert backend.get()['unique_users'] == pytest.approx(20000, rel=0.05)
+    assert (tmp_path / 'metrics.db').stat().st_size < 64 * 1024
+
+
+def test_get_metrics_is_cached_until_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'pipeline', MetricsPipeline(RecordingBackend()))
+    pipeline = metrics.configure_metrics('sqlite', str(tmp_path / 'metrics.db'), flush_interval=60, cache_ttl=60)
+    with patch.object(pipeline.backend, 'get', wraps=pipeline.backend.get) as backend_get:
+        assert metrics.get_metrics()['reports_generated'] == 0
+        metrics.increment_reports_generated()
+        assert metrics.get_metrics()['reports_generated'] == 0
+        assert backend_get.call_count == 1
+
+        pipeline.flush()
+        assert metrics.get_metrics()['reports_generated'] == 1
+        metrics.reset_metrics()
+        assert metrics.get_metrics()['reports_generated'] == 0
+        assert backend_get.call_count == 3
+    pipeline.shutdown()
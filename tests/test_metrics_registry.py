@@ -0,0 +1,83 @@
+# tests/test_metrics_registry.py
+import multiprocessing
+
+import pytest
+
+from utils.metrics_registry import MetricsRegistry, ValueFile
+
+
+def make_registry(directory=None):
+    registry = MetricsRegistry(directory)
+    uploads = registry.counter('uploads', 'Uploads.', ('status',))
+    depth = registry.gauge('depth', 'Queue depth.')
+    latency = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    return registry, uploads, depth, latency
+
+
+def record(directory):
+    _, uploads, depth, latency = make_registry(directory)
+    uploads.inc(2, status='ok')
+    depth.set(5)
+    latency.observe(0.5)
+
+
+def test_value_file_reopens_and_grows(tmp_path):
+    path = str(tmp_path / '1.db')
+    values = ValueFile(path)
+    for i in range(5000):
+        values.add(f'key-{i}', i)
+    values.set('key-0', 1.5)
+    values.close()
+
+    values = ValueFile(path)
+    values.add('key-4999', 1)
+    assert values.items()['key-4999'] == 5000
+    assert values.items()['key-0'] == 1.5
+    assert len(values.items()) == 5000
+
+
+def test_exposition_format():
+    registry, uploads, depth, latency = make_registry()
+    uploads.inc(status='ok')
+    uploads.inc(status='invalid "file"')
+    depth.set(3)
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    text = registry.expose()
+    assert '# TYPE uploads_total counter\nuploads_total{status="invalid \\"file\\""} 1\nuploads_total{status="ok"} 1\n' in text
+    assert 'depth 3\n' in text
+    assert ('latency_seconds_bucket{le="0.1"} 1\nlatency_seconds_bucket{le="1"} 2\n'
+            'latency_seconds_bucket{le="+Inf"} 3\nlatency_seconds_sum 5.55\nlatency_seconds_count 3\n') in text
+
+
+def test_labels_must_match():
+    _, uploads, _, _ = make_registry()
+    with pytest.raises(ValueError):
+        uploads.inc(state='ok')
+    with pytest.raises(ValueError):
+        uploads.inc(-1, status='ok')
+
+
+def test_values_are_aggregated_across_processes(tmp_path):
+    directory = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    for _ in range(2):
+        process = context.Process(target=record, args=(directory,))
+        process.start()
+        process.join()
+
+    registry, uploads, depth, latency = make_registry(directory)
+    uploads.inc(status='ok')
+    depth.set(1)
+    hits = registry.counter('hits', 'Hits.')
+    misses = registry.counter('misses', 'Misses.')
+    registry.hit_ratio('hit_ratio', 'Hit ratio.', hits, misses)
+    registry.add_collector(lambda: (hits.set_total(3), misses.set_total(1)))
+
+    text = registry.expose()
+    assert 'uploads_total{status="ok"} 5\n' in text
+    assert 'latency_seconds_count 2\n' in text
+    # Gauges of the exited processes no longer count
+    assert 'depth 1\n' in text
+    assert 'hit_ratio 0.75\n' in text
@@ -0,0 +1,45 @@
+# tests/test_perf.py
+import pytest
+
+from utils.perf import PerfStats, Span, Trace, percentiles, perf_stats, span
+
+
+def make_span(name, seconds, rows=None):
+    timing = Span(name, rows)
+    timing.wall_seconds = timing.cpu_seconds = seconds
+    return timing
+
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentiles(values) == {'p50': 50.0, 'p95': 95.0, 'p99': 99.0}
+    assert percentiles([0.001]) == {'p50': 1.0, 'p95': 1.0, 'p99': 1.0}
+    assert percentiles([]) == {'p50': None, 'p95': None, 'p99': None}
+
+
+def test_perf_stats_keeps_a_rolling_window():
+    stats = PerfStats(window=3)
+    for seconds in (10, 0.001, 0.002, 0.003):
+        stats.record(make_span('read', seconds, rows=5))
+
+    snapshot = stats.snapshot()['read']
+    assert snapshot['count'] == 4
+    assert snapshot['rows'] == 20
+    assert snapshot['wall_ms'] == {'p50': 2.0, 'p95': 3.0, 'p99': 3.0}
+
+
+def test_trace_collects_spans_and_records_them():
+    perf_stats.reset()
+    spans = Trace()
+    with spans.span('read') as current:
+        current.rows = 7
+    with pytest.raises(ValueError):
+        with spans.span('count'):
+            raise ValueError("failed")
+    with span('untraced'):
+        pass
+
+    assert [timing['name'] for timing in spans.to_list()] == ['read', 'count']
+    assert spans.to_list()[0]['rows'] == 7
+    assert spans.to_list()[0]['wall_ms'] >= 0
+    assert set(perf_stats.snapshot()) == {'read', 'count', 'untraced'}
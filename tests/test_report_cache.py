@@ -0,0 +1,58 @@
+# tests/test_report_cache.py
+import os
+import time
+
+from utils.report_cache import ReportCache, hash_file, report_key
+
+
+def make_report(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return str(path)
+
+
+def test_report_key_depends_on_content_and_costs(tmp_path):
+    first = make_report(tmp_path / 'a.csv', 10)
+    second = make_report(tmp_path / 'b.csv', 10)
+    assert hash_file(first) == hash_file(second)
+    assert report_key(hash_file(first), cost_per_user=115) == report_key(hash_file(second), cost_per_user=115)
+    assert report_key(hash_file(first), cost_per_user=115) != report_key(hash_file(first), cost_per_user=110)
+
+
+def test_get_copies_the_cached_report(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'))
+    report = make_report(tmp_path / 'report.xlsx', 100)
+    make_report(tmp_path / 'report.summary.json', 10)
+    cache.put('key', report, str(tmp_path / 'report.summary.json'))
+
+    assert not cache.get('missing', str(tmp_path / 'copy.xlsx'), str(tmp_path / 'copy.summary.json'))
+    assert cache.get('key', str(tmp_path / 'copy.xlsx'), str(tmp_path / 'copy.summary.json'))
+    os.remove(tmp_path / 'copy.xlsx')
+    assert cache.get('key', str(tmp_path / 'again.xlsx'), str(tmp_path / 'again.summary.json'))
+    assert os.path.getsize(tmp_path / 'again.xlsx') == 100
+    assert os.path.exists(tmp_path / 'again.summary.json')
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), max_age=60)
+    cache.put('key', make_report(tmp_path / 'report.xlsx', 10), str(tmp_path / 'none.json'))
+    old = time.time() - 120
+    os.utime(tmp_path / 'cache' / 'key.xlsx', (old, old))
+
+    assert not cache.get('key', str(tmp_path / 'copy.xlsx'), str(tmp_path / 'copy.summary.json'))
+    assert cache.evict() == 1
+    assert os.listdir(tmp_path / 'cache') == []
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), max_bytes=250)
+    now = time.time()
+    for i, key in enumerate(['old', 'used', 'new']):
+        cache.put(key, make_report(tmp_path / f'{key}.xlsx', 100), str(tmp_path / 'none.json'))
+        os.utime(tmp_path / 'cache' / f'{key}.xlsx', (now - 100 + i, now - 100 + i))
+    cache.get('used', str(tmp_path / 'copy.xlsx'), str(tmp_path / 'copy.summary.json'))
+
+    # Putting 'new' went over 250 bytes; 'old' was the least recently used
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['new.xlsx', 'used.xlsx']
+    cache.evict()
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['new.xlsx', 'used.xlsx']
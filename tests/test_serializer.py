@@ -0,0 +1,51 @@
+# tests/test_serializer.py
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from utils.serializer import available_serializers, get_serializer
+
+
+@pytest.fixture(params=available_serializers())
+def serializer(request):
+    return get_serializer(request.param)
+
+
+def test_serializers_write_compact_json_with_datetimes(serializer):
+    record = {'event': 'Café opened', 'count': 3, 'ratio': 0.5, 'ok': True, 'tags': ['a', None],
+              'timestamp': datetime(2024, 1, 2, 3, 4, 5, 600), 'day': date(2024, 1, 2)}
+
+    text = serializer.dumps(record)
+    assert text == ('{"event":"Café opened","count":3,"ratio":0.5,"ok":true,"tags":["a",null],'
+                    '"timestamp":"2024-01-02T03:04:05.000600","day":"2024-01-02"}')
+    assert serializer.encode(record) == text.encode('utf-8')
+    assert json.loads(serializer.dumps({'at': datetime(2024, 1, 2, tzinfo=timezone.utc)}))['at'] \
+        in ('2024-01-02T00:00:00+00:00', '2024-01-02T00:00:00Z')
+
+
+def test_serializers_write_datetime_subclasses_like_json(serializer):
+    # Firestore returns its timestamps as DatetimeWithNanoseconds
+    record = {'updated': DatetimeWithNanoseconds(2024, 1, 2, 3, 4, 5, 600, tzinfo=timezone.utc)}
+    assert serializer.dumps(record) == get_serializer('json').dumps(record)
+    assert serializer.dumps(record, default=sorted) == get_serializer('json').dumps(record)
+
+
+def test_serializers_use_default_for_other_types(serializer):
+    assert serializer.dumps({'value': {2, 1}}, default=sorted) == '{"value":[1,2]}'
+    with pytest.raises(TypeError):
+        serializer.dumps({'value': object()})
+
+
+def test_serializers_decode_str_and_bytes(serializer):
+    assert serializer.loads('{"event":"Café","n":[1,2.5]}') == {'event': 'Café', 'n': [1, 2.5]}
+    assert serializer.loads('{"event":"Café"}'.encode('utf-8')) == {'event': 'Café'}
+    with pytest.raises(serializer.DecodeError):
+        serializer.loads('plain failure text')
+
+
+def test_get_serializer_rejects_unknown_names():
+    assert get_serializer().name == available_serializers()[0]
+    with pytest.raises(ValueError):
+        get_serializer('pickle')
@@ -0,0 +1,59 @@
+# tests/test_ttl_cache.py
+from unittest.mock import patch
+
+from utils.ttl_cache import TTLCache
+
+
+def test_get_or_load_caches_until_expiry():
+    cache = TTLCache(ttl=10)
+    calls = []
+    with patch('utils.ttl_cache.time.monotonic', return_value=100.0):
+        assert cache.get_or_load('key', lambda: calls.append(1) or 'value') == 'value'
+    with patch('utils.ttl_cache.time.monotonic', return_value=104.0):
+        assert cache.get_or_load('key', lambda: calls.append(1) or 'other') == 'value'
+    with patch('utils.ttl_cache.time.monotonic', return_value=111.0):
+        assert cache.get_or_load('key', lambda: calls.append(1) or 'other') == 'other'
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+    assert stats['hit_ratio'] == 0.3333
+    assert stats['average_staleness'] == 4.0
+    assert stats['max_staleness'] == 4.0
+
+
+def test_invalidate():
+    cache = TTLCache(ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.invalidate('a')
+    assert cache.get('a') == (False, None)
+    assert cache.get('b') == (True, 2)
+    cache.invalidate()
+    assert cache.get('b') == (False, None)
+    assert cache.stats()['invalidations'] == 2
+
+
+def test_value_loaded_across_an_invalidation_is_not_stored():
+    cache = TTLCache(ttl=10)
+
+    def load_then_reset():
+        cache.invalidate()  # e.g. the metrics are reset while they are being read
+        return 'before reset'
+
+    assert cache.get_or_load('key', load_then_reset) == 'before reset'
+    assert cache.get('key') == (False, None)
+    assert cache.get_or_load('key', lambda: 'after reset') == 'after reset'
+    assert cache.get('key') == (True, 'after reset')
+
+
+def test_maxsize_and_disabled():
+    cache = TTLCache(ttl=10, maxsize=2)
+    for key in 'abc':
+        cache.set(key, key)
+    assert cache.get('a') == (False, None)
+    assert cache.stats()['size'] == 2
+
+    disabled = TTLCache(ttl=0)
+    disabled.set('a', 1)
+    assert disabled.get('a') == (False, None)
@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+import pytest
+from utils.upload_ingest import UploadSpool, UploadRejected
+
+HEADER = b"Office,Licenses,User principal name,Display name\r\n"
+ROWS = b"Office1,License1,user1@example.com,User 1\r\nOffice2,License2,user2@example.com,User 2"
+
+
+def test_upload_spool_publishes_hashed_and_counted_file(tmp_path):
+    spool = UploadSpool(str(tmp_path), 'export.csv')
+    content = b'\xef\xbb\xbf' + HEADER + ROWS
+    for start in range(0, len(content), 7):
+        spool.write(content[start:start + 7])
+    spool.seek(0)
+
+    upload = spool.publish(str(tmp_path / 'export.csv'))
+
+    assert upload.content_hash == hashlib.sha256(content).hexdigest()
+    assert upload.rows == 2
+    assert upload.bytes == len(content)
+    assert (tmp_path / 'export.csv').read_bytes() == content
+    assert os.listdir(tmp_path) == ['export.csv']
+
+
+def test_upload_spool_rejects_bad_header_before_the_rest_arrives(tmp_path):
+    spool = UploadSpool(str(tmp_path), 'export.csv')
+    with pytest.raises(UploadRejected, match="Missing columns: User principal name, Display name") as info:
+        spool.write(b"Office,Licenses\nOffice1,")
+
+    assert not info.value.too_large
+    with open(info.value.partial_path, 'rb') as f:
+        assert f.read() == b"Office,Licenses\nOffice1,"
+
+
+def test_upload_spool_rejects_files_over_the_size_limit(tmp_path):
+    spool = UploadSpool(str(tmp_path), 'export.csv', max_bytes=len(HEADER) + 10)
+    spool.write(HEADER)
+    with pytest.raises(UploadRejected) as info:
+        spool.write(ROWS)
+
+    assert info.value.too_large
+    assert info.value.partial_path is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_spool_checks_header_without_line_break_on_publish(tmp_path):
+    spool = UploadSpool(str(tmp_path), 'empty.csv')
+    with pytest.raises(UploadRejected, match="No columns to parse from file"):
+        spool.publish(str(tmp_path / 'empty.csv'))
+
+    spool = UploadSpool(str(tmp_path), 'header.csv')
+    spool.write(HEADER.rstrip())
+    assert spool.publish(str(tmp_path / 'header.csv')).rows == 0
+
+
+def test_upload_spool_close_removes_unpublished_file(tmp_path):
+    spool = UploadSpool(str(tmp_path), 'export.csv')
+    spool.write(HEADER)
+    spool.close()
+
+    assert os.listdir(tmp_path) == []
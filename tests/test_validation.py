@@ -1,5 +1,7 @@
 import pytest
-from utils.validation import validate_csv
+import pandas as pd
+from utils.validation import validate_csv, load_csv, read_license_export, REQUIRED_COLUMNS
+from unittest.mock import patch
 
 
 def test_validate_csv_valid_file(tmp_path):
@@ -23,4 +25,46 @@ def test_validate_csv_missing_columns(tmp_path):
     assert not is_valid
     assert "Missing columns" in error_message
 
-# Add more tests for other validation scenarios
+
+def test_load_csv_returns_dataframe(tmp_path):
+    p = tmp_path / "valid.csv"
+    p.write_text("Office,Licenses,User principal name,Display name\nOffice1,License1,user@example.com,User 1")
+
+    df, error_message = load_csv(str(p))
+    assert error_message is None
+    assert list(df.columns) == ['Office', 'Licenses', 'User principal name', 'Display name']
+    assert len(df) == 1
+
+
+def test_load_csv_checks_header_before_parsing(tmp_path):
+    p = tmp_path / "invalid.csv"
+    p.write_text("Office,Licenses\nOffice1,License1")
+
+    with patch('utils.validation.read_license_export') as mock_read_csv:
+        df, error_message = load_csv(str(p))
+    assert df is None
+    assert error_message == "Missing columns: User principal name, Display name"
+    mock_read_csv.assert_not_called()
+
+
+def test_load_csv_malformed_file(tmp_path):
+    p = tmp_path / "malformed.csv"
+    p.write_text("Office,Licenses,User principal name,Display name\n"
+                 "Office1,License1,user@example.com,User 1\n"
+                 "Office2,\"License2,user2@example.com,User 2")
+
+    df, error_message = load_csv(str(p))
+    assert df is None
+    assert error_message == "Invalid CSV file format."
+
+
+def test_read_license_export_prunes_columns(tmp_path):
+    p = tmp_path / "export.csv"
+    p.write_text("Display name,Department,Office,Licenses,User principal name,Usage location\n"
+                 "User 1,Sales,Office1,License1,user@example.com,US\n"
+                 "User 2,Sales,Office1,License2,user2@example.com,US")
+
+    df = read_license_export(str(p))
+    assert sorted(df.columns) == sorted(REQUIRED_COLUMNS)
+    assert isinstance(df['Office'].dtype, pd.CategoricalDtype)
+    assert df['Licenses'].tolist() == ['License1', 'License2']
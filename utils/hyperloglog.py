@@ -0,0 +1,184 @@
+"""
+HyperLogLog module for the AION License Count application.
+
+This module provides a cardinality sketch used to count unique users without storing
+every address. Small sets are kept as exact 64-bit hashes; past a threshold the
+sketch switches to HyperLogLog registers, which take a fixed amount of space (4 KiB
+at the default precision) and estimate the count to within about 1.6%.
+
+Sketches serialize to compact bytes and can be merged, so counts from several
+workers or windows combine without double counting.
+"""
+
+import hashlib
+import math
+import struct
+
+DEFAULT_PRECISION = 12
+
+_SPARSE = 0
+_DENSE = 1
+_HEADER = struct.Struct('>BB')
+_POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+def hash_item(item):
+    """
+    Hash an item to 64 bits.
+
+    Args:
+        item (str or bytes): The item.
+
+    Returns:
+        int: The hash.
+    """
+    if isinstance(item, str):
+        item = item.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    Count distinct items, exactly while the set is small and approximately after that.
+
+    Args:
+        precision (int, optional): log2 of the number of registers, from 4 to 16. Defaults to 12.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError(f"Precision must be between 4 and 16, not {precision}")
+        self.precision = precision
+        self.registers = None  # bytearray once the sketch is dense
+        self.hashes = set()  # Exact hashes while the sketch is sparse
+        # Sparse hashes take 8 bytes each, so switch once they would outgrow the registers
+        self.sparse_limit = (1 << precision) // 8
+
+    @property
+    def is_exact(self):
+        """
+        bool: Whether the count is exact (the sketch still holds every hash).
+        """
+        return self.registers is None
+
+    def add(self, item):
+        """
+        Add an item.
+
+        Args:
+            item (str or bytes): The item.
+        """
+        self._add_hash(hash_item(item))
+
+    def update(self, items):
+        """
+        Add several items.
+
+        Args:
+            items (iterable): The items.
+        """
+        for item in items:
+            self.add(item)
+
+    def _add_hash(self, value):
+        if self.registers is None:
+            self.hashes.add(value)
+            if len(self.hashes) > self.sparse_limit:
+                self._densify()
+        else:
+            self._set_register(value)
+
+    def _set_register(self, value):
+        index = value >> (64 - self.precision)
+        remaining = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def _densify(self):
+        self.registers = bytearray(1 << self.precision)
+        for value in self.hashes:
+            self._set_register(value)
+        self.hashes = set()
+
+    def merge(self, other):
+        """
+        Add every item of another sketch to this one.
+
+        Args:
+            other (HyperLogLog): A sketch with the same precision.
+
+        Raises:
+            ValueError: If the precisions differ.
+        """
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches of precision {other.precision} and {self.precision}")
+        if other.registers is None:
+            for value in other.hashes:
+                self._add_hash(value)
+        else:
+            if self.registers is None:
+                self._densify()
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """
+        Get the number of distinct items added.
+
+        Returns:
+            int: The exact count for small sets, otherwise the HyperLogLog estimate.
+        """
+        if self.registers is None:
+            return len(self.hashes)
+
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(_POWERS[rank] for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        """
+        Serialize the sketch.
+
+        Returns:
+            bytes: A format byte and the precision, then the sorted hashes or the registers.
+        """
+        if self.registers is None:
+            values = sorted(self.hashes)
+            return _HEADER.pack(_SPARSE, self.precision) + struct.pack(f'>{len(values)}Q', *values)
+        return _HEADER.pack(_DENSE, self.precision) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Deserialize a sketch produced by to_bytes.
+
+        Args:
+            data (bytes): The serialized sketch.
+
+        Returns:
+            HyperLogLog: The sketch.
+
+        Raises:
+            ValueError: If the data is not a valid sketch.
+        """
+        if len(data) < _HEADER.size:
+            raise ValueError("Sketch data is too short")
+        kind, precision = _HEADER.unpack_from(data)
+        sketch = cls(precision)
+        body = data[_HEADER.size:]
+        if kind == _SPARSE and len(body) % 8 == 0:
+            sketch.hashes = set(struct.unpack(f'>{len(body) // 8}Q', body))
+        elif kind == _DENSE and len(body) == 1 << precision:
+            sketch.registers = bytearray(body)
+        else:
+            raise ValueError("Invalid sketch data")
+        return sketch
+
@@ -0,0 +1,99 @@
+"""
+Log filter module for the AION License Count application.
+
+This module compiles the /api/logs query filters into a single function over raw
+log lines. The work that does not depend on the line (lower-casing, parsing the date
+bounds) is done once up front, and each line goes through the cheapest checks first:
+substring tests on the raw bytes reject most lines before any JSON is decoded.
+"""
+
+import json
+from utils.log_store import parse_log_line, parse_timestamp, format_timestamp
+
+
+def _raw_literal(text):
+    # Text that JSON encodes unchanged can be looked for in the raw line. Quotes, backslashes and
+    # non-ASCII characters are escaped (twice inside the nested event fields), so those are only
+    # matched after decoding. So is text that may span a separator: the log lines are written compactly,
+    # while the record text that is searched has a space after each ':' and ','
+    if not text.isascii() or not text.isprintable() or any(char in text for char in '"\\:,') or text.startswith(' '):
+        return None
+    return text.encode('ascii')
+
+
+def _timestamp_key(timestamp):
+    # 'YYYY-MM-DDTHH:MM:SS.ffffff' in UTC, which sorts correctly as a string
+    return format_timestamp(parse_timestamp(timestamp))[:26]
+
+
+def _record_timestamp_key(record):
+    # The structlog timestamps are already in that form (plus a 'Z'), so only other formats are parsed
+    timestamp = record.get('timestamp', '')
+    if isinstance(timestamp, str) and len(timestamp) == 27 and timestamp[10] == 'T' and timestamp[-1] == 'Z':
+        return timestamp[:26]
+    return _timestamp_key(timestamp)
+
+
+def compile_log_filter(filters):
+    """
+    Compile the /api/logs filters into a function over raw log lines.
+
+    Args:
+        filters (dict): Any of 'level', 'search', 'start_date', 'end_date', 'http_method',
+            'exclude_api', 'ip_address', 'path' and 'user_agent'. Empty values are ignored.
+
+    Returns:
+        callable: Takes a log line (bytes) and returns the parsed record (dict) if it matches every filter,
+            otherwise None.
+    """
+    level = (filters.get('level') or '').lower()
+    search = (filters.get('search') or '').lower()
+    http_method = (filters.get('http_method') or '').upper()
+    ip_address = filters.get('ip_address') or ''
+    path = filters.get('path') or ''
+    user_agent = filters.get('user_agent') or ''
+    exclude_api = filters.get('exclude_api')
+    start_date = _timestamp_key(filters['start_date']) if filters.get('start_date') else None
+    end_date = _timestamp_key(filters['end_date']) if filters.get('end_date') else None
+
+    # Checks on the raw line: every matching record contains these bytes, so lines without them are skipped
+    line_literals = [literal for literal in map(_raw_literal, (ip_address, path, user_agent)) if literal]
+    search_literal = _raw_literal(search) if search else None
+
+    # Checks on the decoded record, cheapest first
+    record_checks = []
+    if level:
+        record_checks.append(lambda log: str(log.get('level', '')).lower() == level)
+    if http_method:
+        record_checks.append(lambda log: str(log.get('method', '')).upper() == http_method)
+    if ip_address:
+        record_checks.append(lambda log: log.get('ip', '') == ip_address)
+    if exclude_api:
+        record_checks.append(lambda log: not str(log.get('path', '')).startswith('/api/'))
+    if path:
+        record_checks.append(lambda log: path in str(log.get('path', '')))
+    if user_agent:
+        record_checks.append(lambda log: user_agent in str(log.get('user_agent', '')))
+    if start_date:
+        record_checks.append(lambda log: _record_timestamp_key(log) >= start_date)
+    if end_date:
+        record_checks.append(lambda log: _record_timestamp_key(log) <= end_date)
+    if search:
+        # The same text the log store searches, so both /api/logs paths find the same records
+        record_checks.append(lambda log: search in json.dumps(log, default=str).lower())
+
+    def match(line):
+        for literal in line_literals:
+            if literal not in line:
+                return None
+        # Lines that are not JSON are reported as error records, whose text differs from the raw line
+        if search_literal and line.startswith(b'{') and search_literal not in line.lower():
+            return None
+
+        log = parse_log_line(line.decode('utf-8', errors='replace'))
+        for check in record_checks:
+            if not check(log):
+                return None
+        return log
+
+    return match
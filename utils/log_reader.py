@@ -0,0 +1,151 @@
+"""
+Log reader module for the AION License Count application.
+
+This module reads the JSON log files backwards, newest record first, without an
+index. It seeks to the end of `app.log` and reads it in blocks towards the start,
+then carries on into the rotated `app.log.1` and `app.log.2`, so showing the latest
+entries only costs as much as the entries shown.
+
+Each record comes with a cursor (file inode, byte offset and timestamp) that can be
+handed back to continue reading just before that record.
+"""
+
+import os
+from collections import namedtuple
+from utils.log_store import LOG_FILE_NAME, ROTATED_SUFFIXES, parse_log_line, parse_timestamp, format_timestamp
+
+BLOCK_SIZE = 64 * 1024
+
+
+class LogCursor(namedtuple('LogCursor', ['inode', 'offset', 'timestamp'])):
+    """
+    Position of a log record: the inode of its file, the byte offset where its line starts and its timestamp.
+
+    The timestamp is used to resume when the file has been rotated away since the cursor was issued.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.inode}:{self.offset}:{self.timestamp}"
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Parse a cursor produced by str().
+
+        Args:
+            value (str): The cursor string.
+
+        Returns:
+            LogCursor: The cursor.
+
+        Raises:
+            ValueError: If the value is not a valid cursor.
+        """
+        inode, offset, timestamp = value.split(':', 2)
+        return cls(int(inode), int(offset), timestamp)
+
+
+def log_files(log_dir):
+    """
+    Get the log file and its rotated files, newest first.
+
+    Args:
+        log_dir (str): Directory holding app.log.
+
+    Returns:
+        list: Paths of the files that exist.
+    """
+    log_path = os.path.join(log_dir, LOG_FILE_NAME)
+    paths = [log_path] + [log_path + suffix for suffix in reversed(ROTATED_SUFFIXES)]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def reverse_lines(f, end, block_size=BLOCK_SIZE):
+    """
+    Yield the complete lines of a binary file that end before a position, last line first.
+
+    Text after the last newline before end is an unfinished write and is skipped.
+
+    Args:
+        f (file): A file opened in binary mode.
+        end (int): Byte position to read backwards from.
+        block_size (int, optional): Bytes read per seek. Defaults to BLOCK_SIZE.
+
+    Yields:
+        tuple: The byte offset where the line starts and the line without its newline.
+    """
+    position = end
+    head = b''  # Start of a line that began in a block not read yet
+    skip_last = True
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        data = f.read(size) + head
+        lines = data.split(b'\n')
+        head = lines.pop(0) if position > 0 else b''
+
+        line_end = position + len(data)
+        if skip_last and lines:
+            line_end -= len(lines.pop()) + 1
+            skip_last = False
+        for line in reversed(lines):
+            line_end -= len(line)
+            if line:
+                yield line_end, line
+            line_end -= 1
+
+
+def parse_line(line):
+    """
+    Parse a raw log line.
+
+    Args:
+        line (bytes): The line.
+
+    Returns:
+        dict: The log record.
+    """
+    return parse_log_line(line.decode('utf-8', errors='replace'))
+
+
+def iter_log_records(log_dir, cursor=None, block_size=BLOCK_SIZE, match=parse_line):
+    """
+    Yield log records newest first, across app.log and its rotated files.
+
+    Args:
+        log_dir (str): Directory holding app.log.
+        cursor (LogCursor, optional): Only yield records before this one. Defaults to starting at the newest record.
+        block_size (int, optional): Bytes read per seek. Defaults to BLOCK_SIZE.
+        match (callable, optional): Parses a raw line into its record, or returns None to skip the line,
+            such as a filter from `utils.log_filter.compile_log_filter`. Defaults to parsing every line.
+
+    Yields:
+        tuple: The record's LogCursor and the record (dict).
+    """
+    files = [(path, os.stat(path)) for path in log_files(log_dir)]
+    start = 0
+    end = None
+    min_timestamp = None
+    if cursor is not None:
+        for index, (path, stat) in enumerate(files):
+            if cursor.inode and stat.st_ino == cursor.inode and cursor.offset <= stat.st_size:
+                start, end = index, cursor.offset
+                break
+        else:
+            # The file was rotated out since the cursor was issued: fall back to its timestamp
+            min_timestamp = parse_timestamp(cursor.timestamp)
+
+    for path, stat in files[start:]:
+        with open(path, 'rb') as f:
+            for offset, line in reverse_lines(f, stat.st_size if end is None else end, block_size):
+                record = match(line)
+                if record is None:
+                    continue
+                timestamp = parse_timestamp(record.get('timestamp', ''))
+                if min_timestamp is not None and timestamp >= min_timestamp:
+                    continue
+                yield LogCursor(stat.st_ino, offset, format_timestamp(timestamp)), record
+        end = None
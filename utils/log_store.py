@@ -0,0 +1,353 @@
+"""
+Log store module for the AION License Count application.
+
+This module parses the JSON log lines written by `utils.logger` and keeps them in an
+indexed SQLite database, so that the admin center's log queries are answered with
+index lookups instead of scanning the whole log file on every request.
+
+New lines are ingested incrementally: the store remembers how far into `app.log` it
+has read and picks up where it left off, following the file across rotations. Once a
+rotation has removed the oldest file, its records are removed from the index too.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from functools import lru_cache
+from utils.serializer import serializer
+
+LOG_FILE_NAME = 'app.log'
+DB_FILE_NAME = 'logs.db'
+
+# Rotated files kept by the RotatingFileHandler, oldest first
+ROTATED_SUFFIXES = ['.2', '.1']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    level TEXT,
+    ip TEXT,
+    path TEXT,
+    method TEXT,
+    user_agent TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_logs_level ON logs (level, timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_ip ON logs (ip, timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_path ON logs (path, timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_method ON logs (method, timestamp);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    name TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+"""
+
+# Full-text index over the raw records, matching substrings case-insensitively like the search box expects
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5 (
+    record, content='logs', content_rowid='id', tokenize='trigram'
+);
+"""
+
+
+def parse_timestamp(timestamp):
+    """
+    Parse a log or query timestamp into a timezone-aware UTC datetime.
+
+    Args:
+        timestamp (datetime or str): An ISO 8601 timestamp, with or without a trailing 'Z' or UTC offset,
+            or the 'YYYY-MM-DD HH:MM:SS,mmm' format of the JSON log formatter.
+
+    Returns:
+        datetime: The parsed timestamp, or datetime.min (UTC) if it cannot be parsed.
+    """
+    if isinstance(timestamp, datetime):
+        return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp
+    if isinstance(timestamp, str):
+        timestamp = timestamp.rstrip('Z')  # Remove trailing 'Z' if present
+        for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z",
+                    "%Y-%m-%d %H:%M:%S,%f", "%Y-%m-%d"):
+            try:
+                parsed = datetime.strptime(timestamp, fmt)
+            except ValueError:
+                continue
+            return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return datetime.min.replace(tzinfo=timezone.utc)
+
+
+def format_timestamp(timestamp):
+    """
+    Format a UTC datetime so that timestamps sort correctly as strings.
+
+    Args:
+        timestamp (datetime): A timezone-aware datetime.
+
+    Returns:
+        str: The timestamp as 'YYYY-MM-DDTHH:MM:SS.ffffff+00:00'.
+    """
+    return timestamp.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+def parse_log_line(line):
+    """
+    Parse one line of the JSON log file into a flat log record.
+
+    Structlog events are rendered to JSON before the file formatter wraps them, so the
+    event's fields (event, ip, path, method, ...) arrive as a JSON string in 'message'.
+    They are merged into the record so they can be filtered on.
+
+    Args:
+        line (str): A line from the log file.
+
+    Returns:
+        dict: The log record. Lines that are not valid JSON become an ERROR record holding the raw line.
+    """
+    try:
+        record = serializer.loads(line)
+    except serializer.DecodeError:
+        record = None
+    if not isinstance(record, dict):
+        return {
+            "level": "ERROR",
+            "event": line.strip(),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    message = record.get('message')
+    if isinstance(message, str) and message.startswith('{'):
+        try:
+            event = serializer.loads(message)
+        except serializer.DecodeError:
+            event = None
+        if isinstance(event, dict):
+            del record['message']
+            record.update(event)
+    return record
+
+
+class LogStore:
+    """
+    SQLite index of the application log.
+
+    Args:
+        log_dir (str): Directory holding app.log and its rotated files. The database is created there too.
+    """
+
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.log_path = os.path.join(log_dir, LOG_FILE_NAME)
+        self.db_path = os.path.join(log_dir, DB_FILE_NAME)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            try:
+                conn.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                # SQLite builds without FTS5 or the trigram tokenizer fall back to scanning the records
+                self.has_fts = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def ingest(self):
+        """
+        Add log lines written since the last call to the index.
+
+        Returns:
+            int: The number of records added.
+        """
+        if not os.path.exists(self.log_path):
+            return 0
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = self._ingest(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def _ingest(self, conn):
+        stat = os.stat(self.log_path)
+        state = conn.execute("SELECT inode, offset FROM ingest_state WHERE name = ?", (LOG_FILE_NAME,)).fetchone()
+        added = 0
+
+        if state is None:
+            # First run: backfill whatever the rotated files still hold
+            for suffix in ROTATED_SUFFIXES:
+                rotated_path = self.log_path + suffix
+                if os.path.exists(rotated_path):
+                    added += self._ingest_file(conn, rotated_path, 0)[1]
+            offset = 0
+        elif state['inode'] != stat.st_ino:
+            # app.log was rotated, possibly more than once: finish reading the previous file, read the
+            # rotated files newer than it, then start over on app.log
+            rotated_paths = [self.log_path + suffix for suffix in ROTATED_SUFFIXES]
+            inodes = [os.stat(path).st_ino if os.path.exists(path) else None for path in rotated_paths]
+            if state['inode'] in inodes:
+                previous = inodes.index(state['inode'])
+                added += self._ingest_file(conn, rotated_paths[previous], state['offset'])[1]
+                newer_paths = rotated_paths[previous + 1:]
+            else:
+                # The previous file was rotated out of the kept files, so all of them are new
+                newer_paths = rotated_paths
+            for rotated_path in newer_paths:
+                if os.path.exists(rotated_path):
+                    added += self._ingest_file(conn, rotated_path, 0)[1]
+            self._prune(conn)
+            offset = 0
+        elif stat.st_size < state['offset']:
+            # app.log was truncated in place
+            offset = 0
+        else:
+            offset = state['offset']
+
+        offset, count = self._ingest_file(conn, self.log_path, offset)
+        conn.execute("INSERT OR REPLACE INTO ingest_state (name, inode, offset) VALUES (?, ?, ?)",
+                     (LOG_FILE_NAME, stat.st_ino, offset))
+        return added + count
+
+    def _prune(self, conn):
+        # Drop the records older than the oldest kept log file, so the index holds what the files do
+        for path in [self.log_path + suffix for suffix in ROTATED_SUFFIXES] + [self.log_path]:
+            try:
+                with open(path, 'rb') as f:
+                    first_line = f.readline().decode('utf-8', errors='replace').strip()
+            except FileNotFoundError:
+                continue
+            if first_line:
+                break
+        else:
+            return
+        oldest = self._row(parse_log_line(first_line))[0]
+        if self.has_fts:
+            conn.execute("INSERT INTO logs_fts (logs_fts, rowid, record) SELECT 'delete', id, record FROM logs "
+                         "WHERE timestamp < ?", (oldest,))
+        conn.execute("DELETE FROM logs WHERE timestamp < ?", (oldest,))
+
+    def _ingest_file(self, conn, path, offset):
+        # Read complete lines from offset onwards; a partially written last line is left for the next call
+        rows = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for raw_line in f:
+                if not raw_line.endswith(b'\n'):
+                    break
+                offset += len(raw_line)
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if line:
+                    rows.append(self._row(parse_log_line(line)))
+
+        if rows:
+            cursor = conn.execute("SELECT COALESCE(MAX(id), 0) FROM logs")
+            first_id = cursor.fetchone()[0] + 1
+            conn.executemany("INSERT INTO logs (timestamp, level, ip, path, method, user_agent, record) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            if self.has_fts:
+                conn.execute("INSERT INTO logs_fts (rowid, record) SELECT id, record FROM logs WHERE id >= ?",
+                             (first_id,))
+        return offset, len(rows)
+
+    @staticmethod
+    def _row(record):
+        return (
+            format_timestamp(parse_timestamp(record.get('timestamp', ''))),
+            str(record.get('level', '')).lower(),
+            record.get('ip'),
+            record.get('path'),
+            str(record['method']).upper() if record.get('method') else None,
+            record.get('user_agent'),
+            # Searched as text, so kept in the json module's format whichever serializer is in use
+            json.dumps(record, default=str)
+        )
+
+    def query(self, filters, page=1, per_page=50):
+        """
+        Find log records matching the admin center filters, newest first.
+
+        Args:
+            filters (dict): Any of 'level', 'search', 'start_date', 'end_date', 'http_method',
+                'exclude_api', 'ip_address', 'path' and 'user_agent'. Empty values are ignored.
+            page (int, optional): 1-based page number. Defaults to 1.
+            per_page (int, optional): Records per page. Defaults to 50.
+
+        Returns:
+            tuple: The records on the page (list of dict) and the total number of matching records.
+        """
+        self.ingest()
+
+        clauses = []
+        params = []
+        if filters.get('level'):
+            clauses.append("level = ?")
+            params.append(filters['level'].lower())
+        if filters.get('start_date'):
+            clauses.append("timestamp >= ?")
+            params.append(format_timestamp(parse_timestamp(filters['start_date'])))
+        if filters.get('end_date'):
+            clauses.append("timestamp <= ?")
+            params.append(format_timestamp(parse_timestamp(filters['end_date'])))
+        if filters.get('http_method'):
+            clauses.append("method = ?")
+            params.append(filters['http_method'].upper())
+        if filters.get('ip_address'):
+            clauses.append("ip = ?")
+            params.append(filters['ip_address'])
+        if filters.get('path'):
+            clauses.append("instr(path, ?) > 0")
+            params.append(filters['path'])
+        if filters.get('user_agent'):
+            clauses.append("instr(user_agent, ?) > 0")
+            params.append(filters['user_agent'])
+        if filters.get('exclude_api'):
+            clauses.append("substr(COALESCE(path, ''), 1, 5) != '/api/'")
+        search = filters.get('search', '').lower()
+        if search:
+            if self.has_fts and len(search) >= 3:
+                clauses.append("id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)")
+                params.append('"{}"'.format(search.replace('"', '""')))
+            else:
+                clauses.append("instr(lower(record), ?) > 0")
+                params.append(search)
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM logs" + where, params).fetchone()[0]
+            rows = conn.execute("SELECT record FROM logs" + where + " ORDER BY timestamp DESC, id DESC "
+                                "LIMIT ? OFFSET ?", params + [per_page, (page - 1) * per_page]).fetchall()
+        return [serializer.loads(row['record']) for row in rows], total
+
+
+class _Connection:
+    # Close the SQLite connection on exit (sqlite3's own context manager only ends transactions)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_log_store(log_dir):
+    """
+    Get the log store for a log directory, creating it on first use.
+
+    Args:
+        log_dir (str): Directory holding app.log.
+
+    Returns:
+        LogStore: The shared store for log_dir.
+    """
+    return LogStore(log_dir)
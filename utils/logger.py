@@ -3,19 +3,36 @@ Logging configuration module for the AION License Count application.
 
 This module sets up structured logging using structlog and provides utility
 functions for logging throughout the application.
+
+Records are handed to a background thread through a bounded queue, so formatting
+and file I/O happen off the request thread. Request start and end lines can be
+sampled by level to cut their volume.
 """
 
 import structlog
+import atexit
 import logging
 import os
-from flask import request, has_request_context
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+from flask import request, has_request_context, g
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from pythonjsonlogger import jsonlogger
 from create_app import app
+from utils.serializer import serializer
 
 # Get the log directory from the app configuration
 LOG_DIR = app.config["LOG_DIR"]
 
+# Logger of the per-request start and end lines, which LOG_REQUEST_SAMPLE_RATES applies to
+REQUEST_LOGGER = 'app.requests'
+
+OVERFLOW_POLICIES = ('drop', 'block')
+
+# Handlers installed on the root logger by setup_logging
+_installed_handlers = []
+
 
 def fetch_log_dir():
     """
@@ -66,17 +83,141 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
         elif record.exc_text:
             log_record['exception'] = record.exc_text
 
+    def jsonify_log_record(self, log_record):
+        # Values JSON has no type for are written as text, as python-json-logger's own encoder does
+        return serializer.dumps(log_record, default=str)
+
     def formatException(self, exc_info):
         formatted = super().formatException(exc_info)
         return formatted.replace("\n", "\\n").replace("\r", "\\r")
 
 
+class RequestSamplingFilter(logging.Filter):
+    """
+    Keep a share of the request log lines, chosen per request and by level.
+
+    The decision is made once per request, so a request keeps both its start and end lines or neither.
+
+    Args:
+        rates (dict): Share of records to keep, from 0 to 1, by level name. Levels not listed are all kept.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {logging.getLevelName(level.upper()): rate for level, rate in rates.items()}
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1:
+            return True
+        if not has_request_context():
+            return random.random() < rate
+        if '_log_sample' not in g:
+            g._log_sample = random.random()
+        return g._log_sample < rate
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue records for handlers that run on a background thread.
+
+    The listener thread is started on first use, and again in a process forked after that.
+
+    Args:
+        handlers (list): The handlers that write the records.
+        maxsize (int, optional): Records the queue holds. Defaults to 10000.
+        overflow (str, optional): What to do with a record when the queue is full: 'drop' discards records
+            below WARNING and waits for space for the others; 'block' always waits. Defaults to 'drop'.
+    """
+
+    def __init__(self, handlers, maxsize=10000, overflow='drop'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown log queue overflow policy {overflow!r}; use one of {OVERFLOW_POLICIES}")
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.overflow = overflow
+        self.dropped = 0
+        self._unreported = 0
+        self._listener = None
+        self._stopped = False
+        self._start_lock = threading.Lock()
+
+    def _listener_alive(self):
+        # Threads do not survive a fork, so a forked process finds the listener dead and starts its own
+        return self._listener is not None and self._listener._thread is not None and \
+            self._listener._thread.is_alive()
+
+    def _ensure_listener(self):
+        if self._listener_alive():
+            return
+        with self._start_lock:
+            if not self._stopped and not self._listener_alive():
+                self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+                self._listener.start()
+                atexit.register(self.stop)
+
+    def prepare(self, record):
+        # The record stays in this process, so it is queued as it is, exception included; only the
+        # message is rendered now, while its arguments still have the values they were logged with
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if self._stopped:
+            # Records logged during shutdown, after the listener has gone, are written right away
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            return
+        self._ensure_listener()
+        if self.overflow == 'block' or record.levelno >= logging.WARNING:
+            self.queue.put(record)
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+                self._unreported += 1
+                return
+        if self._unreported:
+            self._report_dropped()
+
+    def _report_dropped(self):
+        dropped, self._unreported = self._unreported, 0
+        warning = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                    f"Dropped {dropped} log records because the log queue was full", None, None)
+        try:
+            self.queue.put_nowait(warning)
+        except queue.Full:
+            self._unreported += dropped
+
+    def stop(self):
+        """
+        Write out the queued records and stop the listener thread. Later records are written directly.
+        """
+        with self._start_lock:
+            self._stopped = True
+            if self._listener_alive():
+                self._listener.stop()
+            self._listener = None
+            atexit.unregister(self.stop)
+
+    def close(self):
+        self.stop()
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
 def setup_logging():
     """
        Configure and set up logging for the application.
 
        This function sets up both file and console logging, configures structlog,
        and sets the logging level for the application and Flask's werkzeug logger.
+       Unless LOG_QUEUE_SIZE is 0, both handlers run on a background thread behind a
+       BoundedQueueHandler. Calling it again replaces the handlers it installed.
        """
 
     # Ensure the log directory exists
@@ -88,7 +229,8 @@ def setup_logging():
     file_handler = RotatingFileHandler(
         os.path.join(LOG_DIR, "app.log"),
         maxBytes=5000000,  # 5 MB
-        backupCount=2
+        backupCount=2,
+        encoding='utf-8'  # Non-ASCII characters are not escaped in the JSON
     )
     file_handler.setFormatter(json_formatter)
 
@@ -99,7 +241,27 @@ def setup_logging():
     # Set up a console handler
     console_handler = logging.StreamHandler()
 
-    # Configure structlog
+    _configure_structlog()
+
+    handlers = [file_handler, console_handler]
+    if app.config['LOG_QUEUE_SIZE']:
+        queue_handler = BoundedQueueHandler(handlers, app.config['LOG_QUEUE_SIZE'], app.config['LOG_QUEUE_OVERFLOW'])
+        handlers = [queue_handler]
+
+    # Sampled on the request logger itself, so a dropped line costs no more than the check
+    request_logger = logging.getLogger(REQUEST_LOGGER)
+    for sampling_filter in [f for f in request_logger.filters if isinstance(f, RequestSamplingFilter)]:
+        request_logger.removeFilter(sampling_filter)
+    if app.config['LOG_REQUEST_SAMPLE_RATES']:
+        request_logger.addFilter(RequestSamplingFilter(app.config['LOG_REQUEST_SAMPLE_RATES']))
+
+    _install_handlers(handlers)
+
+    # Set up logging for Flask
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+
+def _configure_structlog():
     structlog.configure(
         processors=[
             structlog.contextvars.merge_contextvars,
@@ -109,21 +271,59 @@ def setup_logging():
             structlog.dev.set_exc_info,
             structlog.processors.TimeStamper(fmt="iso"),
             add_request_info,
-            structlog.processors.JSONRenderer(),
+            structlog.processors.JSONRenderer(serializer=serializer.dumps),
         ],
         logger_factory=structlog.stdlib.LoggerFactory(),
         wrapper_class=structlog.stdlib.BoundLogger,
         cache_logger_on_first_use=True,
     )
 
-    # Set up root logger
+
+def _install_handlers(handlers):
+    # Replace the handlers installed on the root logger before
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    for handler in _installed_handlers:
+        root_logger.removeHandler(handler)
+        handler.close()
+    _installed_handlers[:] = handlers
+    for handler in handlers:
+        root_logger.addHandler(handler)
 
-    # Set up logging for Flask
-    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+class _ForwardingHandler(logging.Handler):
+    # Hands a record on to the logger of the same name in this process, and so to this process's handlers
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def setup_worker_logging(log_queue):
+    """
+    Configure logging in a worker process to send its records to the process that started it.
+
+    The worker opens no log file of its own, so app.log keeps a single writer that rotates it.
+
+    Args:
+        log_queue (multiprocessing.Queue): Queue read by `forward_worker_logs` in the parent process.
+    """
+    _configure_structlog()
+    _install_handlers([QueueHandler(log_queue)])
+
+
+def forward_worker_logs(log_queue):
+    """
+    Start writing the records that worker processes send through a queue with this process's handlers.
+
+    Args:
+        log_queue (multiprocessing.Queue): Queue the workers pass to `setup_worker_logging`.
+
+    Returns:
+        QueueListener: The running listener. Stop it once the workers have exited, to write what is left.
+    """
+    listener = QueueListener(log_queue, _ForwardingHandler())
+    listener.start()
+    return listener
 
 
 def get_logger(name):
@@ -0,0 +1,510 @@
+"""
+Metrics registry module for the AION License Count application.
+
+This module keeps operational metrics (counters, gauges and histograms) in a form
+that every gunicorn worker can read. Each process writes its values to its own
+memory-mapped file in a shared directory, so an update is a write to memory with no
+locking between processes. Exposition reads the files of all the workers and adds
+them up, so scraping any worker gives the totals of the whole process group:
+
+- counters and histograms are summed over every file, including those of workers
+  that have exited, so totals do not drop when a worker is replaced
+- gauges are summed over the workers that are still running
+
+The directory should be emptied when the application starts (see gunicorn.conf.py).
+Without a directory the values stay in the memory of the process.
+
+Values that other modules already count, such as cache statistics, are copied into
+the registry by collectors, which run in each worker every few seconds and on scrape.
+"""
+
+import bisect
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_INITIAL_SIZE = 64 * 1024
+_USED = struct.Struct('<I4x')  # Bytes of the file in use, padded to 8
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+def _entry_size(key):
+    # Key length and key, padded so that the value that follows is 8-byte aligned
+    padded = _KEY_LENGTH.size + len(key)
+    return padded + (-padded % 8) + _VALUE.size
+
+
+def read_values(data):
+    """
+    Parse the contents of a value file.
+
+    Args:
+        data (bytes): The file contents.
+
+    Yields:
+        tuple: Each key (str), the offset of its value, and the value.
+    """
+    if len(data) < _USED.size:
+        return
+    used = _USED.unpack_from(data)[0]
+    pos = _USED.size
+    while pos < used:
+        length = _KEY_LENGTH.unpack_from(data, pos)[0]
+        key = data[pos + _KEY_LENGTH.size:pos + _KEY_LENGTH.size + length]
+        offset = pos + _entry_size(key) - _VALUE.size
+        yield key.decode('utf-8'), offset, _VALUE.unpack_from(data, offset)[0]
+        pos = offset + _VALUE.size
+
+
+class ValueFile:
+    """
+    Float values by key in a memory-mapped file written by a single process.
+
+    An entry is appended in full before the used size in the header is advanced, so
+    readers in other processes never see a partial entry.
+
+    Args:
+        path (str): Path to the file. An existing file is reopened with its values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = max(os.fstat(self._file.fileno()).st_size, _INITIAL_SIZE)
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _USED.unpack_from(self._map)[0] or _USED.size
+        self._positions = {key: offset for key, offset, _ in read_values(self._map)}
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode('utf-8')
+            size = _entry_size(encoded)
+            if self._used + size > len(self._map):
+                new_size = len(self._map)
+                while self._used + size > new_size:
+                    new_size *= 2
+                self._map.close()
+                self._file.truncate(new_size)
+                self._map = mmap.mmap(self._file.fileno(), new_size)
+            _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+            self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+            position = self._used + size - _VALUE.size
+            _VALUE.pack_into(self._map, position, 0.0)
+            self._used += size
+            _USED.pack_into(self._map, 0, self._used)
+            self._positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        position = self._position(key)
+        _VALUE.pack_into(self._map, position, _VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def set(self, key, value):
+        _VALUE.pack_into(self._map, self._position(key), value)
+
+    def items(self):
+        return {key: value for key, _, value in read_values(self._map)}
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class MemoryValues:
+    """
+    Float values by key kept in the memory of the process, for a registry without a directory.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self._values[key] = value
+
+    def items(self):
+        return dict(self._values)
+
+    def close(self):
+        pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class Metric:
+    """
+    Base of the metric types.
+
+    Args:
+        registry (MetricsRegistry): The registry the values are kept in.
+        name (str): Metric name.
+        documentation (str): Help text.
+        labelnames (tuple, optional): Names of the labels every sample must have. Defaults to none.
+    """
+
+    kind = None
+    suffix = ''
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, suffix, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, not {tuple(labels)}")
+        return json.dumps([self.name + suffix, [str(labels[name]) for name in self.labelnames]])
+
+    def expose(self, samples):
+        """
+        Format this metric's aggregated samples.
+
+        Args:
+            samples (dict): Values by (sample name, label values) for this metric.
+
+        Returns:
+            list: Lines in the text exposition format.
+        """
+        lines = self._header()
+        for (sample, values), value in sorted(samples.items()):
+            lines.append(f'{sample}{_format_labels(dict(zip(self.labelnames, values)))} {_format_value(value)}')
+        return lines
+
+    def _header(self):
+        name = self.name + self.suffix
+        return [f'# HELP {name} {self.documentation}', f'# TYPE {name} {self.kind}']
+
+
+class Counter(Metric):
+    """
+    A total that only goes up. Its samples are named after the metric with '_total' appended.
+    """
+
+    kind = 'counter'
+    suffix = '_total'
+
+    def inc(self, amount=1, **labels):
+        """
+        Add to the counter.
+
+        Args:
+            amount (float, optional): Defaults to 1.
+            **labels: The label values.
+        """
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        self.registry.add(self._key('_total', labels), amount)
+
+    def set_total(self, value, **labels):
+        """
+        Set this process's total, for counts kept elsewhere in the process, such as by a collector.
+
+        Args:
+            value (float): The process's total so far.
+            **labels: The label values.
+        """
+        self.registry.set(self._key('_total', labels), value)
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. Workers that have exited no longer count towards it.
+    """
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        """
+        Set this process's value.
+
+        Args:
+            value (float): The value.
+            **labels: The label values.
+        """
+        self.registry.set(self._key('', labels), value)
+
+    def inc(self, amount=1, **labels):
+        """
+        Change this process's value.
+
+        Args:
+            amount (float, optional): Defaults to 1.
+            **labels: The label values.
+        """
+        self.registry.add(self._key('', labels), amount)
+
+
+class Histogram(Metric):
+    """
+    Observations counted in buckets, with their count and sum.
+
+    Args:
+        buckets (tuple, optional): Upper bounds of the buckets. Defaults to DEFAULT_BUCKETS, for seconds.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        Record an observation.
+
+        Args:
+            value (float): The observed value.
+            **labels: The label values.
+        """
+        # Buckets are stored individually and made cumulative on exposition
+        index = bisect.bisect_left(self.buckets, value)
+        bound = self.buckets[index] if index < len(self.buckets) else math.inf
+        self.registry.add(self._key(f'_bucket:{_format_value(bound)}', labels), 1)
+        self.registry.add(self._key('_sum', labels), value)
+        self.registry.add(self._key('_count', labels), 1)
+
+    def expose(self, samples):
+        lines = self._header()
+        series = sorted({values for _, values in samples})
+        for values in series:
+            labels = dict(zip(self.labelnames, values))
+            cumulative = 0
+            for bound in self.buckets + (math.inf,):
+                cumulative += samples.get((f'{self.name}_bucket:{_format_value(bound)}', values), 0)
+                bucket_labels = _format_labels({**labels, 'le': _format_value(bound)})
+                lines.append(f'{self.name}_bucket{bucket_labels} {_format_value(cumulative)}')
+            for suffix in ('_sum', '_count'):
+                value = samples.get((self.name + suffix, values), 0)
+                lines.append(f'{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class HitRatio(Metric):
+    """
+    Gauge computed on exposition as hits / (hits + misses) from two counters with the same labels.
+
+    Args:
+        hits (Counter): The hits.
+        misses (Counter): The misses.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, hits, misses):
+        super().__init__(registry, name, documentation, hits.labelnames)
+        self.hits = hits
+        self.misses = misses
+
+    def ratios(self, samples):
+        hits = {values: value for (_, values), value in samples.get(self.hits.name, {}).items()}
+        misses = {values: value for (_, values), value in samples.get(self.misses.name, {}).items()}
+        return {(self.name, values): hits.get(values, 0) / total
+                for values in set(hits) | set(misses)
+                if (total := hits.get(values, 0) + misses.get(values, 0))}
+
+
+class MetricsRegistry:
+    """
+    The metrics of the application and where their values are kept.
+
+    Args:
+        directory (str, optional): Shared directory of the per-process value files. Defaults to None
+            (values are kept in the memory of the process).
+        sync_interval (float, optional): Seconds between runs of the collectors. Defaults to 5.
+    """
+
+    def __init__(self, directory=None, sync_interval=5.0):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self._metrics = []
+        self._collectors = []
+        self._values = None
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def configure(self, directory, sync_interval=5.0):
+        """
+        Move the values of this process to a shared directory.
+
+        Args:
+            directory (str or None): Directory of the value files, created if missing. None keeps them in memory.
+            sync_interval (float, optional): Seconds between runs of the collectors. Defaults to 5.
+        """
+        with self._lock:
+            if self._values is not None:
+                self._values.close()
+            self._values = None
+            self.directory = directory
+            self.sync_interval = sync_interval
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def _register(self, metric):
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"A metric named {metric.name} is already registered")
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def hit_ratio(self, name, documentation, hits, misses):
+        return self._register(HitRatio(self, name, documentation, hits, misses))
+
+    def add_collector(self, collector):
+        """
+        Register a function that copies values kept elsewhere in the process into the registry.
+
+        Args:
+            collector (callable): Called without arguments in every worker.
+        """
+        self._collectors.append(collector)
+
+    def _get_values(self):
+        # The caller holds the lock. A forked worker gets a file of its own.
+        pid = os.getpid()
+        if self._values is None or self._pid != pid:
+            if self._pid != pid:
+                self._thread = None
+            if self.directory:
+                self._values = ValueFile(os.path.join(self.directory, f'{pid}.db'))
+            else:
+                self._values = MemoryValues()
+            self._pid = pid
+        if self._collectors and self.directory and self._thread is None:
+            self._thread = threading.Thread(target=self._sync_loop, name='metrics-registry-sync', daemon=True)
+            self._thread.start()
+        return self._values
+
+    def add(self, key, amount):
+        with self._lock:
+            self._get_values().add(key, amount)
+
+    def set(self, key, value):
+        with self._lock:
+            self._get_values().set(key, value)
+
+    def _sync_loop(self):
+        # Keeps the collected values of an idle worker current for scrapes served by the others
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.sync_interval)
+            self.sync()
+
+    def sync(self):
+        """
+        Run the collectors of this process.
+        """
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("Error collecting metrics")
+
+    def collect(self):
+        """
+        Read and aggregate the values of every process.
+
+        Returns:
+            dict: Per metric name, values by (sample name, label values).
+        """
+        self.sync()
+        with self._lock:
+            own = self._get_values().items()
+        sources = [(True, own)]
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*.db')):
+                try:
+                    pid = int(os.path.basename(path)[:-len('.db')])
+                except ValueError:
+                    continue
+                if pid == os.getpid():
+                    continue
+                try:
+                    with open(path, 'rb') as f:
+                        values = {key: value for key, _, value in read_values(f.read())}
+                except OSError:
+                    continue
+                sources.append((_pid_alive(pid), values))
+
+        kinds = {metric.name: metric.kind for metric in self._metrics}
+        samples = {}
+        for alive, values in sources:
+            for key, value in values.items():
+                sample, label_values = json.loads(key)
+                name = sample.split(':', 1)[0]
+                for suffix in ('_total', '_bucket', '_sum', '_count'):
+                    if name.endswith(suffix) and name[:-len(suffix)] in kinds:
+                        name = name[:-len(suffix)]
+                        break
+                if name not in kinds or (kinds[name] == 'gauge' and not alive):
+                    continue
+                metric_samples = samples.setdefault(name, {})
+                sample_key = (sample, tuple(label_values))
+                metric_samples[sample_key] = metric_samples.get(sample_key, 0.0) + value
+        for metric in self._metrics:
+            if isinstance(metric, HitRatio):
+                samples[metric.name] = metric.ratios(samples)
+        return samples
+
+    def expose(self):
+        """
+        Render the metrics of every process in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition.
+        """
+        samples = self.collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose(samples.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
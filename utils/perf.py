@@ -0,0 +1,218 @@
+"""
+Performance instrumentation module for the AION License Count application.
+
+This module times the stages of report generation. Each stage runs in a span, which
+records its wall time, the CPU time of its thread, the rows it handled and the peak
+memory of the process. The spans of one report are collected in a trace and logged
+with it, and every span also feeds a rolling window of recent timings per stage, from
+which each worker reports its p50, p95 and p99.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Timings kept per stage for the percentiles
+WINDOW = 1000
+
+
+def peak_rss_mb():
+    """
+    Get the peak resident set size of this process.
+
+    Returns:
+        float or None: Megabytes, or None where the resource module is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Span:
+    """
+    Timing of one stage.
+
+    Args:
+        name (str): Name of the stage.
+        rows (int, optional): Rows handled by the stage. Can also be set while it runs. Defaults to None.
+    """
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_mb = None
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: The name, wall and CPU time in milliseconds, rows and peak RSS of the span.
+        """
+        return {
+            'name': self.name,
+            'wall_ms': round(self.wall_seconds * 1000, 2),
+            'cpu_ms': round(self.cpu_seconds * 1000, 2),
+            'rows': self.rows,
+            'peak_rss_mb': self.peak_rss_mb
+        }
+
+
+class PerfStats:
+    """
+    Rolling timings of each stage in this worker process.
+
+    Args:
+        window (int, optional): Timings kept per stage. Defaults to WINDOW.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        """
+        Add the timing of a finished span.
+
+        Args:
+            span (Span): The span.
+        """
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = {'count': 0, 'wall': deque(maxlen=self.window),
+                                                   'cpu': deque(maxlen=self.window), 'rows': 0}
+            stage['count'] += 1
+            stage['wall'].append(span.wall_seconds)
+            stage['cpu'].append(span.cpu_seconds)
+            stage['rows'] += span.rows or 0
+
+    def snapshot(self):
+        """
+        Get the percentiles of each stage.
+
+        Returns:
+            dict: Per stage, the number of spans recorded, rows handled, and the p50, p95 and p99 of the
+                wall and CPU time in milliseconds over the last `window` spans.
+        """
+        with self._lock:
+            stages = {name: (stage['count'], stage['rows'], sorted(stage['wall']), sorted(stage['cpu']))
+                      for name, stage in self._stages.items()}
+        return {
+            name: {
+                'count': count,
+                'rows': rows,
+                'wall_ms': percentiles(wall),
+                'cpu_ms': percentiles(cpu)
+            }
+            for name, (count, rows, wall, cpu) in stages.items()
+        }
+
+    def reset(self):
+        """
+        Forget every timing.
+        """
+        with self._lock:
+            self._stages.clear()
+
+
+def percentiles(values):
+    """
+    Get the p50, p95 and p99 of sorted timings.
+
+    Args:
+        values (list): Sorted timings in seconds.
+
+    Returns:
+        dict: The percentiles in milliseconds (nearest rank).
+    """
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    # The nearest-rank percentile is the value at rank ceil(n * q / 100), counting from 1
+    return {f'p{q}': round(values[max(0, math.ceil(len(values) * q / 100) - 1)] * 1000, 2) for q in (50, 95, 99)}
+
+
+perf_stats = PerfStats()
+
+
+@contextmanager
+def span(name, rows=None):
+    """
+    Time a stage and record it in perf_stats.
+
+    Args:
+        name (str): Name of the stage.
+        rows (int, optional): Rows handled by the stage. Defaults to None.
+
+    Yields:
+        Span: The span, whose rows can be set before it ends.
+    """
+    current = Span(name, rows)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield current
+    finally:
+        current.wall_seconds = time.perf_counter() - wall_start
+        current.cpu_seconds = time.thread_time() - cpu_start
+        current.peak_rss_mb = peak_rss_mb()
+        perf_stats.record(current)
+
+
+class Trace:
+    """
+    The spans of one unit of work, such as a report, in the order they started.
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, rows=None):
+        """
+        Time a stage of this unit of work, recording it in the trace and in perf_stats.
+
+        Args:
+            name (str): Name of the stage.
+            rows (int, optional): Rows handled by the stage. Defaults to None.
+
+        Yields:
+            Span: The span, whose rows can be set before it ends.
+        """
+        with span(name, rows) as current:
+            self.spans.append(current)
+            yield current
+
+    def to_list(self):
+        """
+        Returns:
+            list: The spans as dicts, for logging.
+        """
+        return [current.to_dict() for current in self.spans]
+
+
+def get_perf_stats():
+    """
+    Get this worker's stage timings.
+
+    Returns:
+        dict: The process id, window size, peak RSS and per-stage percentiles.
+    """
+    return {
+        'pid': os.getpid(),
+        'window': perf_stats.window,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': perf_stats.snapshot()
+    }
@@ -0,0 +1,202 @@
+"""
+Report cache module for the AION License Count application.
+
+This module keeps generated reports on disk keyed by a hash of the uploaded CSV
+bytes and the cost parameters, so an identical upload can be answered without
+processing it again. Entries are never handed out directly: each hit is copied (or
+hard-linked) to a new file, which the download can delete as usual.
+
+Entries expire after a maximum age, and the least recently used are removed when the
+cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the report layout changes so that reports cached by older code are not served
+CACHE_VERSION = 1
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path):
+    """
+    Compute the SHA-256 digest of a file.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def report_key(content_hash, **parameters):
+    """
+    Build the cache key of a report.
+
+    Args:
+        content_hash (str): SHA-256 hex digest of the uploaded CSV file.
+        **parameters: The report parameters, such as the costs per license.
+
+    Returns:
+        str: The key, a hex digest.
+    """
+    material = json.dumps({'version': CACHE_VERSION, 'content': content_hash, 'parameters': parameters},
+                          sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _link_or_copy(source, destination):
+    # Publish atomically under the destination name; a hard link shares the data without copying it
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination) or '.', prefix='.', suffix='.tmp')
+    os.close(fd)
+    try:
+        os.remove(temp_path)
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class ReportCache:
+    """
+    On-disk cache of generated reports.
+
+    Each entry is a workbook '<key>.xlsx' and, when one was written, its summary '<key>.summary.json'.
+
+    Args:
+        cache_dir (str): Directory of the cache. Created if missing.
+        max_bytes (int, optional): Total size the cache is trimmed to. Defaults to 500 MB.
+        max_age (float, optional): Seconds an entry is kept after it was last used. Defaults to 7 days.
+    """
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.xlsx', base + '.summary.json'
+
+    def get(self, key, excel_path, summary_path):
+        """
+        Copy a cached report to new files.
+
+        Args:
+            key (str): The report key from report_key.
+            excel_path (str): Where to put the workbook.
+            summary_path (str): Where to put the summary, if the entry has one.
+
+        Returns:
+            bool: True on a hit, False if the report is not cached or has expired.
+        """
+        cached_excel, cached_summary = self._paths(key)
+        try:
+            stat = os.stat(cached_excel)
+            if time.time() - stat.st_mtime > self.max_age:
+                raise FileNotFoundError(cached_excel)
+            _link_or_copy(cached_excel, excel_path)
+            if os.path.exists(cached_summary):
+                _link_or_copy(cached_summary, summary_path)
+            # The modification time records the last use, for eviction
+            os.utime(cached_excel)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key, excel_path, summary_path):
+        """
+        Add a generated report to the cache, then evict entries over the age or size limit.
+
+        Args:
+            key (str): The report key from report_key.
+            excel_path (str): The workbook to cache. It is left in place.
+            summary_path (str): Its summary. Skipped if the file does not exist.
+        """
+        cached_excel, cached_summary = self._paths(key)
+        if os.path.exists(summary_path):
+            _link_or_copy(summary_path, cached_summary)
+        # The workbook goes in last: an entry counts as present once its workbook exists
+        _link_or_copy(excel_path, cached_excel)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used ones until the cache fits in max_bytes.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.xlsx'):
+                continue
+            key = name[:-len('.xlsx')]
+            paths = self._paths(key)
+            try:
+                stat = os.stat(paths[0])
+                size = stat.st_size + (os.path.getsize(paths[1]) if os.path.exists(paths[1]) else 0)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, size, paths))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for mtime, size, paths in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} cached reports")
+        return removed
+
+    def stats(self):
+        """
+        Get this worker's hit statistics for the cache.
+
+        Returns:
+            dict: Hits, misses and hit ratio.
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else 0.0
+            }
@@ -0,0 +1,171 @@
+"""
+JSON serializer module for the AION License Count application.
+
+This module encodes and decodes the JSON of the log files and the API responses.
+It uses orjson when it is installed, then msgspec, and the standard library json
+module otherwise; JSON_SERIALIZER picks one explicitly. Every serializer writes
+compact JSON without escaping non-ASCII characters, and encodes datetime, date and
+time objects as ISO 8601 strings, so switching between them does not change the
+output for the types the application logs and returns.
+"""
+
+import json
+from datetime import date, datetime, time
+from functools import lru_cache
+from create_app import app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _not_serializable(obj):
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """
+    Serializer on the standard library json module.
+
+    The `default` of the encoding methods is called for objects JSON has no type for and returns
+    something that can be encoded instead, as with `json.dumps`.
+    """
+
+    name = 'json'
+    DecodeError = json.JSONDecodeError
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _default(default):
+        def encode_default(obj):
+            if isinstance(obj, (datetime, date, time)):
+                return obj.isoformat()
+            return (default or _not_serializable)(obj)
+        return encode_default
+
+    def dumps(self, obj, default=None):
+        """
+        Encode an object.
+
+        Args:
+            obj: The object.
+            default (callable, optional): Converts objects of other types. Defaults to None (they raise TypeError).
+
+        Returns:
+            str: The JSON.
+        """
+        return json.dumps(obj, default=self._default(default), ensure_ascii=False, separators=(',', ':'))
+
+    def encode(self, obj, default=None):
+        """
+        Encode an object to UTF-8, such as for a response body.
+
+        Args:
+            obj: The object.
+            default (callable, optional): Converts objects of other types. Defaults to None (they raise TypeError).
+
+        Returns:
+            bytes: The JSON.
+        """
+        return self.dumps(obj, default).encode('utf-8')
+
+    def loads(self, data):
+        """
+        Decode JSON.
+
+        Args:
+            data (str or bytes): The JSON.
+
+        Returns:
+            The decoded object.
+
+        Raises:
+            DecodeError: If the data is not valid JSON.
+        """
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """
+    Serializer on orjson.
+    """
+
+    name = 'orjson'
+    DecodeError = orjson.JSONDecodeError if orjson else None
+
+    def dumps(self, obj, default=None):
+        return self.encode(obj, default).decode('utf-8')
+
+    def encode(self, obj, default=None):
+        # Non-string keys are converted like json does. orjson only encodes datetime itself, not subclasses such as
+        # the DatetimeWithNanoseconds of Firestore, so those go through the same fallback as with json
+        return orjson.dumps(obj, default=self._default(default), option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgspecSerializer(JsonSerializer):
+    """
+    Serializer on msgspec. Timezone-aware datetimes in UTC are written with a 'Z' rather than '+00:00'.
+    """
+
+    name = 'msgspec'
+    DecodeError = msgspec.DecodeError if msgspec else None
+
+    def dumps(self, obj, default=None):
+        return self.encode(obj, default).decode('utf-8')
+
+    def encode(self, obj, default=None):
+        return msgspec.json.encode(obj, enc_hook=self._default(default))
+
+    def loads(self, data):
+        return msgspec.json.decode(data)
+
+
+# In order of preference, with whether each is installed
+SERIALIZERS = {
+    'orjson': (OrjsonSerializer, orjson is not None),
+    'msgspec': (MsgspecSerializer, msgspec is not None),
+    'json': (JsonSerializer, True),
+}
+
+
+def available_serializers():
+    """
+    Returns:
+        list: The names of the installed serializers, fastest first.
+    """
+    return [name for name, (_, installed) in SERIALIZERS.items() if installed]
+
+
+def get_serializer(name=None):
+    """
+    Get a serializer.
+
+    Args:
+        name (str, optional): 'orjson', 'msgspec' or 'json'. Defaults to None (the fastest installed).
+
+    Returns:
+        JsonSerializer: The serializer.
+
+    Raises:
+        ValueError: If the serializer is unknown or its package is not installed.
+    """
+    if name is None:
+        name = available_serializers()[0]
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown JSON serializer {name!r}; use one of {list(SERIALIZERS)}")
+    cls, installed = SERIALIZERS[name]
+    if not installed:
+        raise ValueError(f"The {name} JSON serializer is not installed")
+    return cls()
+
+
+serializer = get_serializer(app.config['JSON_SERIALIZER'])
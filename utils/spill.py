@@ -0,0 +1,86 @@
+"""
+Disk spill buffers for the AION License Count application.
+
+This module provides a small append-only store for DataFrame chunks, used to keep
+large per-user detail tables on disk instead of in memory while a report is built.
+"""
+
+import os
+import pickle
+import tempfile
+import pandas as pd
+
+
+class SpillFile:
+    """
+    Append DataFrame chunks to a temporary file and read them back in order.
+
+    Chunks are pickled one after another, so their values and dtypes are restored
+    exactly. The temporary file is removed by `close`, or when the object is used
+    as a context manager.
+
+    Args:
+        columns (list): Column names of the chunks, used to build an empty frame
+            when nothing was appended.
+        dir (str, optional): Directory for the temporary file. Defaults to the
+            system temporary directory.
+    """
+
+    def __init__(self, columns, dir=None):
+        self.columns = list(columns)
+        self.rows = 0
+        fd, self.path = tempfile.mkstemp(suffix='.spill', dir=dir)
+        self._file = os.fdopen(fd, 'w+b')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, df):
+        """
+        Write a chunk to the end of the spill file.
+
+        Args:
+            df (pandas.DataFrame): The chunk to store. Empty chunks are skipped.
+        """
+        if df.empty:
+            return
+        pickle.dump(df, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.rows += len(df)
+
+    def __iter__(self):
+        """
+        Yield the stored chunks in the order they were appended.
+        """
+        self._file.flush()
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def empty_frame(self):
+        """
+        Get an empty DataFrame with the spill file's columns.
+
+        Returns:
+            pandas.DataFrame: A frame with no rows.
+        """
+        return pd.DataFrame([], columns=self.columns)
+
+    def close(self):
+        """
+        Close and delete the temporary file.
+        """
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
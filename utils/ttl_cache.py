@@ -0,0 +1,140 @@
+"""
+TTL cache module for the AION License Count application.
+
+This module provides a small thread-safe cache whose entries expire after a fixed
+number of seconds, used to answer repeated Firestore reads from memory. Each worker
+process has its own cache, and keeps hit ratio and staleness statistics for it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Cache values for a limited time.
+
+    Args:
+        ttl (float): Seconds an entry stays valid. 0 disables caching.
+        maxsize (int, optional): Maximum number of entries; the least recently used are dropped first. Defaults to 1024.
+    """
+
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0  # Advanced by every invalidation
+        self._staleness_total = 0.0
+        self._staleness_max = 0.0
+
+    def get(self, key):
+        """
+        Look up a value.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            tuple: Whether the key was found and its value (None when it was not).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                age = now - entry[0]
+                self.hits += 1
+                self._staleness_total += age
+                self._staleness_max = max(self._staleness_max, age)
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        """
+        Store a value.
+
+        Args:
+            key: The cache key.
+            value: The value.
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        # The caller holds the lock
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """
+        Get a cached value, loading and storing it on a miss.
+
+        A value is not stored if the cache was invalidated while it was loading, as it may predate
+        the change the invalidation was for.
+
+        Args:
+            key: The cache key.
+            loader (callable): Called without arguments to load the value on a miss.
+
+        Returns:
+            The cached or loaded value.
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        with self._lock:
+            generation = self._generation
+        value = loader()
+        if self.ttl > 0:
+            with self._lock:
+                if self._generation == generation:
+                    self._store(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Drop a cached value, or every value.
+
+        Args:
+            key (optional): The cache key. Defaults to clearing the whole cache.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+            self._generation += 1
+
+    def stats(self):
+        """
+        Get this worker's statistics for the cache.
+
+        Returns:
+            dict: Hits, misses, hit ratio, invalidations, entries, TTL, and the average and maximum age
+                in seconds of the values served from the cache.
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 4) if requests else 0.0,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'ttl': self.ttl,
+                'average_staleness': round(self._staleness_total / self.hits, 3) if self.hits else 0.0,
+                'max_staleness': round(self._staleness_max, 3)
+            }
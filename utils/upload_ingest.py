@@ -0,0 +1,191 @@
+"""
+Upload ingest module for the AION License Count application.
+
+This module receives uploaded CSV files in a single pass over the request body.
+Each block is written to a temporary file in the upload folder while the header
+row is checked against the required columns, the content is hashed, and the rows
+and bytes are counted. Files with the wrong header, or larger than the allowed
+size, are rejected as soon as that is known, without receiving the rest of the
+upload or reading the file back from disk.
+"""
+
+import csv
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from utils.validation import check_columns
+
+# Bytes received without a line break before the header row is rejected
+HEADER_LIMIT = 64 * 1024
+
+UploadInfo = namedtuple('UploadInfo', ['path', 'content_hash', 'rows', 'bytes'])
+
+
+class UploadRejected(Exception):
+    """
+    Raised when an upload is rejected while it is received.
+
+    Args:
+        message (str): Why the upload was rejected.
+        filename (str): The name the file was uploaded with.
+        partial_path (str or None): The part of the file received so far, or None if it was removed.
+        too_large (bool, optional): Whether the file was rejected for its size. Defaults to False.
+    """
+
+    def __init__(self, message, filename, partial_path, too_large=False):
+        super().__init__(message)
+        self.filename = filename
+        self.partial_path = partial_path
+        self.too_large = too_large
+
+
+def parse_header(line):
+    """
+    Parse the header row of a CSV file.
+
+    Args:
+        line (bytes): The first line of the file, without its line break.
+
+    Returns:
+        list: The column names.
+
+    Raises:
+        ValueError: If the line is not valid UTF-8 CSV.
+    """
+    try:
+        text = line.decode('utf-8-sig').rstrip('\r')
+        return next(csv.reader([text]), None)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(str(e))
+
+
+class UploadSpool:
+    """
+    Writable file that validates, hashes and counts an upload as it is written.
+
+    It is used as the stream of an uploaded file, so the multipart parser writes the
+    request body straight into it. Call publish to move the file to its final path;
+    closing it before that removes the temporary file.
+
+    Args:
+        directory (str): Directory of the temporary file, on the same filesystem as the final path.
+        filename (str): The name the file was uploaded with.
+        max_bytes (int, optional): Largest file accepted. Defaults to None (no limit).
+    """
+
+    def __init__(self, directory, filename, max_bytes=None):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self._header = bytearray()  # Bytes of the first line until the header has been checked
+        self._last_byte = b''
+        self.bytes = 0
+        self.line_breaks = 0
+        self.published = False
+
+    def write(self, data):
+        """
+        Write a block of the upload.
+
+        Args:
+            data (bytes): The block.
+
+        Returns:
+            int: The number of bytes written.
+
+        Raises:
+            UploadRejected: If the file is now larger than max_bytes, or its header row is invalid.
+        """
+        self.bytes += len(data)
+        if self.max_bytes and self.bytes > self.max_bytes:
+            self._reject(f"The file is larger than the {self.max_bytes // (1024 * 1024)} MB upload limit.",
+                         too_large=True)
+
+        written = self._file.write(data)
+        self._digest.update(data)
+        self.line_breaks += data.count(b'\n')
+        if data:
+            self._last_byte = data[-1:]
+
+        if self._header is not None:
+            self._header += data
+            end = self._header.find(b'\n')
+            if end >= 0:
+                self._check_header(bytes(self._header[:end]))
+            elif len(self._header) > HEADER_LIMIT:
+                self._reject("Invalid CSV file format.")
+        return written
+
+    def _check_header(self, line):
+        self._header = None
+        try:
+            is_valid, error_message = check_columns(parse_header(line))
+        except ValueError:
+            is_valid, error_message = False, "Invalid CSV file format."
+        if not is_valid:
+            self._reject(error_message)
+
+    def _reject(self, message, too_large=False):
+        self._file.close()
+        partial_path = self.temp_path
+        if too_large:
+            # Nothing is kept of files that are too large
+            os.remove(self.temp_path)
+            partial_path = None
+        self.published = True  # The temporary file now belongs to the exception
+        raise UploadRejected(message, self.filename, partial_path, too_large)
+
+    @property
+    def rows(self):
+        """
+        int: Data rows received: the lines after the header row. A quoted value that spans lines counts once per line.
+        """
+        lines = self.line_breaks + (1 if self._last_byte not in (b'', b'\n') else 0)
+        return max(lines - 1, 0)
+
+    def publish(self, file_path):
+        """
+        Move the received file to its final path.
+
+        Args:
+            file_path (str): The path.
+
+        Returns:
+            UploadInfo: The path, SHA-256 hex digest, rows and bytes of the file.
+
+        Raises:
+            UploadRejected: If the file ended before a valid header row.
+        """
+        if self._header is not None:
+            self._check_header(bytes(self._header))
+        self._file.close()
+        os.replace(self.temp_path, file_path)
+        self.published = True
+        return UploadInfo(file_path, self._digest.hexdigest(), self.rows, self.bytes)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        """
+        Close the file, removing it unless it was published.
+        """
+        self._file.close()
+        if not self.published:
+            self.published = True
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
@@ -2,48 +2,184 @@
 CSV validation module for the AION License Count application.
 
 This module provides functionality to validate the structure of uploaded CSV files,
-ensuring they contain the required columns for license counting.
+ensuring they contain the required columns for license counting, and to load valid
+files in a single pass for processing.
 """
 
+import csv
+import os
 import pandas as pd
+from utils.logger import get_logger
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+logger = get_logger(__name__)
 
 # Define the required columns for the CSV file
 REQUIRED_COLUMNS = ['Office', 'Licenses', 'User principal name', 'Display name']
 
+# Types the required columns are loaded with; every other column is skipped
+COLUMN_DTYPES = {
+    'Office': 'category',
+    'Licenses': str,
+    'User principal name': str,
+    'Display name': str
+}
 
-def validate_csv(file_path):
+
+def read_license_export(file_path):
     """
-       Validate the CSV file to ensure it has the required columns.
+       Read only the required columns of a license export, with fixed types.
 
-       This function reads the CSV file and checks if it contains all the required columns
-       defined in the REQUIRED_COLUMNS list. It also catches potential errors that might
-       occur during the file reading process.
+       Admin center exports carry many more columns than the report uses. Loading just
+       REQUIRED_COLUMNS, with 'Office' stored as a categorical, keeps the DataFrame
+       small. The pyarrow CSV engine is used when it is installed.
 
        Args:
-           file_path (str): The path to the CSV file to be validated.
+           file_path (str): The path to the CSV file to be read.
+
+       Returns:
+           pandas.DataFrame: The required columns of the file.
+
+       Raises:
+           Any error raised by pandas.read_csv, e.g. ValueError if a required column is missing.
+       """
+    df = pd.read_csv(file_path, usecols=REQUIRED_COLUMNS, dtype=COLUMN_DTYPES, engine=CSV_ENGINE)
+    logger.info(f"Read {len(df)} rows ({os.path.getsize(file_path)} bytes on disk, "
+                f"{df.memory_usage(deep=True).sum()} bytes in memory) from {file_path} "
+                f"with the {CSV_ENGINE} engine")
+    return df
+
+
+def iter_license_export(file_path, chunksize):
+    """
+       Read the required columns of a license export in chunks.
+
+       Uses the same columns and types as `read_license_export`, but yields the file
+       in DataFrames of at most chunksize rows so that it never has to fit in memory
+       at once. The C engine is always used because pyarrow cannot read in chunks.
+
+       Args:
+           file_path (str): The path to the CSV file to be read.
+           chunksize (int): Maximum number of rows per chunk.
+
+       Yields:
+           pandas.DataFrame: The next chunk of the file.
+
+       Raises:
+           Any error raised by pandas.read_csv, e.g. ValueError if a required column is missing.
+       """
+    rows = 0
+    with pd.read_csv(file_path, usecols=REQUIRED_COLUMNS, dtype=COLUMN_DTYPES, chunksize=chunksize) as reader:
+        for chunk in reader:
+            rows += len(chunk)
+            yield chunk
+    logger.info(f"Read {rows} rows ({os.path.getsize(file_path)} bytes on disk) from {file_path} "
+                f"in chunks of {chunksize}")
+
+
+def check_header(file_path):
+    """
+       Check that the header row of the CSV file has the required columns.
+
+       Only the first record of the file is read, so files with the wrong layout are
+       rejected without parsing their contents.
+
+       Args:
+           file_path (str): The path to the CSV file to be checked.
 
        Returns:
            tuple: A tuple containing:
-               - bool: True if the file is valid, False otherwise.
+               - bool: True if the header is valid, False otherwise.
+               - str or None: An error message if the header is invalid, None otherwise.
+       """
+    try:
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            header = next(csv.reader(f), None)
+    except csv.Error:
+        return False, "Invalid CSV file format."
+    except Exception as e:
+        return False, str(e)
+
+    return check_columns(header)
+
+
+def check_columns(header):
+    """
+       Check that a parsed header row has the required columns.
+
+       Args:
+           header (list or None): The column names of the header row.
+
+       Returns:
+           tuple: A tuple containing:
+               - bool: True if the header is valid, False otherwise.
+               - str or None: An error message if the header is invalid, None otherwise.
+       """
+    if not header:
+        return False, "No columns to parse from file"
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing_columns:
+        return False, f"Missing columns: {', '.join(missing_columns)}"
+    return True, None
+
+
+def load_csv(file_path):
+    """
+       Validate the CSV file and load it in a single pass.
+
+       The header row is checked first so that files missing required columns are
+       rejected cheaply. Valid files are then parsed once and the DataFrame is
+       returned for processing, so callers do not need to read the file again.
+
+       Args:
+           file_path (str): The path to the CSV file to be loaded.
+
+       Returns:
+           tuple: A tuple containing:
+               - pandas.DataFrame or None: The parsed data if the file is valid, None otherwise.
                - str or None: An error message if the file is invalid, None otherwise.
 
        Raises:
            No exceptions are raised; all are caught and returned as error messages.
        """
-    try:
-        # Attempt to read the CSV file
-        df = pd.read_csv(file_path)
-
-        # Check for missing columns
-        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-        if missing_columns:
-            return False, f"Missing columns: {', '.join(missing_columns)}"
+    is_valid, error_message = check_header(file_path)
+    if not is_valid:
+        return None, error_message
 
-        # If we've made it this far, the file is valid
-        return True, None
+    try:
+        df = read_license_export(file_path)
+        return df, None
     except pd.errors.ParserError:
         # Handle CSV parsing errors (e.g., malformed CSV)
-        return False, "Invalid CSV file format."
+        return None, "Invalid CSV file format."
     except Exception as e:
         # Catch any other unexpected errors
-        return False, str(e)
+        return None, str(e)
+
+
+def validate_csv(file_path):
+    """
+       Validate the CSV file to ensure it has the required columns.
+
+       This function loads the CSV file with `load_csv` and discards the data. Use
+       `load_csv` directly when the parsed data is needed afterwards.
+
+       Args:
+           file_path (str): The path to the CSV file to be validated.
+
+       Returns:
+           tuple: A tuple containing:
+               - bool: True if the file is valid, False otherwise.
+               - str or None: An error message if the file is invalid, None otherwise.
+
+       Raises:
+           No exceptions are raised; all are caught and returned as error messages.
+       """
+    df, error_message = load_csv(file_path)
+    return df is not None, error_message